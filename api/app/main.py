@@ -1,4 +1,5 @@
 from dataclasses import asdict, dataclass
+from json import loads
 import logging
 from os import path
 from typing import List, Union
@@ -124,6 +125,57 @@ async def load_task_extended(user_tasks: List[UserTask], db: Session):
     return user_tasks
 
 
+async def load_retry_job(db: Session, user: User, request: dict) -> dict:
+    """The config of an earlier job of the user, set to analyse again only what failed
+    and to merge the results into a new archive
+    """
+    try:
+        db.query(TaskExtended).first()
+    except ProgrammingError:
+        raise_422([ValidationViolation("task_id", "No job to retry")])
+
+    task = (
+        db.query(UserTask)
+        .filter(UserTask.id == request.get("task_id"), UserTask.user_id == user.id)
+        .first()
+    )
+
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found!",
+        )
+
+    task.load_taskmeta(db)
+
+    if not task.taskmeta or task.taskmeta.status != "SUCCESS" or not task.results_key:
+        raise_422(
+            [
+                ValidationViolation(
+                    "task_id", "Only finished jobs can have their failures retried"
+                )
+            ]
+        )
+
+    task.load_can_retry_value()
+
+    if not task.can_retry or not task.results_exist():
+        raise_422(
+            [
+                ValidationViolation(
+                    "task_id", "The job's audio or results are no longer available"
+                )
+            ]
+        )
+
+    return {
+        **loads(task.taskmeta.kwargs)["config"],
+        "email": request.get("email"),
+        "job_type": "retry_failures",
+        "retry_of": task.results_key,
+    }
+
+
 def make_tokens(user: User):
     return (
         create_access_token(
@@ -154,6 +206,10 @@ async def store_shennong_job(
 
     job = await request.json()
 
+    # the failed (file, processor) pairs of an earlier job, recorded in its archive
+    if job.get("job_type") == "retry_failures":
+        job = await load_retry_job(db, current_user, job)
+
     validate_job_request(job)
 
     email = job.pop("email")
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 from json import loads
 from os import path
+from urllib.parse import urlparse
 
 import boto3
 from celery.backends.database import TaskExtended
@@ -81,6 +82,25 @@ class UserTask(Base):
                     if keycount >= len(files):
                         self.can_retry = True
 
+    @property
+    def results_key(self):
+        """Key of a finished job's archive, which is the path of the download link it
+        returned (archives are stored at the root of the bucket)
+        """
+        if self.taskmeta and isinstance(self.taskmeta.result, str):
+            return path.basename(urlparse(self.taskmeta.result).path)
+
+    def results_exist(self):
+        """Check that a finished job's archive is still in s3"""
+        if not self.results_key:
+            return False
+        response = boto3.client("s3").list_objects_v2(
+            Bucket=Settings.BUCKET_NAME, Prefix=self.results_key
+        )
+        return any(
+            obj["Key"] == self.results_key for obj in response.get("Contents", [])
+        )
+
     def load_taskmeta(self, db):
         """Load task meta and attach, assumes that TaskExtended table existence check
         has been performed by caller
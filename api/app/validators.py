@@ -35,6 +35,15 @@ def validate_job_request(request: dict):
     return _validate_analyses(request, schema)
 
 
+def is_option_list(userval: Any):
+    """Whether a tuple field holds a list of tuples rather than a single one"""
+    return (
+        isinstance(userval, list)
+        and len(userval) > 0
+        and all(isinstance(option, (list, tuple)) for option in userval)
+    )
+
+
 def check_type(userval: Any, spec: Any):
     """Check type against schema"""
     if spec["type"] == "string":
@@ -43,6 +52,11 @@ def check_type(userval: Any, spec: Any):
         return isinstance(userval, str)
 
     if spec["type"] == "tuple":
+        # several options at once, each giving its own results
+        if spec.get("multiple") and is_option_list(userval):
+            return len(userval) == len(set(map(tuple, userval))) and all(
+                check_type(option, {**spec, "multiple": False}) for option in userval
+            )
         if spec.get("options"):
             return userval in spec["options"]
         return isinstance(userval, tuple)
@@ -76,18 +90,120 @@ def _validate_top_level_fields(request: dict):
             ValidationViolation("channel", "Channel should be either 1 or 2")
         )
 
+    channels = request.get("channels")
+
+    # analysed apart, in place of channel
+    if (
+        channels is not None
+        and channels != "all"
+        and (
+            not isinstance(channels, list)
+            or not channels
+            or any(
+                not isinstance(channel, int) or isinstance(channel, bool) or channel < 1
+                for channel in channels
+            )
+            or len(set(channels)) != len(channels)
+        )
+    ):
+        violations.append(
+            ValidationViolation(
+                "channels", "channels must be all or a list of distinct channel numbers"
+            )
+        )
+
     if not isinstance(request["files"], list) or not request["files"]:
         violations.append(
             ValidationViolation("files", "Files[] must contain at least one file")
         )
 
-    allowed_res = [".pkl", ".csv"]
+    allowed_res = [".pkl", ".csv", ".parquet", ".feather", ".h5f"]
 
     if not request["res"] in allowed_res:
         violations.append(
             ValidationViolation("res", f"res must be one of {', '.join(allowed_res)}")
         )
 
+    # codecs each format can be compressed with, formats missing here take none
+    allowed_compression = {
+        ".parquet": ["snappy", "gzip", "zstd", "none"],
+        ".feather": ["lz4", "zstd", "none"],
+    }
+
+    compression = request.get("compression")
+    codecs = allowed_compression.get(request["res"], [])
+
+    if compression is not None and compression not in codecs:
+        violations.append(
+            ValidationViolation(
+                "compression",
+                f"compression for {request['res']} must be one of {', '.join(codecs)}"
+                if codecs
+                else f"{request['res']} results can't be compressed",
+            )
+        )
+
+    float_precision = request.get("float_precision")
+
+    # doubles carry at most 17 significant digits
+    if float_precision is not None and (
+        not isinstance(float_precision, int) or not 1 <= float_precision <= 17
+    ):
+        violations.append(
+            ValidationViolation(
+                "float_precision", "float_precision must be an integer from 1 to 17"
+            )
+        )
+
+    output_dtype = request.get("output_dtype")
+    # parquet only has a half-precision type in recent versions of the format
+    allowed_dtypes = (
+        ["float32"] if request["res"] == ".parquet" else ["float32", "float16"]
+    )
+
+    if output_dtype is not None and output_dtype not in allowed_dtypes:
+        violations.append(
+            ValidationViolation(
+                "output_dtype",
+                f"output_dtype for {request['res']} must be one of "
+                f"{', '.join(allowed_dtypes)}",
+            )
+        )
+
+    threads = request.get("threads")
+
+    # intra-op threads by analysis, "default" standing for all of them
+    if threads is not None and (
+        not isinstance(threads, dict)
+        or any(
+            key != "default" and key not in (request.get("analyses") or {})
+            for key in threads
+        )
+        or any(not isinstance(n, int) or n < 0 for n in threads.values())
+    ):
+        violations.append(
+            ValidationViolation(
+                "threads",
+                "threads must map requested analyses (or default) to 0 threads or more",
+            )
+        )
+
+    job_type = request.get("job_type", "analyse")
+
+    if job_type not in ["analyse", "retry_failures"]:
+        violations.append(
+            ValidationViolation(
+                "job_type", "job_type must be either analyse or retry_failures"
+            )
+        )
+
+    if job_type == "retry_failures" and not isinstance(request.get("retry_of"), str):
+        violations.append(
+            ValidationViolation(
+                "retry_of", "retry_failures jobs need the results they are retrying"
+            )
+        )
+
     try:
         EmailStr.validate(request["email"])
     except Exception:
@@ -156,6 +272,32 @@ def _validate_analyses(request: dict, schema: dict):
                         f"{key} processor field `{arg['name']}` must be of type {arg['type']}",
                     )
                 )
+        # the runner falls back on the schema's defaults for the arguments left out
+        defaults = {
+            arg["name"]: arg.get("default") for arg in processor_schema["init_args"]
+        }
+        window_length = init_args.get("window_length", defaults.get("window_length"))
+        window_overlap = init_args.get("window_overlap", defaults.get("window_overlap"))
+        if (
+            isinstance(window_length, (int, float))
+            and isinstance(window_overlap, (int, float))
+            and window_length
+            and window_overlap >= window_length
+        ):
+            violations.append(
+                ValidationViolation(
+                    "window_overlap",
+                    f"{key} processor field `window_overlap` must be shorter than `window_length`",
+                )
+            )
+        num_threads = init_args.get("num_threads")
+        if isinstance(num_threads, int) and num_threads < 0:
+            violations.append(
+                ValidationViolation(
+                    "num_threads",
+                    f"{key} processor field `num_threads` must be 0 (the runner's default) or more",
+                )
+            )
         for pp in processor_schema["required_postprocessors"]:
             if pp not in analysis["postprocessors"]:
                 violations.append(
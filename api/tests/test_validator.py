@@ -51,6 +51,98 @@ def test_top_level_fails_at_bad_res():
         _validate_top_level_fields(bad_config)
 
 
+def test_top_level_accepts_columnar_res_with_compression():
+    """test that parquet results can be requested with one of its codecs"""
+    config = top_level_valid.copy()
+    config["res"] = ".parquet"
+    config["compression"] = "zstd"
+    assert _validate_top_level_fields(config)
+
+
+def test_top_level_fails_at_bad_compression():
+    """test that codecs are checked against the requested format"""
+    bad_config = top_level_valid.copy()
+    bad_config["res"] = ".feather"
+    bad_config["compression"] = "snappy"
+    with raises(HTTPException):
+        _validate_top_level_fields(bad_config)
+
+    bad_config["res"] = ".csv"
+    bad_config["compression"] = "gzip"
+    with raises(HTTPException):
+        _validate_top_level_fields(bad_config)
+
+
+def test_top_level_fails_at_bad_float_precision():
+    """test that csv precision must be a sensible number of digits"""
+    config = top_level_valid.copy()
+    config["float_precision"] = 6
+    assert _validate_top_level_fields(config)
+
+    for bad_precision in [0, 18, "6"]:
+        config["float_precision"] = bad_precision
+        with raises(HTTPException):
+            _validate_top_level_fields(config)
+
+
+def test_top_level_fails_at_bad_output_dtype():
+    """test that features can only be written in a narrower float dtype the format has"""
+    config = top_level_valid.copy()
+    for output_dtype in ["float32", "float16"]:
+        config["output_dtype"] = output_dtype
+        assert _validate_top_level_fields(config)
+
+    for bad_dtype in ["float64", "int8", 32]:
+        config["output_dtype"] = bad_dtype
+        with raises(HTTPException):
+            _validate_top_level_fields(config)
+
+    config = {**top_level_valid, "res": ".parquet", "output_dtype": "float16"}
+    with raises(HTTPException):
+        _validate_top_level_fields(config)
+
+
+def test_top_level_fails_at_bad_threads():
+    """test that thread counts must be given per requested analysis, or as a default"""
+    config = top_level_valid.copy()
+    config["analyses"] = {"mfcc": {}}
+    config["threads"] = {"mfcc": 2, "default": 0}
+    assert _validate_top_level_fields(config)
+
+    for bad_threads in [4, {"plp": 2}, {"mfcc": -1}, {"default": "2"}]:
+        config["threads"] = bad_threads
+        with raises(HTTPException):
+            _validate_top_level_fields(config)
+
+
+def test_top_level_fails_at_bad_retry():
+    """test that retrying failures needs the results of the job they come from"""
+    config = top_level_valid.copy()
+    config["job_type"] = "retry_failures"
+    with raises(HTTPException):
+        _validate_top_level_fields(config)
+
+    config["retry_of"] = "sfo-results-csv-abc.zip"
+    assert _validate_top_level_fields(config)
+
+    config["job_type"] = "reanalyse"
+    with raises(HTTPException):
+        _validate_top_level_fields(config)
+
+
+def test_top_level_fails_at_bad_channels():
+    """test that channels is either all or a list of distinct channel numbers"""
+    config = top_level_valid.copy()
+    for channels in ["all", [2], [1, 3]]:
+        config["channels"] = channels
+        assert _validate_top_level_fields(config)
+
+    for bad_channels in ["both", 2, [], [0], [1, 1], ["1"], [True]]:
+        config["channels"] = bad_channels
+        with raises(HTTPException):
+            _validate_top_level_fields(config)
+
+
 def test_top_level_fails_at_bad_email():
     """test that a bad email value will raise exception"""
     bad_config = top_level_valid.copy()
@@ -114,3 +206,71 @@ def test_analysis_validation_fails_string_check():
                 },
             },
         )
+
+
+def test_analysis_validation_fails_when_windows_overlap_entirely():
+    """test that inference windows must advance"""
+    schema = {
+        "processors": {
+            "a": {
+                "init_args": [
+                    {"name": "window_length", "type": "number", "runner": True},
+                    {"name": "window_overlap", "type": "number", "runner": True},
+                ],
+                "required_postprocessors": [],
+            }
+        }
+    }
+    job_config = {
+        "analyses": {
+            "a": {
+                "init_args": {"window_length": 10.0, "window_overlap": 2.0},
+                "postprocessors": [],
+            }
+        }
+    }
+    assert _validate_analyses(job_config, schema)
+
+    job_config["analyses"]["a"]["init_args"]["window_overlap"] = 10.0
+    with raises(HTTPException):
+        _validate_analyses(job_config, schema)
+
+    # a window left out overlaps by the schema's default
+    schema["processors"]["a"]["init_args"][1]["default"] = 5.0
+    job_config["analyses"]["a"]["init_args"] = {"window_length": 3.0}
+    with raises(HTTPException):
+        _validate_analyses(job_config, schema)
+
+
+def test_check_type_accepts_several_options_when_multiple():
+    """test that fields flagged `multiple` take a list of distinct options"""
+    layers = [["convolutional", "1"], ["encoder", "6"], ["encoder", "9"]]
+    spec = {"type": "tuple", "options": layers, "multiple": True}
+
+    assert check_type(["encoder", "6"], spec) is True
+    assert check_type([["encoder", "6"], ["encoder", "9"]], spec) is True
+    assert check_type([["encoder", "6"], ["encoder", "6"]], spec) is False
+    assert check_type([["encoder", "6"], ["encoder", "12"]], spec) is False
+    assert check_type([["encoder", "6"]], {**spec, "multiple": False}) is False
+
+
+def test_analysis_validation_fails_with_negative_threads():
+    """test that models run on at least one thread, 0 leaving it to the runner"""
+    schema = {
+        "processors": {
+            "a": {
+                "init_args": [
+                    {"name": "num_threads", "type": "integer", "runner": True}
+                ],
+                "required_postprocessors": [],
+            }
+        }
+    }
+    job_config = {
+        "analyses": {"a": {"init_args": {"num_threads": 0}, "postprocessors": []}}
+    }
+    assert _validate_analyses(job_config, schema)
+
+    job_config["analyses"]["a"]["init_args"]["num_threads"] = -1
+    with raises(HTTPException):
+        _validate_analyses(job_config, schema)
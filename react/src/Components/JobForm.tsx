@@ -118,6 +118,14 @@ const Label: React.FC<{
 const isBoolean = (arg: boolean | any): arg is boolean =>
     typeof arg === 'boolean';
 
+/* Options selected in a multiple select, whose value may still be a single option (e.g., the default) */
+const selectedOptions = (value: any, options: FormItem['options'] = []) => {
+    const selected = Array.isArray(value) && Array.isArray(value[0]) ? value : [value];
+    return (options as any[]).filter(o =>
+        selected.some((s: any) => s.toString() === o.toString())
+    );
+};
+
 const resolveInputComponent = (config: FormItem) => {
     if (config.component) {
         return config.component;
@@ -227,6 +235,29 @@ export default function JobFormField<K extends boolean | string | number | Array
                                 helpLinks={config.helpLinks}
                             />
                         </FormLabel>
+                    {config.multiple ? (
+                        <Select
+                            multiple
+                            value={selectedOptions(value, config.options).map(o =>
+                                o.toString()
+                            )}
+                            onChange={event =>
+                                update(
+                                    (config.options || []).filter(o =>
+                                        (event.target.value as string[]).includes(
+                                            o.toString()
+                                        )
+                                    )
+                                )
+                            }
+                        >
+                            {(config.options || []).map(o => (
+                                <MenuItem key={o.toString()} value={o.toString()}>
+                                    {capitalize(o.toString())}
+                                </MenuItem>
+                            ))}
+                        </Select>
+                    ) : (
                     <Select defaultValue={config.default}
                     value={value}
                     onChange={(event) => update(event.target.value)}>
@@ -238,6 +269,7 @@ export default function JobFormField<K extends boolean | string | number | Array
                             </MenuItem>
                         ))}
                     </Select>
+                    )}
                 </FormControl>
             );
         default:
@@ -426,9 +458,13 @@ export const argumentDisplayFields: FieldDisplaySchema = {
         component: 'number',
         label: 'Frame length (seconds)',
     },
+    inference_backend: {
+        component: 'radio',
+        label: 'Inference backend (int8 and compiled trade some accuracy for speed)',
+    },
     layer_info: {
         component: 'select',
-        label: 'Layer type, Layer number',
+        label: 'Layer type, Layer number (one file per layer)',
     },
     max_f0: {
         component: 'number',
@@ -442,10 +478,22 @@ export const argumentDisplayFields: FieldDisplaySchema = {
         component: 'radio',
         label: 'Model Capacity',
     },
+    num_threads: {
+        component: 'number',
+        label: 'Inference threads (0 for the runner default)',
+    },
     snip_edges: {
         component: 'checkbox',
         label: 'Snip Edges',
     },
+    window_length: {
+        component: 'number',
+        label: 'Inference window for long files (seconds, 0 for whole files)',
+    },
+    window_overlap: {
+        component: 'number',
+        label: 'Overlap between inference windows (seconds)',
+    },
     window_type: {
         component: 'radio',
         helpLinks: [
@@ -500,10 +548,28 @@ export const globalDisplayFields: FormItem[] = [
                 >
                     Pandas dataframe
                 </Link>
-                , or csv.
+                , csv, and the compressed columnar formats{' '}
+                <Link target="_blank" href="https://parquet.apache.org/">
+                    .parquet
+                </Link>
+                ,{' '}
+                <Link
+                    target="_blank"
+                    href="https://arrow.apache.org/docs/python/feather.html"
+                >
+                    .feather
+                </Link>{' '}
+                and{' '}
+                <Link
+                    target="_blank"
+                    href="https://docs.cognitive-ml.fr/h5features/"
+                >
+                    .h5f
+                </Link>
+                , which are smaller and much faster to read back for large jobs.
             </>
         ),
-        options: ['.pkl', '.csv'],
+        options: ['.pkl', '.csv', '.parquet', '.feather', '.h5f'],
         required: true,
     },
 ];
@@ -64,6 +64,8 @@ export interface ProcessorFieldSchema {
     default: string | number | boolean | Array<string>;
     required: boolean;
     options?: string[] | number[] | Array<string>[];
+    runner?: boolean;
+    multiple?: boolean;
 }
 
 export interface ProcessorSchema extends PostprocessorSchema {
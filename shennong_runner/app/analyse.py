@@ -1,26 +1,50 @@
-from contextlib import AbstractContextManager
-from dataclasses import dataclass
-from importlib import import_module
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import AbstractContextManager, nullcontext
+from dataclasses import dataclass, replace
+from functools import partial
 import json
 import logging
-from os import mkdir, path
+from multiprocessing import get_context
+from os import listdir, mkdir, path, remove
 from pathlib import Path
-from shutil import make_archive
+from shutil import copyfileobj, disk_usage, move, rmtree
 import tempfile
-from typing import Any, Dict, List, Union
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 import uuid
+from zipfile import ZipFile
 
 import boto3
 import numpy as np
-import pandas as pd
-from shennong import FeaturesCollection
+from shennong import Features, FeaturesCollection
 from shennong.audio import Audio
 
-# this is here to prevent a circular dependency
-from shennong.processor.pitch_kaldi import KaldiPitchPostProcessor
-from shennong.postprocessor.cmvn import CmvnPostProcessor
-
+from app.archive import MultipartUpload, ResultArchive
+from app.audio import DecodedAudio, SharedSamples
+from app.audio_store import AudioStore
+from app.backends import use_backend
+from app.batching import FrameBatch, batch_files
+from app.checkpoints import JobCheckpoint, job_key
+from app.chunking import (
+    CHUNKABLE_PROCESSORS,
+    frame_geometry,
+    is_chunkable,
+    num_frames,
+    process_in_chunks,
+)
+from app.feature_cache import FeatureCache, feature_key
+from app.frontend import DERIVATIONS, FRAMING_PARAMS, SharedFrontEnd, framing
+from app.layers import MultiLayerProcessor, layer_list, layer_name
+from app.metrics import FileMetrics, emit, job_summary, merge
+from app.postprocessing import PostprocessorGraph
+from app.windowing import WINDOWED_PROCESSORS, model_frame_shift, process_in_windows
+from app.processor_cache import PROCESSOR_SIZES_MB, ProcessorCache
+from app.registry import prewarm, resolve_class, shennong_schema
+from app.resources import cpu_count, pool_size, thread_budget, thread_limits
 from app.settings import settings as app_settings
+from app.threads import ThreadPolicy
+from app.writers import WRITERS
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -29,15 +53,60 @@ formatter = logging.Formatter("%(asctime)s - %(message)s")
 ch.setFormatter(formatter)
 logger.addHandler(ch)
 
-
-with open(path.join(app_settings.PROJECT_ROOT, "processor-schema.json")) as f:
-    shennong_schema = json.loads(f.read())
+# what the runner writes about the job into its archive, besides the results
+JOB_FILES = ("error-log.txt", "failures.json", "metrics.json", "settings.json")
 
 
 def resolve_processor(class_key: str, init_args: Dict[str, Any]):
-    class_name = shennong_schema["processors"][class_key]["class_name"]
-    cls = getattr(import_module(f"shennong.processor"), class_name)
-    return cls(**init_args)
+    return resolve_class("processors", class_key)(**init_args)
+
+
+def split_runner_args(
+    class_key: str, init_args: Dict[str, Any]
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Separate the arguments the runner handles itself (flagged `runner` in the schema)
+    from those passed on to the processor, filling in schema defaults for missing ones
+    """
+    runner_specs = [
+        arg
+        for arg in shennong_schema["processors"].get(class_key, {}).get("init_args", [])
+        if arg.get("runner")
+    ]
+    runner_args = {
+        arg["name"]: init_args.get(arg["name"], arg["default"]) for arg in runner_specs
+    }
+    return {k: v for k, v in init_args.items() if k not in runner_args}, runner_args
+
+
+def analysis_framing(key: str, settings: Dict[str, Any]) -> Union[Tuple, None]:
+    """Framing parameters of the analysis, when it could be derived from a shared front end"""
+    if key not in DERIVATIONS:
+        return None
+    init_args = {
+        **{
+            arg["name"]: arg["default"]
+            for arg in shennong_schema["processors"][key]["init_args"]
+        },
+        **settings["init_args"],
+    }
+    if init_args.get("rasta"):
+        return None
+    return framing(init_args)
+
+
+def analysis_framings(analyses: Dict[str, Any]) -> List[Tuple]:
+    """Framing parameters of each analysis that could be derived from a shared front end"""
+    framings = [analysis_framing(key, settings) for key, settings in analyses.items()]
+    return [f for f in framings if f is not None]
+
+
+def split_analyses(analyses: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Groups of the analyses that can run apart, those sharing a front end staying together"""
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for key, settings in analyses.items():
+        group = analysis_framing(key, settings) or key
+        groups.setdefault(group, {})[key] = settings
+    return list(groups.values())
 
 
 @dataclass
@@ -53,13 +122,43 @@ class JobConfig:
     files: List[str]
     save_path: str
     res: str
+    # codec for the parquet and feather outputs, defaults to each format's own
+    compression: str = None
+    # significant digits of csv outputs, defaults to as many as it takes to round-trip
+    float_precision: int = None
+    # dtype the feature columns are written in (float32 or float16), times staying
+    # float64, defaults to the features' own
+    output_dtype: str = None
+    # intra-op threads by processor key (or "default"), overriding the runner's ThreadPolicy
+    threads: Dict[str, int] = None
+    # "all" or a list of channels, each analysed apart with outputs suffixed _ch{n}, in
+    # place of `channel`
+    channels: Union[str, List[int]] = None
+    # "retry_failures" jobs only analyse the failures recorded in the archive of an
+    # earlier job (at `retry_of`), and add the rest of its results to their own
+    job_type: str = "analyse"
+    retry_of: str = None
+
+    @property
+    def requested_channels(self) -> Union[int, str, List[int]]:
+        """The channel, or channels, the files are analysed on"""
+        return self.channels or self.channel
+
+    @property
+    def write_options(self) -> Dict[str, Any]:
+        """Options passed on to the result writers"""
+        return {
+            "compression": self.compression,
+            "float_precision": self.float_precision,
+            "output_dtype": self.output_dtype,
+        }
 
 
 class CmvnWrapper:
     """A wrapper for this postprocessor, so that it implements our simplified API"""
 
     def __init__(self, ndims: int):
-        self.processor = CmvnPostProcessor(ndims)
+        self.processor = resolve_class("postprocessors", "cmvn")(ndims)
 
     def process(self, features):
         self.processor.accumulate(features)
@@ -69,19 +168,12 @@ class CmvnWrapper:
 def resolve_postprocessor(class_key: str, features=None):
     if class_key == "cmvn":
         return CmvnWrapper(features.ndims)
-    class_name = shennong_schema["postprocessors"][class_key]["class_name"]
     # we don't allow user to change init args but it is possible to override defaults ourselves in the schema
     init_args = {
         v["name"]: v["default"]
         for v in shennong_schema["postprocessors"][class_key]["init_args"]
     }
-    try:
-        module = import_module(f"shennong.postprocessor.{class_key}")
-        return module.__dict__[class_name](**init_args)
-    except ImportError:
-        # For crepe and kaldi, postprocessors are located in respective processor module
-        module = import_module(f"shennong.processor.{class_key}")
-        return module.__dict__[class_name](**init_args)
+    return resolve_class("postprocessors", class_key)(**init_args)
 
 
 def get_delta_cols(feature_cols: np.array):
@@ -162,25 +254,60 @@ def get_feature_col_names(
 
 
 def save_result(
-    processor_result, save_path: str, res_type: str, feature_col_names: list
+    processor_result,
+    save_path: str,
+    res_type: str,
+    feature_col_names: list,
+    opener: Callable = open,
+    write_options: Dict[str, Any] = None,
 ):
 
     process_times, process_data = get_times_and_data_cols(processor_result)
 
-    df = pd.DataFrame(np.hstack((process_times, process_data)))
+    output_dtype = (write_options or {}).get("output_dtype")
+    if output_dtype is not None:
+        # seconds into the file, which reduced precision would blur as it goes on
+        process_times = process_times.astype(np.float64, copy=False)
+        process_data = process_data.astype(output_dtype, copy=False)
 
     timecols = ["start", "end"]
 
-    df.columns = [
-        f"time_{timecols[i]}" for i in range(process_times.shape[1])
-    ] + feature_col_names
+    time_col_names = [f"time_{timecols[i]}" for i in range(process_times.shape[1])]
 
     out_path = f"{save_path}{res_type}"
 
-    mode = "wb" if res_type == ".pkl" else "w"
+    if res_type in WRITERS:
+        writer, mode = WRITERS[res_type]
+        with opener(out_path, mode) as f:
+            writer(
+                f,
+                process_times,
+                process_data,
+                time_col_names,
+                feature_col_names,
+                path.basename(save_path),
+                **(write_options or {}),
+            )
+        return
+
+    # imported here so that jobs with other output formats don't pay for pandas
+    import pandas as pd
+
+    if output_dtype is None:
+        df = pd.DataFrame(np.hstack((process_times, process_data)))
+        df.columns = time_col_names + feature_col_names
+    else:
+        # apart, so that the features aren't upcast alongside the times
+        df = pd.concat(
+            [
+                pd.DataFrame(process_times, columns=time_col_names),
+                pd.DataFrame(process_data, columns=feature_col_names),
+            ],
+            axis=1,
+        )
 
-    with open(out_path, mode) as f:
-        df.to_pickle(f) if res_type == ".pkl" else df.to_csv(f, index=False)
+    with opener(out_path, "wb") as f:
+        df.to_pickle(f)
 
 
 def save_results(
@@ -188,6 +315,8 @@ def save_results(
     collection: FeaturesCollection,
     base_save_path: str,
     res_type: str,
+    opener: Callable = open,
+    write_options: Dict[str, Any] = None,
 ):
     """Iterate over results from processor and postprocessors and save files individually"""
     _, data = get_times_and_data_cols(collection[primary_processor])
@@ -197,6 +326,8 @@ def save_results(
         f"{base_save_path}_{primary_processor}",
         res_type,
         main_processor_column_names,
+        opener,
+        write_options,
     )
 
     for processor, v in collection.items():
@@ -212,6 +343,8 @@ def save_results(
             f"{base_save_path}_{primary_processor}_{processor}",
             res_type,
             feature_col_names,
+            opener,
+            write_options,
         )
 
     return True
@@ -221,23 +354,109 @@ class Analyser:
     """Resolve processors and postprocessors from config and run analyses"""
 
     def __init__(
-        self, filepath: str, channel: int, collection: FeaturesCollection,
+        self,
+        audio: DecodedAudio,
+        collection: FeaturesCollection,
+        processors: ProcessorCache = None,
+        frontend: SharedFrontEnd = None,
+        features: FeatureCache = None,
+        graph: PostprocessorGraph = None,
+        threads: ThreadPolicy = None,
+        metrics: FileMetrics = None,
     ):
         self.collection = collection
-        sound = Audio.load(filepath)
-        if (
-            sound.nchannels > 1
-        ):  # converting to mono; user-set or default channel chosen:
-            sound = sound.channel(channel - 1)
-        self.sound = sound
+        self.audio = audio
+        # when set, processors are shared with the other files of the job
+        self.processors = processors
+        # when set, frame-based processors share their framing with the file's other analyses
+        self.frontend = frontend
+        # when set, results are looked up by audio content and settings before computing
+        self.features = features
+        # voice activity shared with the other analyses of the file
+        self.graph = (
+            graph if graph is not None else PostprocessorGraph(resolve_postprocessor)
+        )
+        # thread counts of the numerical libraries while each processor runs
+        self.threads = threads if threads is not None else ThreadPolicy(cpu_count())
+        # when set, the time each stage takes is recorded there
+        self.metrics = metrics
+
+    @property
+    def sound(self):
+        return self.audio.sound
+
+    def timed(self, key: str, stage: str):
+        return self.metrics.timed(key, stage) if self.metrics else nullcontext()
+
+    def energy(self):
+        """Log energy of the file (with the energy defaults) for voice activity"""
+        init_args = {
+            arg["name"]: arg["default"]
+            for arg in shennong_schema["processors"]["energy"]["init_args"]
+        }
+        init_args["sample_rate"] = self.audio.sample_rate
+        return self.run_processor("energy", self.get_processor("energy", init_args))
+
+    def get_processor(
+        self, key: str, init_args: Dict[str, Any], runner_args: Dict[str, Any] = None
+    ):
+        processor = (
+            self.processors.get(key, init_args)
+            if self.processors is not None
+            else resolve_processor(key, init_args)
+        )
+        runner_args = runner_args or {}
+        if runner_args.get("inference_backend"):
+            use_backend(processor, runner_args["inference_backend"])
+        return processor
 
     def postprocess(self, postprocessor: str, processor_type: str):
-        postprocessor = resolve_postprocessor(
-            postprocessor, self.collection[processor_type]
+        return self.graph.process(
+            postprocessor, self.collection[processor_type], self.energy
         )
-        return postprocessor.process(self.collection[processor_type])
 
-    def process(self, key: str, settings: Dict[str, Any]):
+    def run_processor(self, key: str, processor, runner_args: Dict[str, Any] = None):
+        """Run the processor on the file, within the thread counts the policy gives it"""
+        runner_args = runner_args or {}
+        with self.threads.limits(key, runner_args.get("num_threads", 0)):
+            return self.apply_processor(key, processor, runner_args)
+
+    def apply_processor(self, key: str, processor, runner_args: Dict[str, Any]):
+        """Run the processor on the file, in chunks or windows when it is long enough to need it"""
+        if key in WINDOWED_PROCESSORS and runner_args.get("window_length"):
+            sound = self.audio.for_processor(key)
+            if sound.duration > runner_args["window_length"]:
+                return process_in_windows(
+                    processor,
+                    sound,
+                    model_frame_shift(key, processor),
+                    runner_args["window_length"],
+                    runner_args["window_overlap"],
+                )
+            return processor.process(sound)
+        if app_settings.CHUNK_SECONDS and is_chunkable(key, processor):
+            samples = self.audio.samples()
+            if samples.shape[0] > app_settings.CHUNK_SECONDS * self.audio.sample_rate:
+                return process_in_chunks(
+                    processor,
+                    samples,
+                    self.audio.sample_rate,
+                    int(app_settings.CHUNK_SECONDS / processor.frame_shift),
+                )
+        if self.frontend is not None and self.frontend.handles(key, processor):
+            return self.frontend.process(key, processor, self.audio.for_processor(key))
+        return processor.process(self.audio.for_processor(key))
+
+    def process(
+        self,
+        key: str,
+        settings: Dict[str, Any],
+        compute: Callable[[], Features] = None,
+    ):
+        """Run the processor and its postprocessors on the file, unless their results are
+        cached. `compute`, when given, returns the processor's features computed some
+        other way (e.g., along with other files').
+        """
         postprocessors = settings["postprocessors"] or []
 
         # make sure that, if present, the 'eponymous' postprocessor runs first,
@@ -245,16 +464,122 @@ class Analyser:
         postprocessors.sort(key=lambda pp: -1 if pp == key else 0)
 
         if settings["init_args"].get("sample_rate"):
-            settings["init_args"]["sample_rate"] = self.sound.sample_rate
-        processor = resolve_processor(key, settings["init_args"])
-        self.collection[key] = processor.process(self.sound)
-        if postprocessors:
-            for pp in postprocessors:
-                # if processor and postprocessor have the same name (e.g., crepe & kaldi), we will overwrite
-                # processor output with postprocessor output in collection
-                logger.info(f"starting {pp} postprocessor")
+            settings["init_args"]["sample_rate"] = self.audio.sample_rate
+
+        if self.features is not None:
+            cache_key = feature_key(
+                self.audio.content_hash(), key, settings["init_args"], postprocessors
+            )
+            cached = self.features.get(cache_key)
+            if cached is not None:
+                logger.info(f"reusing cached {key} results")
+                if self.metrics:
+                    self.metrics.cached(key)
+                self.collection.update(cached)
+                return
+
+        with self.timed(key, "compute"):
+            if compute is None:
+                init_args, runner_args = split_runner_args(key, settings["init_args"])
+                processor = self.get_processor(key, init_args, runner_args)
+                self.collection[key] = self.run_processor(key, processor, runner_args)
+            else:
+                self.collection[key] = compute()
+        self.run_postprocessors(key, postprocessors)
+
+        if self.features is not None:
+            self.features.put(
+                cache_key, {k: self.collection[k] for k in [key] + postprocessors}
+            )
+
+    def run_postprocessors(self, key: str, postprocessors: List[str]):
+        for pp in postprocessors:
+            # if processor and postprocessor have the same name (e.g., crepe & kaldi), we will overwrite
+            # processor output with postprocessor output in collection
+            logger.info(f"starting {pp} postprocessor")
+            with self.timed(key, pp):
                 self.collection[pp] = self.postprocess(pp, key)
-                logger.info(f"finished {pp} postprocessor")
+            logger.info(f"finished {pp} postprocessor")
+
+    def analyse(
+        self,
+        key: str,
+        settings: Dict[str, Any],
+        compute: Callable[[], Features] = None,
+    ) -> Dict[str, FeaturesCollection]:
+        """Run the analysis, returning its results by name: the processor's own, or one
+        collection per layer when several layers of a model are requested
+        """
+        if "layer_info" in settings["init_args"]:
+            layers = layer_list(settings["init_args"]["layer_info"])
+            if len(layers) > 1:
+                return self.process_layers(key, settings, layers)
+            settings["init_args"]["layer_info"] = layers[0]
+        self.process(key, settings, compute)
+        return {key: self.collection}
+
+    def process_layers(
+        self, key: str, settings: Dict[str, Any], layers: List[Tuple[str, str]]
+    ) -> Dict[str, FeaturesCollection]:
+        """Read several layers of a model from a single load and forward pass, each
+        layer then postprocessed (and cached) as if it had been requested on its own
+        """
+        postprocessors = settings["postprocessors"] or []
+
+        if settings["init_args"].get("sample_rate"):
+            settings["init_args"]["sample_rate"] = self.audio.sample_rate
+
+        names = [layer_name(key, layer) for layer in layers]
+        results = {name: FeaturesCollection() for name in names}
+        layer_args = [
+            {**settings["init_args"], "layer_info": layer} for layer in layers
+        ]
+
+        if self.features is not None:
+            cache_keys = [
+                feature_key(self.audio.content_hash(), key, args, postprocessors)
+                for args in layer_args
+            ]
+            cached = [self.features.get(cache_key) for cache_key in cache_keys]
+            if all(layer is not None for layer in cached):
+                logger.info(f"reusing cached {key} results")
+                for name, layer in zip(names, cached):
+                    if self.metrics:
+                        self.metrics.cached(name)
+                    # cached under the processor's name, as for a single layer
+                    results[name].update(
+                        {name if k == key else k: v for k, v in layer.items()}
+                    )
+                return results
+
+        init_args, runner_args = split_runner_args(key, layer_args[0])
+        with self.timed(key, "compute"):
+            processor = MultiLayerProcessor(
+                self.get_processor(key, init_args, runner_args), layers
+            )
+            features = processor.split(self.run_processor(key, processor, runner_args))
+
+        for i, name in enumerate(names):
+            analyser = Analyser(
+                self.audio,
+                results[name],
+                self.processors,
+                graph=self.graph,
+                threads=self.threads,
+                metrics=self.metrics,
+            )
+            analyser.collection[name] = features[i]
+            analyser.run_postprocessors(name, postprocessors)
+            if self.features is not None:
+                self.features.put(
+                    cache_keys[i],
+                    {
+                        key: features[i],
+                        **{pp: results[name][pp] for pp in postprocessors},
+                    },
+                )
+
+        return results
 
 
 class LocalFileManager(AbstractContextManager):
@@ -283,20 +608,123 @@ class LocalFileManager(AbstractContextManager):
         mkdir(self.results_dir)
         mkdir(self.tmp_download_dir)
         self.error_log_path = path.join(self.results_dir, "error-log.txt")
+        self.zip_path = path.join(self.tmp_dir, "sfo-results.zip")
+        # results are streamed into the archive as they are saved, once it is opened
+        self.archive: ResultArchive = None
+        # the bucket whose feature cache prefix is shared between jobs, if any
+        self.bucket: str = None
+        # where finished files are kept until the job is stored, if anywhere
+        self.checkpoint: JobCheckpoint = None
+        # uploads converted once to a layout the samples can be mapped from, if enabled
+        self.audio_store: AudioStore = None
 
     def __exit__(self, exc_type, exc_value, traceback):
-        pass
+        if exc_type is not None and self.archive is not None:
+            self.archive.abort()
 
     def log_error(self, error: str):
         with open(self.error_log_path, "a+") as f:
             f.write(f"{error}\n")
 
-    def zip_tmp_files(self):
-        """Zip intermediate files"""
-        return make_archive(
-            path.join(self.tmp_dir, "sfo-results"), "zip", self.outer_results_dir,
+    def load_audio(self, key: str) -> str:
+        """Local path of the audio at `key`, converted to the canonical layout when the
+        audio store is enabled
+        """
+        if self.audio_store is None:
+            return self.load(key)
+        return self.audio_store.load(key, self.load)
+
+    def prefetch(self, keys: List[str]) -> Iterator[Tuple[str, str]]:
+        """Yield (key, local path) for each key, in order, loading each one only when it is needed"""
+        for key in keys:
+            yield key, self.load_audio(key)
+
+    def discard(self, local_path: str):
+        """Remove a download once its last analysis is done with it"""
+        directory = path.dirname(local_path)
+        if directory == self.tmp_download_dir and path.exists(local_path):
+            remove(local_path)
+        elif self.audio_store is not None:
+            if directory == self.audio_store.store_dir:
+                self.audio_store.release(local_path)
+
+    def archive_stream(self, save_path: str):
+        """Where the zipped results are written"""
+        return open(self.zip_path, "wb")
+
+    def open_archive(self, save_path: str):
+        self.archive = ResultArchive(self.archive_stream(save_path))
+
+    def open_result(self, file_path: str, mode: str = "w"):
+        """Stand-in for builtin `open` that writes results straight into the open archive"""
+        if self.archive is None or path.dirname(file_path) != self.results_dir:
+            return open(file_path, mode)
+        return self.archive.open(path.basename(file_path), mode)
+
+    def staging_dir(self) -> str:
+        """A fresh directory for results written by another process"""
+        staging_dir = path.join(self.tmp_dir, uuid.uuid4().hex)
+        mkdir(staging_dir)
+        return staging_dir
+
+    def archive_dir(self, directory: str):
+        """Move results written to `directory` into the archive (or into results_dir, if it isn't open)"""
+        if self.archive is not None:
+            self.archive.add_dir(directory)
+        else:
+            for name in listdir(directory):
+                move(path.join(directory, name), self.results_dir)
+        if directory != self.results_dir:
+            rmtree(directory)
+
+    def finish_file(self, file_path: str, directory: str, failed: List[str]):
+        """Checkpoint a file's results, written to `directory`, and archive them"""
+        if self.checkpoint is not None:
+            self.checkpoint.save(file_path, directory, failed)
+        if directory != self.results_dir:
+            self.archive_dir(directory)
+
+    def restore(self, entry: Dict[str, Any]) -> bool:
+        """Add the results of a file finished by an earlier run of the job, returning
+        whether they could be
+        """
+        return self.checkpoint.restore(
+            entry,
+            lambda name: self.open_result(path.join(self.results_dir, name), "wb"),
         )
 
+    def carry_over(self, archive_path: str, files: List[str]) -> List[Dict[str, str]]:
+        """Add the results of an earlier job's archive, returning the failures it recorded
+        (read back from its error log if it predates failures.json)
+        """
+        failures, error_log = None, ""
+        with ZipFile(archive_path) as previous:
+            for info in previous.infolist():
+                name = path.basename(info.filename)
+                if info.is_dir():
+                    continue
+                if name == "failures.json":
+                    failures = json.loads(previous.read(info))
+                elif name == "error-log.txt":
+                    error_log = previous.read(info).decode()
+                # the job's own files are written anew
+                elif name not in JOB_FILES:
+                    with previous.open(info) as src, self.open_result(
+                        path.join(self.results_dir, name), "wb"
+                    ) as dst:
+                        copyfileobj(src, dst)
+        if failures is None:
+            failures = logged_failures(error_log, files)
+        return failures
+
+    def zip_tmp_files(self):
+        """Add whatever is left in results_dir (e.g., the error log) to the archive and finish it"""
+        if self.archive is None:
+            self.open_archive(None)
+        self.archive_dir(self.results_dir)
+        self.archive.close()
+        return self.zip_path
+
 
 class S3FileManager(LocalFileManager):
     """S3 client provider that employs and overrides local methods as necessary."""
@@ -306,68 +734,858 @@ class S3FileManager(LocalFileManager):
         self.resource = boto3.resource("s3")
         self.client = boto3.client("s3")
         self.bucket = bucket_name
+        if app_settings.AUDIO_STORE_MB or app_settings.AUDIO_STORE_PREFIX:
+            self.audio_store = AudioStore(
+                app_settings.AUDIO_STORE_DIR,
+                app_settings.AUDIO_STORE_MB,
+                self.client,
+                bucket_name,
+                app_settings.AUDIO_STORE_PREFIX,
+            )
 
     def load(self, key):
         """Download file from s3 and store both key and local temp path for cleanup"""
-        save_path = path.join(self.tmp_download_dir, path.basename(key))
-        self.resource.Bucket(self.bucket).download_file(key, save_path)
+        # keys from different prefixes may share a basename and be on disk at the same time
+        save_path = path.join(
+            self.tmp_download_dir, f"{uuid.uuid4().hex[:8]}-{path.basename(key)}"
+        )
+        # unlike resources, clients are thread-safe, which prefetching relies on
+        self.client.download_file(self.bucket, key, save_path)
         return save_path
 
+    def scratch_space(self) -> int:
+        """Bytes the download dir may still take up, keeping a reserve for results"""
+        return (
+            disk_usage(self.tmp_download_dir).free
+            - app_settings.SCRATCH_RESERVE_MB * 1024 ** 2
+        )
+
+    def prefetch(self, keys: List[str]) -> Iterator[Tuple[str, str]]:
+        """Download up to `PREFETCH_DEPTH` files ahead on a thread pool while earlier ones are analysed.
+        A download is only queued if the scratch disk can hold it on top of those already queued,
+        though one is always allowed so that the job can progress.
+        """
+        depth = app_settings.PREFETCH_DEPTH
+        if depth < 1:
+            yield from super().prefetch(keys)
+            return
+
+        waiting = deque(keys)
+        sizes = {}
+        queued = deque()
+
+        with ThreadPoolExecutor(depth) as pool:
+            while waiting or queued:
+                while waiting and len(queued) < depth:
+                    key = waiting[0]
+                    if key not in sizes:
+                        sizes[key] = self.client.head_object(
+                            Bucket=self.bucket, Key=key
+                        )["ContentLength"]
+                    queued_bytes = sum(sizes[k] for k, _ in queued)
+                    if queued and queued_bytes + sizes[key] > self.scratch_space():
+                        break
+                    queued.append(
+                        (waiting.popleft(), pool.submit(self.load_audio, key))
+                    )
+
+                key, download = queued.popleft()
+                yield key, download.result()
+
+    def archive_stream(self, save_path: str):
+        """Upload the archive in parts while it is being written, rather than zipping it to disk first"""
+        return MultipartUpload(self.client, self.bucket, save_path)
+
     def store(self, save_path: str):
-        """Zip up results, upload to bucket, and queue local zip file for removal"""
-        zip_path = self.zip_tmp_files()
-        self.resource.meta.client.upload_file(zip_path, self.bucket, save_path)
+        """Finish the archive, which completes its upload to the bucket"""
+        if self.archive is None:
+            self.open_archive(save_path)
+        self.zip_tmp_files()
         return True
 
 
-def process_data(job_args: JobArgs,):
-    """Process each file passed for analysis"""
+def batch_framings(analyses: Dict[str, Any], geometry: Tuple) -> List[Tuple]:
+    """Framings of the analyses whose frames are laid out as `geometry` (frame shift,
+    frame length, snip_edges) in a batch buffer, where frames are always snipped
+    """
+    framings = []
+    for params in analysis_framings(analyses):
+        params = dict(zip(FRAMING_PARAMS, params))
+        layout = (params["frame_shift"], params["frame_length"], params["snip_edges"])
+        if layout == geometry:
+            framings.append(framing({**params, "snip_edges": True}))
+    return framings
+
+
+def frame_batches(
+    key: str,
+    settings: Dict[str, Any],
+    analysers: List["Analyser"],
+    frontends: Dict[Tuple, SharedFrontEnd],
+    analyses: Dict[str, Any],
+) -> List[Callable[[], Features]]:
+    """For each file, a function returning the features of a frames processor computed
+    over the files of the batch at once, or None when the file must be processed alone.
+    Files are batched with those sharing their sample rate and encoding, and batch
+    buffers share their front end with the analyses laid out the same way (`frontends`).
+    """
+    computations = [None] * len(analysers)
+    if key not in CHUNKABLE_PROCESSORS or len(analysers) < 2:
+        return computations
+
+    groups: Dict[Tuple, List[int]] = {}
+    for i, analyser in enumerate(analysers):
+        sound = analyser.audio.sound
+        groups.setdefault((sound.sample_rate, sound.dtype), []).append(i)
+
+    for (sample_rate, dtype), members in groups.items():
+        init_args = dict(settings["init_args"])
+        if init_args.get("sample_rate"):
+            init_args["sample_rate"] = sample_rate
+        init_args, runner_args = split_runner_args(key, init_args)
+        processor = analysers[members[0]].get_processor(key, init_args, runner_args)
+        if not is_chunkable(key, processor):
+            continue
+        frame_length, frame_shift = frame_geometry(processor)
+        # files too short for a single frame are left to the processor
+        members = [
+            i
+            for i in members
+            if num_frames(
+                analysers[i].audio.sound.nsamples,
+                frame_length,
+                frame_shift,
+                processor.snip_edges,
+            )
+        ]
+        if len(members) < 2:
+            continue
 
-    storage_manager = S3FileManager(job_args.bucket)
+        geometry = (processor.frame_shift, processor.frame_length, processor.snip_edges)
+        frontend = frontends.setdefault(
+            (sample_rate, dtype, tuple(members), geometry),
+            SharedFrontEnd(batch_framings(analyses, geometry)),
+        )
 
-    config_path = storage_manager.load(job_args.config_path)
+        def run(processor, sound: Audio, frontend=frontend):
+            buffer = Analyser(
+                DecodedAudio(sound),
+                FeaturesCollection(),
+                frontend=frontend,
+                threads=analysers[0].threads,
+            )
+            return buffer.run_processor(key, processor)
+
+        batch = FrameBatch(
+            processor,
+            [analysers[i].audio.sound.data for i in members],
+            sample_rate,
+            run,
+        )
+        for position, i in enumerate(members):
+            computations[i] = partial(batch.features, position)
 
-    with open(config_path) as f:
-        jobconfig = JobConfig(**json.load(f))
+    return computations
 
-    file_paths = jobconfig.files
-    res_type = jobconfig.res
-    channel = jobconfig.channel
-    analysis_settings = jobconfig.analyses
 
-    with storage_manager as manager:
-        # shennong the devil outta them:
-        for file_path in file_paths:
+def channel_path(file_path: str, channel: int) -> str:
+    """The path that one channel's outputs of a file are named after"""
+    stem, extension = path.splitext(file_path)
+    return f"{stem}_ch{channel}{extension}"
 
-            audio_file = manager.load(file_path)
-            logger.info(f"starting {file_path}")
 
-            for processor, settings in analysis_settings.items():
-                logger.info(f"starting {processor}")
-                analyser = Analyser(audio_file, channel, FeaturesCollection())
+def analyse_channels(
+    files: List[Tuple[str, str, str]],
+    channels: Union[str, List[int]],
+    analyses: Dict[str, Any],
+    res_type: str,
+    write_options: Dict[str, Any],
+    processor_cache: ProcessorCache,
+    opener: Callable = open,
+    feature_cache: FeatureCache = None,
+    threads: ThreadPolicy = None,
+    metrics: List[Dict[str, Any]] = None,
+) -> List[List[str]]:
+    """`analyse_batch` over several `channels` of each file ("all" of them, or a list),
+    each file decoded once and each channel's outputs named after it. The channels of
+    the files are batched together, and a processor failing on any channel fails for
+    the file. Requested channels a file doesn't have fail as "channel <n>".
+    """
+    entries, audios, owners = [], [], []
+    failed = [[] for _ in files]
+    missing = [[] for _ in files]
+    for i, (audio_file, file_path, results_dir) in enumerate(files):
+        try:
+            file_audios = DecodedAudio.load_channels(audio_file, channels)
+        except Exception as e:
+            logger.error(e)
+            file_audios = []
+        else:
+            if channels != "all":
+                found = {audio.channel for audio in file_audios}
+                missing[i] = [channel for channel in channels if channel not in found]
+            for channel in missing[i]:
+                logger.error(f"{file_path} has no channel {channel}")
+        if not file_audios:
+            failed[i] = list(analyses)
+        for audio in file_audios:
+            entries.append(
+                (audio_file, channel_path(file_path, audio.channel), results_dir)
+            )
+            audios.append(audio)
+            owners.append(i)
+
+    records = [] if metrics is not None else None
+    channel_failed = analyse_batch(
+        entries,
+        1,
+        analyses,
+        res_type,
+        write_options,
+        processor_cache,
+        opener,
+        feature_cache,
+        audios=audios,
+        threads=threads,
+        metrics=records,
+    )
+    for i, entry_failed in zip(owners, channel_failed):
+        failed[i].extend(entry_failed)
+    failed = [
+        [k for k in analyses if k in file_failed]
+        + [f"channel {channel}" for channel in file_missing]
+        for file_failed, file_missing in zip(failed, missing)
+    ]
+
+    if metrics is not None:
+        for i, (_, file_path, _) in enumerate(files):
+            file_records = [r for r, owner in zip(records, owners) if owner == i]
+            if file_records:
+                metrics.append(dict(merge(file_records), file=file_path))
+            else:
+                metrics.append(FileMetrics(file_path).record(None, 0.0))
+    return failed
+
+
+def analyse_batch(
+    files: List[Tuple[str, str, str]],
+    channel: Union[int, str, List[int]],
+    analyses: Dict[str, Any],
+    res_type: str,
+    write_options: Dict[str, Any],
+    processor_cache: ProcessorCache,
+    opener: Callable = open,
+    feature_cache: FeatureCache = None,
+    audios: List[DecodedAudio] = None,
+    threads: ThreadPolicy = None,
+    metrics: List[Dict[str, Any]] = None,
+) -> List[List[str]]:
+    """Run the analyses on (audio file, file path, results dir) `files` and save their
+    results, returning each file's failed processors. Frame-based processors run once
+    over all the files, other processors and every postprocessor on each file.
+    `audios`, when given, are the files already decoded. When `metrics` is given, each
+    file's record of where its time went is appended to it. Several channels, rather
+    than one, are analysed by `analyse_channels`.
+    """
+    if not isinstance(channel, int):
+        return analyse_channels(
+            files,
+            channel,
+            analyses,
+            res_type,
+            write_options,
+            processor_cache,
+            opener,
+            feature_cache,
+            threads=threads,
+            metrics=metrics,
+        )
+    for _, file_path, _ in files:
+        logger.info(f"starting {file_path}")
+    # decoded once and shared by every processor run on each file
+    if audios is None:
+        audios = [DecodedAudio.load(audio_file, channel) for audio_file, _, _ in files]
+    frontends = [SharedFrontEnd(analysis_framings(analyses)) for _ in files]
+    graphs = [PostprocessorGraph(resolve_postprocessor) for _ in files]
+    batch_frontends: Dict[Tuple, SharedFrontEnd] = {}
+    failed = [[] for _ in files]
+    file_metrics = [FileMetrics(file_path) for _, file_path, _ in files]
+
+    for processor, settings in analyses.items():
+        logger.info(f"starting {processor}")
+        analysers = [
+            Analyser(
+                audio,
+                FeaturesCollection(),
+                processor_cache,
+                frontend,
+                feature_cache,
+                graph,
+                threads,
+                timings,
+            )
+            for audio, frontend, graph, timings in zip(
+                audios, frontends, graphs, file_metrics
+            )
+        ]
+        try:
+            computations = frame_batches(
+                processor, settings, analysers, batch_frontends, analyses
+            )
+        except Exception as e:
+            # e.g., a file that can't be decoded, which the files' own runs will report
+            logger.error(e)
+            computations = [None] * len(files)
+
+        for (_, file_path, results_dir), analyser, compute, file_failed in zip(
+            files, analysers, computations, failed
+        ):
+            try:
                 try:
-                    analyser.process(processor, settings)
+                    results = analyser.analyse(processor, settings, compute)
                 except Exception as e:
+                    if compute is None:
+                        raise
+                    # a file spoiling its batch mustn't fail the others
+                    logger.error(
+                        f"{processor} batch failed ({e}), analysing {file_path} alone"
+                    )
+                    results = analyser.analyse(processor, settings)
+            except Exception as e:
+                logger.error(e)
+                file_failed.append(processor)
+                continue
+
+            with analyser.timed(processor, "save"):
+                for name, collection in results.items():
+                    save_results(
+                        name,
+                        collection,
+                        path.join(results_dir, f"{Path(file_path).stem}"),
+                        res_type,
+                        analyser.metrics.opener(processor, opener),
+                        write_options,
+                    )
+
+            logger.info(f"saved {file_path} {processor}")
+
+    if metrics is not None:
+        for audio, timings in zip(audios, file_metrics):
+            try:
+                duration = audio.duration
+            except Exception:
+                duration = None
+            metrics.append(timings.record(duration, audio.decode_seconds))
+
+    return failed
+
+
+def analyse_file(
+    audio_file: str,
+    file_path: str,
+    channel: Union[int, str, List[int]],
+    analyses: Dict[str, Any],
+    results_dir: str,
+    res_type: str,
+    write_options: Dict[str, Any],
+    processor_cache: ProcessorCache,
+    opener: Callable = open,
+    feature_cache: FeatureCache = None,
+    threads: ThreadPolicy = None,
+    metrics: List[Dict[str, Any]] = None,
+) -> List[str]:
+    """Run the analyses on one file and save their results, returning the processors that failed"""
+    return analyse_batch(
+        [(audio_file, file_path, results_dir)],
+        channel,
+        analyses,
+        res_type,
+        write_options,
+        processor_cache,
+        opener,
+        feature_cache,
+        threads=threads,
+        metrics=metrics,
+    )[0]
+
+
+def scan_duration(audio_file: str) -> float:
+    """Duration of the file, or infinity when it can't be read (the analyses will say why)"""
+    try:
+        return DecodedAudio.load(audio_file, 1).duration
+    except Exception:
+        return float("inf")
+
+
+def batches(files: Iterator[Tuple[str, str]]) -> Iterator[List[Tuple[str, str]]]:
+    """Group the (key, local path) of short files into batches, see `BATCH_SECONDS`"""
+    batch_seconds = app_settings.BATCH_SECONDS
+    if app_settings.CHUNK_SECONDS:
+        # batches are decoded whole, so they shouldn't outgrow the chunks long files are read in
+        batch_seconds = min(batch_seconds, app_settings.CHUNK_SECONDS)
+    max_file_seconds = app_settings.BATCH_FILE_SECONDS if batch_seconds else 0
+    return batch_files(
+        ((f, scan_duration(f[1])) for f in files), max_file_seconds, batch_seconds
+    )
+
+
+def analyse_files(
+    manager: "LocalFileManager",
+    jobconfig: JobConfig,
+    processor_cache: ProcessorCache,
+    feature_cache: FeatureCache = None,
+    threads: ThreadPolicy = None,
+    metrics: List[Dict[str, Any]] = None,
+) -> Iterator[Tuple[str, List[str]]]:
+    """Analyse the files one batch after the other (while the next ones download), yielding each file's failed processors.
+    When `metrics` is given, each file's record is appended to it and written to stdout.
+    """
+    for batch in batches(manager.prefetch(jobconfig.files)):
+        records = []
+        # checkpointed results are written aside, to be uploaded as well as archived
+        results_dirs = [
+            manager.staging_dir() if manager.checkpoint else manager.results_dir
+            for _ in batch
+        ]
+        failed = analyse_batch(
+            [
+                (audio_file, file_path, results_dir)
+                for (file_path, audio_file), results_dir in zip(batch, results_dirs)
+            ],
+            jobconfig.requested_channels,
+            jobconfig.analyses,
+            jobconfig.res,
+            jobconfig.write_options,
+            processor_cache,
+            manager.open_result,
+            feature_cache,
+            threads=threads,
+            metrics=records,
+        )
+        for (file_path, audio_file), results_dir, file_failed, record in zip(
+            batch, results_dirs, failed, records
+        ):
+            manager.discard(audio_file)
+            manager.finish_file(file_path, results_dir, file_failed)
+            if metrics is not None:
+                emit("file", record)
+                metrics.append(record)
+            yield file_path, file_failed
+
+
+def make_feature_cache(client=None, bucket: str = None) -> FeatureCache:
+    return FeatureCache(
+        app_settings.FEATURE_CACHE_DIR,
+        app_settings.FEATURE_CACHE_MB,
+        client,
+        bucket,
+        app_settings.FEATURE_CACHE_PREFIX,
+    )
+
+
+# each pool worker keeps its own processors between the files it is handed
+worker_processor_cache: ProcessorCache = None
+worker_feature_cache: FeatureCache = None
+worker_thread_policy: ThreadPolicy = None
+
+
+def init_worker(
+    processor_cache_mb: int, bucket: str = None, threads: ThreadPolicy = None
+):
+    global worker_processor_cache, worker_feature_cache, worker_thread_policy
+    prewarm(app_settings.PREWARM_PROCESSORS)
+    worker_processor_cache = ProcessorCache(resolve_processor, processor_cache_mb)
+    worker_feature_cache = make_feature_cache(
+        boto3.client("s3") if bucket else None, bucket
+    )
+    worker_thread_policy = threads
+
+
+def analyse_file_in_worker(*args) -> Tuple[List[str], List[Dict[str, Any]]]:
+    metrics = []
+    failed = analyse_file(
+        *args,
+        worker_processor_cache,
+        feature_cache=worker_feature_cache,
+        threads=worker_thread_policy,
+        metrics=metrics,
+    )
+    logger.info(worker_processor_cache.report())
+    logger.info(worker_feature_cache.report())
+    return failed, metrics
+
+
+def analyse_batch_in_worker(*args) -> Tuple[List[List[str]], List[Dict[str, Any]]]:
+    metrics = []
+    failed = analyse_batch(
+        *args,
+        worker_processor_cache,
+        feature_cache=worker_feature_cache,
+        threads=worker_thread_policy,
+        metrics=metrics,
+    )
+    logger.info(worker_processor_cache.report())
+    logger.info(worker_feature_cache.report())
+    return failed, metrics
+
+
+def analyse_shared_in_worker(
+    shared: SharedSamples,
+    file_path: str,
+    analyses: Dict[str, Any],
+    results_dir: str,
+    res_type: str,
+    write_options: Dict[str, Any],
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Run some of a file's analyses on its samples, as mapped from shared memory"""
+    metrics = []
+    failed = analyse_batch(
+        [(shared.filepath, file_path, results_dir)],
+        shared.channel,
+        analyses,
+        res_type,
+        write_options,
+        worker_processor_cache,
+        feature_cache=worker_feature_cache,
+        audios=[DecodedAudio.attach(shared)],
+        threads=worker_thread_policy,
+        metrics=metrics,
+    )[0]
+    logger.info(worker_processor_cache.report())
+    logger.info(worker_feature_cache.report())
+    return failed, metrics
+
+
+def analyse_files_in_parallel(
+    manager: "LocalFileManager",
+    jobconfig: JobConfig,
+    workers: int,
+    metrics: List[Dict[str, Any]] = None,
+) -> Iterator[Tuple[str, List[str]]]:
+    """Spread the files over process pools, yielding each file's failed processors in job order.
+    Analyses backed by network weights run in their own, smaller pool, so that at most
+    `RUNNER_MODEL_WORKERS` processes ever hold models (within the processor cache budget).
+    Short files go to the light pool in batches, while the model pool takes them one by one.
+    The analyses of files longer than `SPLIT_FILE_SECONDS` are themselves spread over the
+    workers, which map the file's samples from shared memory rather than decode it again.
+    `metrics` gets each file's record, merged from its tasks', as in `analyse_files`.
+    """
+    analyses = jobconfig.analyses
+    model_analyses = {k: v for k, v in analyses.items() if k in PROCESSOR_SIZES_MB}
+    light_analyses = {k: v for k, v in analyses.items() if k not in model_analyses}
+
+    # at least one, which the model pool (and its share of the processor cache) needs
+    model_workers = max(1, min(workers, app_settings.RUNNER_MODEL_WORKERS))
+    light_workers = max(1, workers - model_workers) if model_analyses else workers
+    context = get_context("spawn")
+    # each worker's BLAS, OpenMP and framework threads get their share of the cores
+    threads = thread_budget(light_workers + (model_workers if model_analyses else 0))
+    policy = ThreadPolicy(threads, jobconfig.threads or {})
+
+    with thread_limits(threads), ProcessPoolExecutor(
+        light_workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(0, manager.bucket, policy),
+    ) as light_pool, ProcessPoolExecutor(
+        model_workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(
+            app_settings.PROCESSOR_CACHE_MB // model_workers,
+            manager.bucket,
+            policy,
+        ),
+    ) as model_pool:
+        submitted = deque()
+
+        def collect():
+            file_path, audio_file, staging_dir, futures, shared = submitted.popleft()
+            failed, records = [], []
+            for processors, future, index in futures:
+                try:
+                    task_failed, task_records = future.result()
+                    if index is not None:
+                        task_failed = task_failed[index]
+                        task_records = task_records[index : index + 1]
+                    failed.extend(task_failed)
+                    records.extend(task_records)
+                except Exception as e:
+                    # the worker itself died (e.g., out of memory), so none of its analyses can be trusted
                     logger.error(e)
-                    storage_manager.log_error(
-                        f"Failed: {path.basename(file_path)}-{processor}"
+                    failed.extend(processors)
+            if shared is not None:
+                remove(shared.samples_path)
+            failed = [k for k in analyses if k in failed]
+            manager.discard(audio_file)
+            manager.finish_file(file_path, staging_dir, failed)
+            if metrics is not None and records:
+                record = merge(records)
+                emit("file", record)
+                metrics.append(record)
+            return file_path, failed
+
+        def split(file_path: str, audio_file: str):
+            """Submit the analyses of one long file apart, on its shared samples"""
+            try:
+                shared = DecodedAudio.load(audio_file, jobconfig.channel).share(
+                    manager.tmp_dir
+                )
+            except Exception as e:
+                # unreadable, which the analyses will report as they do for any file
+                logger.error(e)
+                return False
+            staging_dir = manager.staging_dir()
+            futures = [
+                (
+                    list(group),
+                    pool.submit(
+                        analyse_shared_in_worker,
+                        shared,
+                        file_path,
+                        group,
+                        staging_dir,
+                        jobconfig.res,
+                        jobconfig.write_options,
+                    ),
+                    None,
+                )
+                for pool, pool_analyses in (
+                    (light_pool, light_analyses),
+                    (model_pool, model_analyses),
+                )
+                for group in split_analyses(pool_analyses)
+            ]
+            submitted.append((file_path, audio_file, staging_dir, futures, shared))
+            return True
+
+        def submit(batch: List[Tuple[str, str]]):
+            """Submit a batch of files, their model analyses one file at a time"""
+            # workers can't write into the archive, so each file's results are staged until collected
+            staging_dirs = [manager.staging_dir() for _ in batch]
+            light_future = None
+            if light_analyses:
+                light_future = light_pool.submit(
+                    analyse_batch_in_worker,
+                    [
+                        (audio_file, file_path, staging_dir)
+                        for (file_path, audio_file), staging_dir in zip(
+                            batch, staging_dirs
+                        )
+                    ],
+                    jobconfig.requested_channels,
+                    light_analyses,
+                    jobconfig.res,
+                    jobconfig.write_options,
+                )
+            for index, ((file_path, audio_file), staging_dir) in enumerate(
+                zip(batch, staging_dirs)
+            ):
+                futures = []
+                if light_future is not None:
+                    futures.append((list(light_analyses), light_future, index))
+                if model_analyses:
+                    futures.append(
+                        (
+                            list(model_analyses),
+                            model_pool.submit(
+                                analyse_file_in_worker,
+                                audio_file,
+                                file_path,
+                                jobconfig.requested_channels,
+                                model_analyses,
+                                staging_dir,
+                                jobconfig.res,
+                                jobconfig.write_options,
+                            ),
+                            None,
+                        )
                     )
+                submitted.append((file_path, audio_file, staging_dir, futures, None))
+
+        # several channels are analysed apart already, on samples decoded once
+        splittable = (
+            app_settings.SPLIT_FILE_SECONDS
+            and len(split_analyses(analyses)) > 1
+            and isinstance(jobconfig.requested_channels, int)
+        )
+        try:
+            for batch in batches(manager.prefetch(jobconfig.files)):
+                # keep the pools busy without holding every download (and its results) on disk at once
+                while len(submitted) >= 2 * workers:
+                    yield collect()
+                if (
+                    splittable
+                    and len(batch) == 1
+                    and scan_duration(batch[0][1]) >= app_settings.SPLIT_FILE_SECONDS
+                    and split(*batch[0])
+                ):
                     continue
+                submit(batch)
 
-                save_results(
-                    processor,
-                    analyser.collection,
-                    path.join(manager.results_dir, f"{Path(file_path).stem}"),
-                    res_type,
+            while submitted:
+                yield collect()
+        finally:
+            # shared memory outlives the job unless removed
+            for *_, shared in submitted:
+                if shared is not None and path.exists(shared.samples_path):
+                    remove(shared.samples_path)
+
+
+def logged_failures(error_log: str, files: List[str]) -> List[Dict[str, str]]:
+    """The failures of an error log's "Failed: <file name>-<processor>" lines, for each
+    of `files` with that name
+    """
+    failures = []
+    for line in error_log.splitlines():
+        if line.startswith("Failed: "):
+            # processor keys have no dashes, file names might
+            name, processor = line[len("Failed: ") :].rsplit("-", 1)
+            failures.extend(
+                {"file": file_path, "processor": processor}
+                for file_path in files
+                if path.basename(file_path) == name
+            )
+    return failures
+
+
+def retry_jobs(jobconfig: JobConfig, failures: List[Dict[str, str]]) -> List[JobConfig]:
+    """The jobs analysing again the failed (file, processor) pairs of an earlier job, one
+    for each set of processors that failed on the same files
+    """
+    failed: Dict[str, List[str]] = {}
+    for failure in failures:
+        failed.setdefault(failure["file"], []).append(failure["processor"])
+    groups: Dict[Tuple[str, ...], List[str]] = {}
+    for file_path in jobconfig.files:
+        if file_path in failed:
+            keys = tuple(k for k in jobconfig.analyses if k in failed[file_path])
+            groups.setdefault(keys, []).append(file_path)
+    return [
+        replace(
+            jobconfig, analyses={k: jobconfig.analyses[k] for k in keys}, files=files
+        )
+        for keys, files in groups.items()
+        if keys
+    ]
+
+
+def process_data(job_args: JobArgs,):
+    """Process each file passed for analysis"""
+
+    storage_manager = S3FileManager(job_args.bucket)
+
+    config_path = storage_manager.load(job_args.config_path)
+
+    with open(config_path) as f:
+        config = json.load(f)
+    jobconfig = JobConfig(**config)
+
+    checkpoint = None
+    if app_settings.CHECKPOINT_PREFIX:
+        checkpoint = JobCheckpoint(
+            storage_manager.client,
+            job_args.bucket,
+            f"{app_settings.CHECKPOINT_PREFIX}{job_key(config)}/",
+        )
+    done = checkpoint.load() if checkpoint is not None else {}
+
+    processor_cache = ProcessorCache(resolve_processor, app_settings.PROCESSOR_CACHE_MB)
+    feature_cache = make_feature_cache(storage_manager.client, job_args.bucket)
+
+    with storage_manager as manager:
+        manager.open_archive(jobconfig.save_path)
+        manager.checkpoint = checkpoint
+        start = perf_counter()
+        records = []
+        failures = []
+
+        jobs = [jobconfig]
+        if jobconfig.job_type == "retry_failures":
+            # the earlier job's results carry over, and only what failed runs again
+            previous = manager.load(jobconfig.retry_of)
+            jobs = retry_jobs(jobconfig, manager.carry_over(previous, jobconfig.files))
+            manager.discard(previous)
+
+        for file_path in jobconfig.files:
+            if file_path in done:
+                logger.info(f"restoring {file_path} from the job's checkpoint")
+                if not manager.restore(done[file_path]):
+                    logger.info(f"analysing {file_path} again")
+                    del done[file_path]
+                    continue
+                failures.extend(
+                    (file_path, processor) for processor in done[file_path]["failed"]
+                )
+        # only the files an earlier run of the same job didn't finish are analysed
+        jobs = [
+            replace(job, files=[f for f in job.files if f not in done]) for job in jobs
+        ]
+
+        workers = app_settings.RUNNER_WORKERS or pool_size(
+            app_settings.RUNNER_WORKER_MB,
+            reserved_mb=app_settings.PROCESSOR_CACHE_MB,
+            # a long file's analyses may run at once
+            limit=max(
+                (len(job.files) * len(split_analyses(job.analyses)) for job in jobs),
+                default=1,
+            ),
+        )
+
+        for job in jobs:
+            # shennong the devil outta them:
+            if workers > 1:
+                logger.info(f"analysing files with {workers} workers")
+                results = analyse_files_in_parallel(manager, job, workers, records)
+            else:
+                results = analyse_files(
+                    manager,
+                    job,
+                    processor_cache,
+                    feature_cache,
+                    ThreadPolicy(cpu_count(), jobconfig.threads or {}),
+                    records,
                 )
+            for file_path, failed in results:
+                failures.extend((file_path, processor) for processor in failed)
+
+        for file_path, processor in failures:
+            manager.log_error(f"Failed: {path.basename(file_path)}-{processor}")
 
-                logger.info(f"saved {file_path} {processor}")
+        if workers == 1:
+            logger.info(processor_cache.report())
+            logger.info(feature_cache.report())
+        if manager.audio_store is not None:
+            logger.info(manager.audio_store.report())
 
         with open(path.join(manager.results_dir, "settings.json"), "w") as f:
-            json.dump(jobconfig.analyses, f)
+            # next to the analyses, and only when set, so that other jobs' settings
+            # stay as they were
+            if jobconfig.output_dtype is not None:
+                json.dump(
+                    dict(jobconfig.analyses, output_dtype=jobconfig.output_dtype), f
+                )
+            else:
+                json.dump(jobconfig.analyses, f)
+
+        # what a "retry_failures" job would analyse again
+        with open(path.join(manager.results_dir, "failures.json"), "w") as f:
+            json.dump(
+                [{"file": file_path, "processor": p} for file_path, p in failures],
+                f,
+                indent=2,
+            )
+
+        summary = job_summary(records, perf_counter() - start, workers)
+        emit("job", summary)
+        with open(path.join(manager.results_dir, "metrics.json"), "w") as f:
+            json.dump({"job": summary, "files": records}, f, indent=2)
 
         manager.store(jobconfig.save_path)
 
+    if checkpoint is not None:
+        checkpoint.clear()
+
     return True
 
 
@@ -375,4 +1593,5 @@ if __name__ == "__main__":
     from sys import argv
 
     args = json.loads(argv[1])
+    prewarm(app_settings.PREWARM_PROCESSORS)
     process_data(JobArgs(**args))
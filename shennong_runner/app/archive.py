@@ -0,0 +1,135 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import RawIOBase, TextIOWrapper
+from os import listdir, path, remove
+from zipfile import ZipFile, ZIP_DEFLATED
+
+# s3 parts must be at least 5MB (except the last one) and there can be at most 10,000 of them
+PART_SIZE = 16 * 1024 ** 2
+# parts uploading in the background while the archive keeps filling; each holds PART_SIZE in memory
+MAX_PENDING_PARTS = 2
+
+
+class MultipartUpload(RawIOBase):
+    """Write-only stream that uploads to an s3 key part by part as it fills,
+    so that nothing written to it ever touches the disk.
+    """
+
+    def __init__(self, client, bucket: str, key: str, part_size: int = PART_SIZE):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)[
+            "UploadId"
+        ]
+        self.aborted = False
+        self._buffer = bytearray()
+        self._position = 0
+        self._parts = []
+        self._pending = deque()
+        self._pool = ThreadPoolExecutor(1)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, b):
+        self._buffer += b
+        self._position += len(b)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+        return len(b)
+
+    def _upload_part(self, body: bytes):
+        part_number = len(self._parts) + len(self._pending) + 1
+        self._pending.append(
+            (
+                part_number,
+                self._pool.submit(
+                    self.client.upload_part,
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    PartNumber=part_number,
+                    Body=body,
+                ),
+            )
+        )
+        while len(self._pending) > MAX_PENDING_PARTS:
+            self._finish_part()
+
+    def _finish_part(self):
+        part_number, upload = self._pending.popleft()
+        self._parts.append({"ETag": upload.result()["ETag"], "PartNumber": part_number})
+
+    def close(self):
+        """Upload what is left and complete the upload"""
+        if self.closed:
+            return
+        if not self.aborted:
+            if self._buffer or not (self._parts or self._pending):
+                self._upload_part(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._finish_part()
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        self._pool.shutdown()
+        super().close()
+
+    def abort(self):
+        """Drop the parts uploaded so far, so that they don't linger (and get billed) in the bucket"""
+        if self.closed or self.aborted:
+            return
+        self.aborted = True
+        self._pool.shutdown()
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+        )
+        self.close()
+
+
+class ResultArchive:
+    """Zip archive that each result is appended to as soon as it is written.
+    Entries are stored under `root`, so users unzipping it get a single directory.
+    """
+
+    def __init__(self, stream, root: str = "sfo-results"):
+        self.stream = stream
+        self.root = root
+        # the stream doesn't need to be seekable, zipfile falls back to data descriptors
+        self.zipfile = ZipFile(stream, "w", ZIP_DEFLATED)
+
+    def arcname(self, name: str) -> str:
+        return f"{self.root}/{name}"
+
+    def open(self, name: str, mode: str = "w"):
+        """Open an entry for writing, with the same modes as builtin `open`"""
+        # results can outgrow 2GB, and sizes aren't known until an entry is closed
+        entry = self.zipfile.open(self.arcname(name), "w", force_zip64=True)
+        return entry if "b" in mode else TextIOWrapper(entry, encoding="utf-8")
+
+    def add_dir(self, directory: str):
+        """Move every file in `directory` into the archive"""
+        for name in sorted(listdir(directory)):
+            filepath = path.join(directory, name)
+            self.zipfile.write(filepath, self.arcname(name))
+            remove(filepath)
+
+    def close(self):
+        self.zipfile.close()
+        self.stream.close()
+
+    def abort(self):
+        if hasattr(self.stream, "abort"):
+            self.stream.abort()
+        else:
+            self.stream.close()
@@ -0,0 +1,213 @@
+from dataclasses import dataclass
+from hashlib import sha256
+from os import path
+from shutil import disk_usage
+from time import perf_counter
+from typing import Dict, List, Union
+import uuid
+
+import numpy as np
+from scipy.io import wavfile
+from shennong.audio import Audio
+
+from app.audio_store import is_canonical, map_canonical, read_header
+
+# Processors that resample their input to a fixed rate before running.
+# Handing them audio that was already resampled with the same (default) backend skips that step
+# without changing their output, and lets every analysis of a file share a single resampling.
+PROCESSOR_SAMPLE_RATES = {"bottleneck": 8000, "pitch_crepe": 16000}
+
+# tmpfs, where memory-mapped files are pages of shared memory rather than of a disk file
+SHARED_MEMORY_DIR = "/dev/shm"
+
+
+@dataclass(frozen=True)
+class SharedSamples:
+    """Decoded samples saved where worker processes can map them, rather than each
+    receiving or decoding a copy, along with what's needed to stand in for the file
+    """
+
+    samples_path: str
+    sample_rate: int
+    filepath: str
+    channel: int
+    content_hash: str
+
+
+class DecodedAudio:
+    """An audio file decoded once and reduced to the requested channel.
+    Every processor run on the file reads from the same instance, and resampled
+    versions are cached by target sample rate. Files opened with `load` are only
+    decoded once a processor needs the whole sound, so that processors working
+    through `samples` in chunks never hold the file in memory.
+    """
+
+    def __init__(self, sound: Audio = None, filepath: str = None, channel: int = 1):
+        self._sound = sound
+        self.filepath = filepath
+        self.channel = channel
+        self._resampled: Dict[int, Audio] = {}
+        self._content_hash: str = None
+        # time spent decoding the file, for the job's metrics
+        self.decode_seconds = 0.0
+
+    @classmethod
+    def load(cls, filepath: str, channel: int):
+        return cls(filepath=filepath, channel=channel)
+
+    @classmethod
+    def load_channels(
+        cls, filepath: str, channels: Union[str, List[int]]
+    ) -> List["DecodedAudio"]:
+        """The file decoded once and split into `channels`, "all" of them or a list
+        (leaving out those the file doesn't have)
+        """
+        start = perf_counter()
+        if is_canonical(filepath):
+            header, samples = map_canonical(filepath)
+            sample_rate = header["sample_rate"]
+            nchannels = len(samples)
+        else:
+            sound = Audio.load(filepath)
+            nchannels = sound.nchannels
+        requested = range(1, nchannels + 1) if channels == "all" else channels
+        audios = []
+        for channel in requested:
+            if not 1 <= channel <= nchannels:
+                continue
+            if is_canonical(filepath):
+                channel_sound = Audio(samples[channel - 1], sample_rate)
+            elif nchannels > 1:
+                channel_sound = sound.channel(channel - 1)
+            else:
+                channel_sound = sound
+            audios.append(cls(channel_sound, filepath, channel))
+        if audios:
+            # decoded once, for all of them
+            audios[0].decode_seconds = perf_counter() - start
+        return audios
+
+    @property
+    def sound(self) -> Audio:
+        if self._sound is None:
+            start = perf_counter()
+            if is_canonical(self.filepath):
+                header, samples = map_canonical(self.filepath)
+                self._sound = Audio(self._channel_of(samples), header["sample_rate"])
+                self.decode_seconds += perf_counter() - start
+                return self._sound
+            sound = Audio.load(self.filepath)
+            if (
+                sound.nchannels > 1
+            ):  # converting to mono; user-set or default channel chosen:
+                sound = sound.channel(self.channel - 1)
+            self._sound = sound
+            self.decode_seconds += perf_counter() - start
+        return self._sound
+
+    def _channel_of(self, samples: np.ndarray) -> np.ndarray:
+        """The requested channel of a canonical file's (channels, samples) array"""
+        return samples[self.channel - 1 if len(samples) > 1 else 0]
+
+    @property
+    def sample_rate(self) -> int:
+        if self._sound is None:
+            if is_canonical(self.filepath):
+                return read_header(self.filepath)["sample_rate"]
+            return Audio.scan(self.filepath).sample_rate
+        return self._sound.sample_rate
+
+    @property
+    def duration(self) -> float:
+        if self._sound is None:
+            if is_canonical(self.filepath):
+                header = read_header(self.filepath)
+                return header["nsamples"] / header["sample_rate"]
+            return Audio.scan(self.filepath).duration
+        return self._sound.duration
+
+    def samples(self) -> np.ndarray:
+        """The samples of the sound, memory-mapped (and so paged in as they are read)
+        when the file is a wav or a canonical file that hasn't been decoded yet
+        """
+        if self._sound is None:
+            if is_canonical(self.filepath):
+                return self._channel_of(map_canonical(self.filepath)[1])
+            try:
+                _, data = wavfile.read(self.filepath, mmap=True)
+            except ValueError:
+                # not a wav, or an encoding numpy can't map (e.g., 24 bits)
+                return self.sound.data
+            return data[:, self.channel - 1] if data.ndim > 1 else data
+        return self._sound.data
+
+    def content_hash(self) -> str:
+        """Digest of the audio the processors work on: the file's bytes and the channel
+        read from it, or the decoded samples when there is no file
+        """
+        if self._content_hash is not None:
+            return self._content_hash
+        if self.filepath is not None and is_canonical(self.filepath):
+            # hashed from the upload when it was converted, so as to match its results
+            self._content_hash = read_header(self.filepath)["content_hashes"][
+                self.channel - 1
+            ]
+            return self._content_hash
+        digest = sha256()
+        if self.filepath is not None:
+            with open(self.filepath, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            digest.update(f"channel={self.channel}".encode())
+        else:
+            digest.update(np.ascontiguousarray(self.sound.data).tobytes())
+            digest.update(
+                f"dtype={self.sound.dtype},sample_rate={self.sound.sample_rate}".encode()
+            )
+        self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def share(self, fallback_dir: str) -> SharedSamples:
+        """Save the decoded samples to shared memory, or to `fallback_dir` when it can't
+        hold them (mapped from the page cache, the file is shared all the same).
+        The caller removes the file once the workers are done with it.
+        """
+        data = np.ascontiguousarray(self.sound.data)
+        directory = fallback_dir
+        if path.isdir(SHARED_MEMORY_DIR):
+            # docker gives containers 64MB of it by default
+            if disk_usage(SHARED_MEMORY_DIR).free > 2 * data.nbytes:
+                directory = SHARED_MEMORY_DIR
+        samples_path = path.join(directory, f"sfo-{uuid.uuid4()}.npy")
+        np.save(samples_path, data)
+        return SharedSamples(
+            samples_path,
+            self.sample_rate,
+            self.filepath,
+            self.channel,
+            self.content_hash(),
+        )
+
+    @classmethod
+    def attach(cls, shared: SharedSamples):
+        """The audio of a file shared by another process, mapped copy-on-write"""
+        audio = cls(
+            Audio(np.load(shared.samples_path, mmap_mode="c"), shared.sample_rate),
+            shared.filepath,
+            shared.channel,
+        )
+        audio._content_hash = shared.content_hash
+        return audio
+
+    def resampled(self, sample_rate: int) -> Audio:
+        """Return the sound at `sample_rate`, resampling at most once per rate"""
+        if sample_rate == self.sample_rate:
+            return self.sound
+        if sample_rate not in self._resampled:
+            self._resampled[sample_rate] = self.sound.resample(sample_rate)
+        return self._resampled[sample_rate]
+
+    def for_processor(self, class_key: str) -> Audio:
+        """Return the version of the sound the processor will actually work on"""
+        sample_rate = PROCESSOR_SAMPLE_RATES.get(class_key)
+        return self.resampled(sample_rate) if sample_rate else self.sound
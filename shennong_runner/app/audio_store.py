@@ -0,0 +1,230 @@
+from hashlib import sha256
+import json
+import logging
+from os import listdir, makedirs, path, remove, replace, stat, utime
+import threading
+from typing import Any, Callable, Dict, Tuple
+import uuid
+
+from botocore.exceptions import BotoCoreError, ClientError
+import numpy as np
+from shennong.audio import Audio
+
+logger = logging.getLogger(__name__)
+
+# canonical files start with this, then a json header padded to HEADER_BYTES, so that the
+# samples start on a page boundary and map without copying
+MAGIC = b"SFOPCM1\n"
+HEADER_BYTES = 4096
+EXTENSION = ".sfopcm"
+
+
+def is_canonical(filepath: str) -> bool:
+    return filepath.endswith(EXTENSION)
+
+
+def write_canonical(source: str, out_path: str):
+    """Decode `source` once and write it to `out_path` in the canonical layout: the
+    header, then the samples channel after channel, in the dtype they were decoded to (so
+    that processors see exactly what `Audio.load` gives them)
+    """
+    digest = sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    sound = Audio.load(source)
+    planar = sound.data.T if sound.data.ndim > 1 else sound.data[np.newaxis]
+    content_hashes = []
+    # as DecodedAudio hashes the source for each channel read from it (mono files too)
+    for channel in range(1, max(planar.shape[0], 2) + 1):
+        channel_digest = digest.copy()
+        channel_digest.update(f"channel={channel}".encode())
+        content_hashes.append(channel_digest.hexdigest())
+    header = json.dumps(
+        {
+            "sample_rate": sound.sample_rate,
+            "dtype": sound.data.dtype.str,
+            "channels": planar.shape[0],
+            "nsamples": planar.shape[1],
+            "content_hashes": content_hashes,
+        }
+    ).encode()
+    if len(MAGIC) + len(header) > HEADER_BYTES:
+        raise ValueError(f"header of {source} doesn't fit in {HEADER_BYTES} bytes")
+    # written aside and renamed, so that other processes never map partial files
+    tmp_path = f"{out_path}.{uuid.uuid4().hex}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + header.ljust(HEADER_BYTES - len(MAGIC)))
+        for channel in planar:
+            f.write(np.ascontiguousarray(channel).tobytes())
+    replace(tmp_path, out_path)
+
+
+def read_header(filepath: str) -> Dict[str, Any]:
+    with open(filepath, "rb") as f:
+        head = f.read(HEADER_BYTES)
+    if not head.startswith(MAGIC):
+        raise ValueError(f"{filepath} isn't a canonical audio file")
+    return json.loads(head[len(MAGIC) :])
+
+
+def map_canonical(filepath: str) -> Tuple[Dict[str, Any], np.ndarray]:
+    """The header of a canonical file and its samples, mapped copy-on-write as a
+    (channels, samples) array, each channel being contiguous on disk
+    """
+    header = read_header(filepath)
+    samples = np.memmap(
+        filepath,
+        dtype=np.dtype(header["dtype"]),
+        mode="c",
+        offset=HEADER_BYTES,
+        shape=(header["channels"], header["nsamples"]),
+    )
+    return header, samples
+
+
+class AudioStore:
+    """Uploads converted once to the canonical layout, kept on the node's disk within
+    `budget_mb` (least recently used first out) and under an s3 prefix shared by every
+    job. Entries are addressed by the upload's key and ETag, so that a hit needs neither
+    the upload nor its decoding.
+    """
+
+    def __init__(
+        self,
+        store_dir: str,
+        budget_mb: int,
+        client=None,
+        bucket: str = None,
+        prefix: str = None,
+    ):
+        self.store_dir = store_dir
+        self.budget_mb = budget_mb
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.hits = 0
+        self.conversions = 0
+        # entries being loaded or handed out and not yet released (with how many times),
+        # which eviction leaves alone; prefetching loads from several threads at once
+        self.pinned: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        makedirs(store_dir, exist_ok=True)
+
+    @property
+    def remote(self) -> bool:
+        return bool(self.client and self.bucket and self.prefix)
+
+    def entry_key(self, key: str) -> str:
+        etag = self.client.head_object(Bucket=self.bucket, Key=key)["ETag"]
+        return sha256(f"{self.bucket}/{key}:{etag}".encode()).hexdigest()
+
+    def _local_path(self, entry_key: str) -> str:
+        return path.join(self.store_dir, f"{entry_key}{EXTENSION}")
+
+    def _fetch_remote(self, entry_key: str, local_path: str) -> bool:
+        if not self.remote:
+            return False
+        tmp_path = f"{local_path}.{uuid.uuid4().hex}"
+        try:
+            self.client.download_file(
+                self.bucket, f"{self.prefix}{entry_key}{EXTENSION}", tmp_path
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                logger.error(e)
+            return False
+        except BotoCoreError as e:
+            logger.error(e)
+            return False
+        replace(tmp_path, local_path)
+        return True
+
+    def _store_remote(self, entry_key: str, local_path: str):
+        if not self.remote:
+            return
+        try:
+            self.client.upload_file(
+                local_path, self.bucket, f"{self.prefix}{entry_key}{EXTENSION}"
+            )
+        except (BotoCoreError, ClientError) as e:
+            # the store is an optimisation, a failed upload shouldn't fail the job
+            logger.error(e)
+
+    def _evict(self):
+        """Remove the least recently used entries until the store fits its budget"""
+        with self._lock:
+            self._evict_unlocked()
+
+    def _evict_unlocked(self):
+        entries = []
+        for name in listdir(self.store_dir):
+            if not name.endswith(EXTENSION):
+                continue
+            try:
+                entry = stat(path.join(self.store_dir, name))
+            except FileNotFoundError:
+                # evicted by another process in the meantime
+                continue
+            entries.append((entry.st_mtime, entry.st_size, name))
+        size = sum(size for _, size, _ in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.budget_mb * 1024 ** 2:
+                break
+            if path.join(self.store_dir, name) in self.pinned:
+                continue
+            try:
+                remove(path.join(self.store_dir, name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def load(self, key: str, download: Callable[[str], str]) -> str:
+        """Path of the canonical version of the upload at `key`, converting the upload
+        (fetched with `download`) only when neither tier has it
+        """
+        entry_key = self.entry_key(key)
+        local_path = self._local_path(entry_key)
+        # before the entry is written or fetched, so that another thread's eviction
+        # can't remove it in the meantime
+        self._pin(local_path)
+        try:
+            if path.exists(local_path):
+                utime(local_path)
+                hit = True
+            elif self._fetch_remote(entry_key, local_path):
+                hit = True
+            else:
+                upload = download(key)
+                try:
+                    write_canonical(upload, local_path)
+                finally:
+                    remove(upload)
+                hit = False
+                self._store_remote(entry_key, local_path)
+        except Exception:
+            self.release(local_path)
+            raise
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.conversions += 1
+            self._evict_unlocked()
+        return local_path
+
+    def _pin(self, local_path: str):
+        with self._lock:
+            self.pinned[local_path] = self.pinned.get(local_path, 0) + 1
+
+    def release(self, local_path: str):
+        """Let an entry go once its file is analysed"""
+        with self._lock:
+            if self.pinned.get(local_path, 0) > 1:
+                self.pinned[local_path] -= 1
+            else:
+                self.pinned.pop(local_path, None)
+            self._evict_unlocked()
+
+    def report(self) -> str:
+        return f"audio store: {self.hits} hits, {self.conversions} uploads converted"
@@ -0,0 +1,83 @@
+import logging
+import sys
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Inference backends network-backed processors can run on (see `runner_args` in parse_shennong):
+# eager runs the models as shennong builds them, int8 quantizes torch's linear layers to 8 bits
+# on the fly, and compiled hands the graph to torch.compile (torch) or XLA (tensorflow)
+INFERENCE_BACKENDS = ["eager", "int8", "compiled"]
+
+
+def torch_modules(processor) -> List[str]:
+    """Names of the processor's attributes holding torch networks"""
+    if "torch" not in sys.modules:
+        return []
+    torch = sys.modules["torch"]
+    return [k for k, v in vars(processor).items() if isinstance(v, torch.nn.Module)]
+
+
+def keras_models(processor) -> List[str]:
+    """Names of the processor's attributes holding keras networks"""
+    if "tensorflow" not in sys.modules:
+        return []
+    tf = sys.modules["tensorflow"]
+    return [k for k, v in vars(processor).items() if isinstance(v, tf.keras.Model)]
+
+
+def quantize(processor):
+    names = torch_modules(processor)
+    if not names:
+        logger.warning("no torch network to quantize, running eagerly")
+    for name in names:
+        torch = sys.modules["torch"]
+        setattr(
+            processor,
+            name,
+            torch.quantization.quantize_dynamic(
+                getattr(processor, name), {torch.nn.Linear}, dtype=torch.qint8
+            ),
+        )
+
+
+def compile_graphs(processor):
+    if not torch_modules(processor) and not keras_models(processor):
+        logger.warning("no torch or keras network to compile, running eagerly")
+    for name in torch_modules(processor):
+        torch = sys.modules["torch"]
+        if not hasattr(torch, "compile"):
+            logger.warning("torch.compile needs torch 2, running eagerly")
+            continue
+        # compiled modules hand attribute lookups on to the original one
+        setattr(processor, name, torch.compile(getattr(processor, name), dynamic=True))
+
+    for name in keras_models(processor):
+        tf = sys.modules["tensorflow"]
+        model = getattr(processor, name)
+        try:
+            graph = tf.function(model, jit_compile=True, experimental_relax_shapes=True)
+        except TypeError:
+            # tensorflow<2.5
+            graph = tf.function(
+                model, experimental_compile=True, experimental_relax_shapes=True
+            )
+        # predict batches its input and calls the model eagerly on each batch
+        model.predict = lambda x, *args, **kwargs: graph(x, training=False).numpy()
+
+
+def use_backend(processor, backend: str):
+    """Convert the processor's networks for `backend`, once"""
+    current = getattr(processor, "_inference_backend", "eager")
+    if backend == current:
+        return processor
+    if current != "eager":
+        raise ValueError(f"processor already runs on the {current} backend")
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend}")
+    if backend == "int8":
+        quantize(processor)
+    else:
+        compile_graphs(processor)
+    processor._inference_backend = backend
+    return processor
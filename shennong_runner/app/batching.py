@@ -0,0 +1,122 @@
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from shennong import Features
+from shennong.audio import Audio
+
+from app.chunking import first_sample, frame_geometry, num_frames, read_span
+
+
+def batch_files(
+    files: Iterable[Tuple[Any, float]], max_file_seconds: float, batch_seconds: float
+) -> Iterator[List[Any]]:
+    """Group consecutive files shorter than `max_file_seconds` into batches of at most
+    `batch_seconds`, longer files making up batches of their own. Takes and yields
+    files lazily, each given with its duration.
+    """
+    batch, total = [], 0.0
+    for item, duration in files:
+        if duration >= max_file_seconds:
+            if batch:
+                yield batch
+            batch, total = [], 0.0
+            yield [item]
+            continue
+        if batch and total + duration > batch_seconds:
+            yield batch
+            batch, total = [], 0.0
+        batch.append(item)
+        total += duration
+    if batch:
+        yield batch
+
+
+def lay_out(
+    signals: List[np.ndarray], frame_length: int, frame_shift: int, snip_edges: bool
+) -> Tuple[np.ndarray, List[int], List[int]]:
+    """Lay signals end to end so that every frame of each one is a snip_edges=True frame
+    of the buffer: each signal is cut (or mirrored, without snip_edges) to the samples
+    its frames span, and starts on a frame boundary of the buffer. Returns the buffer,
+    and the first frame and number of frames of each signal in it.
+    """
+    segments, starts, counts = [], [], []
+    position = 0
+    for samples in signals:
+        nframes = num_frames(samples.shape[0], frame_length, frame_shift, snip_edges)
+        first = first_sample(0, frame_length, frame_shift, snip_edges)
+        last = first_sample(nframes - 1, frame_length, frame_shift, snip_edges)
+        segment = read_span(samples, first, last + frame_length)
+        # frames overhanging into the next segment are dropped, so any padding will do
+        padding = -segment.shape[0] % frame_shift
+        segments.append(np.pad(segment, (0, padding), mode="constant"))
+        starts.append(position // frame_shift)
+        counts.append(nframes)
+        position += segment.shape[0] + padding
+    return np.concatenate(segments), starts, counts
+
+
+def process_batch(
+    processor,
+    signals: List[np.ndarray],
+    sample_rate: int,
+    run: Callable[[object, Audio], Features] = None,
+) -> List[Features]:
+    """Run a frames processor once over several signals laid out in one buffer (see
+    `lay_out`), then split the features back per signal. Every signal must give at
+    least one frame. As with `process_in_chunks`, each frame only sees its own samples,
+    so the features are those each signal would have given on its own.
+    """
+    run = run or (lambda processor, sound: processor.process(sound))
+    snip_edges = processor.snip_edges
+    frame_length, frame_shift = frame_geometry(processor)
+    buffer, starts, counts = lay_out(signals, frame_length, frame_shift, snip_edges)
+
+    processor.set_params(snip_edges=True)
+    try:
+        features = run(processor, Audio(buffer, sample_rate))
+    finally:
+        processor.set_params(snip_edges=snip_edges)
+
+    properties = processor.get_properties()
+    return [
+        Features(
+            features.data[start : start + count],
+            processor.times(count),
+            properties=properties,
+        )
+        for start, count in zip(starts, counts)
+    ]
+
+
+class FrameBatch:
+    """Features of several signals, all computed by `process_batch` the first time
+    any of them is asked for
+    """
+
+    def __init__(
+        self,
+        processor,
+        signals: List[np.ndarray],
+        sample_rate: int,
+        run: Callable[[object, Audio], Features] = None,
+    ):
+        self.processor = processor
+        self.signals = signals
+        self.sample_rate = sample_rate
+        self.run = run
+        self._features: List[Features] = None
+        self._error: Exception = None
+
+    def features(self, i: int) -> Features:
+        # a failed batch isn't run again for each of its signals
+        if self._error is not None:
+            raise self._error
+        if self._features is None:
+            try:
+                self._features = process_batch(
+                    self.processor, self.signals, self.sample_rate, self.run
+                )
+            except Exception as e:
+                self._error = e
+                raise
+        return self._features[i]
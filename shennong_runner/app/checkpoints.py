@@ -0,0 +1,133 @@
+from hashlib import sha256
+import json
+import logging
+from os import listdir, path
+from typing import Any, Callable, Dict, List
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger(__name__)
+
+
+def job_key(config: Dict[str, Any]) -> str:
+    """Address of a job's checkpoint: resubmitting the same config resumes it, though
+    each submission saves to a fresh archive
+    """
+    description = {k: v for k, v in config.items() if k != "save_path"}
+    return sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def file_key(file_path: str) -> str:
+    return sha256(file_path.encode()).hexdigest()[:20]
+
+
+def is_plain_name(name: Any) -> bool:
+    """Whether a manifest's output name stays within the directory it's joined to"""
+    return (
+        isinstance(name, str)
+        and name not in ("", ".", "..")
+        and name == path.basename(name)
+    )
+
+
+class JobCheckpoint:
+    """What a job has finished so far, kept under an s3 prefix as it goes: each analysed
+    file's outputs, then its entry in the completion manifest, which lists the file's
+    outputs and the processors that failed on it. A file only counts as done once its
+    entry exists, so a job that dies midway resumes from its last finished file.
+    """
+
+    def __init__(self, client, bucket: str, prefix: str):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _manifest_key(self, file_path: str) -> str:
+        return f"{self.prefix}manifest/{file_key(file_path)}.json"
+
+    def _output_key(self, file_path: str, name: str) -> str:
+        return f"{self.prefix}outputs/{file_key(file_path)}/{name}"
+
+    def _keys(self, prefix: str) -> List[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        return [
+            item["Key"]
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix)
+            for item in page.get("Contents", [])
+        ]
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Manifest entries of the files already done, by file path"""
+        manifest = {}
+        try:
+            for key in self._keys(f"{self.prefix}manifest/"):
+                body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+                entry = json.loads(body.read())
+                manifest[entry["file"]] = entry
+        except (BotoCoreError, ClientError) as e:
+            # without a manifest, the job simply starts over
+            logger.error(e)
+            return {}
+        return manifest
+
+    def save(self, file_path: str, directory: str, failed: List[str]):
+        """Upload a file's outputs from `directory`, then mark the file as done"""
+        outputs = sorted(listdir(directory))
+        try:
+            for name in outputs:
+                self.client.upload_file(
+                    path.join(directory, name),
+                    self.bucket,
+                    self._output_key(file_path, name),
+                )
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self._manifest_key(file_path),
+                Body=json.dumps(
+                    {"file": file_path, "outputs": outputs, "failed": failed}
+                ).encode(),
+            )
+        except (BotoCoreError, ClientError) as e:
+            # the file is only analysed again should the job restart
+            logger.error(e)
+
+    def restore(self, entry: Dict[str, Any], opener: Callable) -> bool:
+        """Copy a finished file's outputs into the results, through `opener`. False,
+        with nothing copied, when the entry names anything but plain file names or
+        any of its outputs can't be fetched (e.g. expired), the file then being
+        analysed again
+        """
+        names = entry["outputs"]
+        if not all(is_plain_name(name) for name in names):
+            logger.error(
+                f"checkpoint of {entry['file']} names outputs out of its results"
+            )
+            return False
+        try:
+            bodies = [
+                self.client.get_object(
+                    Bucket=self.bucket, Key=self._output_key(entry["file"], name)
+                )["Body"]
+                for name in names
+            ]
+        except (BotoCoreError, ClientError) as e:
+            logger.error(e)
+            return False
+        for name, body in zip(names, bodies):
+            with opener(name) as f:
+                for chunk in body.iter_chunks():
+                    f.write(chunk)
+        return True
+
+    def clear(self):
+        """Remove the checkpoint once the job's archive is stored"""
+        try:
+            keys = [{"Key": key} for key in self._keys(self.prefix)]
+            # delete_objects takes up to 1000 keys at once
+            for start in range(0, len(keys), 1000):
+                self.client.delete_objects(
+                    Bucket=self.bucket, Delete={"Objects": keys[start : start + 1000]}
+                )
+        except (BotoCoreError, ClientError) as e:
+            # left to the bucket's lifecycle rules
+            logger.error(e)
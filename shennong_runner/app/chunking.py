@@ -0,0 +1,85 @@
+import numpy as np
+from shennong import Features
+from shennong.audio import Audio
+
+# Processors whose frames are each computed from their own samples only, so that
+# any run of frames can be computed from just the samples it spans.
+CHUNKABLE_PROCESSORS = ["energy", "filterbank", "mfcc", "plp", "spectrogram"]
+
+
+def is_chunkable(class_key: str, processor) -> bool:
+    # rasta filters plp features across frames
+    return class_key in CHUNKABLE_PROCESSORS and not getattr(processor, "rasta", False)
+
+
+def frame_geometry(processor):
+    """Frame length and shift in samples, truncated as kaldi does"""
+    return (
+        int(processor.sample_rate * processor.frame_length),
+        int(processor.sample_rate * processor.frame_shift),
+    )
+
+
+def num_frames(nsamples: int, frame_length: int, frame_shift: int, snip_edges: bool):
+    if snip_edges:
+        if nsamples < frame_length:
+            return 0
+        return 1 + (nsamples - frame_length) // frame_shift
+    return (nsamples + frame_shift // 2) // frame_shift
+
+
+def first_sample(frame: int, frame_length: int, frame_shift: int, snip_edges: bool):
+    """Index of the first sample of `frame`, negative when it starts before the signal"""
+    if snip_edges:
+        return frame * frame_shift
+    return frame * frame_shift + frame_shift // 2 - frame_length // 2
+
+
+def read_span(samples: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """Samples `start` to `stop`, mirrored past either end of the signal as kaldi does
+    when frames overhang it (snip_edges=False)
+    """
+    nsamples = samples.shape[0]
+    if start >= 0 and stop <= nsamples:
+        return np.array(samples[start:stop])
+    index = np.arange(start, stop)
+    index = np.where(index < 0, -index - 1, index)
+    index = np.where(index >= nsamples, 2 * nsamples - 1 - index, index)
+    return np.array(samples[index])
+
+
+def process_in_chunks(
+    processor, samples: np.ndarray, sample_rate: int, chunk_frames: int
+) -> Features:
+    """Run a frames processor over `chunk_frames` frames at a time, each chunk reading
+    only the samples its frames span (frames overlap, so consecutive chunks share a few).
+    Chunks are cut as snip_edges=True runs over exactly those samples, mirroring the edges
+    of the signal first when the processor keeps its overhanging frames, and the result is
+    the same as processing the whole signal at once. Memory stays bounded by the chunk size
+    and the features themselves, however long `samples` is (e.g., a memory-mapped file).
+    """
+    snip_edges = processor.snip_edges
+    frame_length, frame_shift = frame_geometry(processor)
+    total = num_frames(samples.shape[0], frame_length, frame_shift, snip_edges)
+
+    data = None
+    processor.set_params(snip_edges=True)
+    try:
+        for start in range(0, total, chunk_frames):
+            stop = min(start + chunk_frames, total)
+            first = first_sample(start, frame_length, frame_shift, snip_edges)
+            last = first_sample(stop - 1, frame_length, frame_shift, snip_edges)
+            chunk = processor.process(
+                Audio(read_span(samples, first, last + frame_length), sample_rate)
+            )
+            if data is None:
+                data = np.empty((total, chunk.data.shape[1]), dtype=chunk.data.dtype)
+            data[start:stop] = chunk.data
+    finally:
+        processor.set_params(snip_edges=snip_edges)
+
+    if data is None:
+        # too short for a single frame, let the processor deal with it as it would
+        return processor.process(Audio(np.array(samples), sample_rate))
+
+    return Features(data, processor.times(total), properties=processor.get_properties())
@@ -0,0 +1,255 @@
+from hashlib import sha256
+from io import BytesIO
+import json
+import logging
+from os import listdir, makedirs, path, remove, replace, stat, utime
+from typing import Any, Dict, List, Optional, Tuple
+import uuid
+from zipfile import BadZipFile
+
+from botocore.exceptions import BotoCoreError, ClientError
+import numpy as np
+import shennong
+from shennong import Features
+
+from app.frontend import DERIVATIONS
+from app.settings import settings as app_settings
+
+logger = logging.getLogger(__name__)
+
+# bumped with every change to how the runner computes results (e.g., how chunks and
+# windows are stitched), so that entries computed by earlier runners aren't reused
+COMPUTATION_VERSION = 1
+
+
+def canonical(value: Any) -> Any:
+    """Make equivalent init args serialise the same way (e.g., 1 and 1.0, tuples and lists)"""
+    if isinstance(value, dict):
+        return {k: canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def computation(class_key: str, init_args: Dict[str, Any]) -> Dict[str, Any]:
+    """How the runner computes an analysis, besides what the job asks for"""
+    description = {"version": COMPUTATION_VERSION}
+    if (
+        app_settings.SHARED_FRONTEND
+        and class_key in DERIVATIONS
+        and not init_args.get("rasta")
+    ):
+        # derived by the runner's own port of kaldi's computers, not by shennong
+        description["front_end"] = "shared"
+    return description
+
+
+def feature_key(
+    audio_hash: str,
+    class_key: str,
+    init_args: Dict[str, Any],
+    postprocessors: List[str],
+) -> str:
+    """Address of an analysis' results: the same audio, processor, arguments, postprocessors,
+    shennong version and computation by the runner always give the same features (dither
+    aside)
+    """
+    description = {
+        "audio": audio_hash,
+        "processor": class_key,
+        "init_args": canonical(init_args),
+        # the eponymous postprocessor always runs first, whatever the order they came in
+        "postprocessors": sorted(postprocessors),
+        "shennong": shennong.__version__,
+        "runner": computation(class_key, init_args),
+    }
+    return sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def _jsonable(value: Any) -> Any:
+    """numpy values found in properties, as plain ones"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} properties can't be cached")
+
+
+def dump_results(results: Dict[str, Features]) -> bytes:
+    """Results as an npz archive of their arrays, with their names and properties as
+    JSON, so that reading an entry back never unpickles anything
+    """
+    arrays, index = {}, []
+    for i, (name, features) in enumerate(results.items()):
+        arrays[f"data{i}"] = features.data
+        arrays[f"times{i}"] = features.times
+        index.append({"name": name, "properties": features.properties})
+    arrays["index"] = np.array(json.dumps(index, default=_jsonable))
+    blob = BytesIO()
+    np.savez(blob, **arrays)
+    return blob.getvalue()
+
+
+def load_results(blob: bytes) -> Dict[str, Features]:
+    with np.load(BytesIO(blob), allow_pickle=False) as arrays:
+        return {
+            entry["name"]: Features(
+                arrays[f"data{i}"], arrays[f"times{i}"], properties=entry["properties"]
+            )
+            for i, entry in enumerate(json.loads(str(arrays["index"])))
+        }
+
+
+class FeatureCache:
+    """Results of past analyses, looked up on the node's disk first and then under an s3
+    prefix shared by every job. The disk tier keeps the most recently used entries within
+    `budget_mb`; the s3 tier is left to the bucket's lifecycle rules.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        budget_mb: int,
+        client=None,
+        bucket: str = None,
+        prefix: str = None,
+    ):
+        self.cache_dir = cache_dir
+        self.budget_mb = budget_mb
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        if budget_mb:
+            makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def remote(self) -> bool:
+        return bool(self.client and self.bucket and self.prefix)
+
+    @property
+    def size_mb(self) -> float:
+        return sum(size for _, size, _ in self._entries()) / 1024 ** 2
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(last used, size, name) of every entry of the disk tier"""
+        if not self.budget_mb:
+            return []
+        entries = []
+        for name in listdir(self.cache_dir):
+            # entries still being written by another process
+            if name.startswith("."):
+                continue
+            try:
+                entry = stat(path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                # evicted by another process in the meantime
+                continue
+            entries.append((entry.st_mtime, entry.st_size, name))
+        return entries
+
+    def _local_path(self, key: str) -> str:
+        return path.join(self.cache_dir, key)
+
+    def _read_local(self, key: str) -> Optional[bytes]:
+        if not self.budget_mb or not path.exists(self._local_path(key)):
+            return None
+        with open(self._local_path(key), "rb") as f:
+            blob = f.read()
+        # bump the entry for eviction
+        utime(self._local_path(key))
+        return blob
+
+    def _write_local(self, key: str, blob: bytes):
+        if not self.budget_mb or len(blob) > self.budget_mb * 1024 ** 2:
+            return
+        # written aside and renamed, so that other processes never read partial entries
+        tmp_path = self._local_path(f".{key}.{uuid.uuid4().hex}")
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+        replace(tmp_path, self._local_path(key))
+        self._evict()
+
+    def _evict(self):
+        """Remove the least recently used entries until the disk tier fits its budget"""
+        entries = self._entries()
+        size = sum(size for _, size, _ in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.budget_mb * 1024 ** 2:
+                break
+            try:
+                remove(path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def _read_remote(self, key: str) -> Optional[bytes]:
+        if not self.remote:
+            return None
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=f"{self.prefix}{key}"
+            )
+            return response["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+                logger.error(e)
+        except BotoCoreError as e:
+            logger.error(e)
+        return None
+
+    def _write_remote(self, key: str, blob: bytes):
+        if not self.remote:
+            return
+        try:
+            self.client.put_object(
+                Bucket=self.bucket, Key=f"{self.prefix}{key}", Body=blob
+            )
+        except (BotoCoreError, ClientError) as e:
+            # the cache is an optimisation, a failed upload shouldn't fail the analysis
+            logger.error(e)
+
+    def get(self, key: str) -> Optional[Dict[str, Features]]:
+        """The cached results for `key`, by collection key, or None"""
+        blob = self._read_local(key)
+        remote = blob is None
+        if remote:
+            blob = self._read_remote(key)
+        try:
+            results = load_results(blob) if blob is not None else None
+        except (BadZipFile, KeyError, TypeError, ValueError) as e:
+            # not an entry this runner wrote, which is computed again and replaced
+            logger.error(f"unreadable feature cache entry {key}: {e!r}")
+            results = None
+        if results is None:
+            self.misses += 1
+            return None
+        if remote:
+            self.remote_hits += 1
+            self._write_local(key, blob)
+        else:
+            self.local_hits += 1
+        self.bytes_saved += len(blob)
+        return results
+
+    def put(self, key: str, results: Dict[str, Features]):
+        try:
+            blob = dump_results(results)
+        except TypeError as e:
+            logger.error(e)
+            return
+        self._write_local(key, blob)
+        self._write_remote(key, blob)
+
+    def report(self) -> str:
+        lookups = self.local_hits + self.remote_hits + self.misses
+        ratio = (self.local_hits + self.remote_hits) / lookups if lookups else 0
+        return (
+            f"feature cache: {self.local_hits} local hits, {self.remote_hits} s3 hits, "
+            f"{self.misses} misses ({ratio:.0%} hit ratio), "
+            f"{self.bytes_saved / 1024 ** 2:.1f} MB of results reused, "
+            f"{self.size_mb:.1f} MB on disk"
+        )
@@ -0,0 +1,298 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from shennong import Features
+from shennong.audio import Audio
+
+from app.chunking import first_sample, frame_geometry, num_frames
+from app.settings import settings as app_settings
+
+# parameters that must match for two processors to share their frames
+FRAMING_PARAMS = [
+    "frame_shift",
+    "frame_length",
+    "dither",
+    "preemph_coeff",
+    "remove_dc_offset",
+    "window_type",
+    "round_to_power_of_two",
+    "blackman_coeff",
+    "snip_edges",
+]
+
+EPSILON = np.finfo(np.float32).eps
+
+
+def framing(params: Dict[str, Any]) -> Tuple:
+    return tuple(params[name] for name in FRAMING_PARAMS)
+
+
+def window_function(window_type: str, length: int, blackman_coeff: float) -> np.ndarray:
+    a = 2 * np.pi / (length - 1)
+    i = np.arange(length)
+    if window_type == "hanning":
+        return 0.5 - 0.5 * np.cos(a * i)
+    if window_type == "hamming":
+        return 0.54 - 0.46 * np.cos(a * i)
+    if window_type == "povey":
+        return (0.5 - 0.5 * np.cos(a * i)) ** 0.85
+    if window_type == "rectangular":
+        return np.ones(length)
+    if window_type == "blackman":
+        return (
+            blackman_coeff
+            - 0.5 * np.cos(a * i)
+            + (0.5 - blackman_coeff) * np.cos(2 * a * i)
+        )
+    raise ValueError(f"Unknown window type {window_type}")
+
+
+class FramedSpectrum:
+    """What kaldi's computers share: the windowed frames' power spectrum, and the log energy
+    of each frame before (`raw_log_energy`) and after (`log_energy`) windowing
+    """
+
+    def __init__(self, samples: np.ndarray, processor):
+        frame_length, frame_shift = frame_geometry(processor)
+        nsamples = samples.shape[0]
+        nframes = num_frames(nsamples, frame_length, frame_shift, processor.snip_edges)
+        starts = first_sample(
+            np.arange(nframes), frame_length, frame_shift, processor.snip_edges
+        )
+        index = starts[:, None] + np.arange(frame_length)[None, :]
+        # frames overhanging the signal are mirrored back into it (snip_edges=False)
+        index = np.where(index < 0, -index - 1, index)
+        index = np.where(index >= nsamples, 2 * nsamples - 1 - index, index)
+        frames = samples[index].astype(np.float64)
+
+        if processor.dither:
+            frames += processor.dither * np.random.standard_normal(frames.shape)
+        if processor.remove_dc_offset:
+            frames -= frames.mean(axis=1, keepdims=True)
+        self.raw_log_energy = np.log(np.maximum((frames ** 2).sum(axis=1), EPSILON))
+        if processor.preemph_coeff:
+            frames[:, 1:] -= processor.preemph_coeff * frames[:, :-1]
+            frames[:, 0] -= processor.preemph_coeff * frames[:, 0]
+        frames *= window_function(
+            processor.window_type, frame_length, processor.blackman_coeff
+        )
+        self.log_energy = np.log(np.maximum((frames ** 2).sum(axis=1), EPSILON))
+
+        self.padded_length = (
+            1 << (frame_length - 1).bit_length()
+            if processor.round_to_power_of_two
+            else frame_length
+        )
+        self.power = np.abs(np.fft.rfft(frames, n=self.padded_length)) ** 2
+        self.nframes = nframes
+
+    def energy(self, processor) -> np.ndarray:
+        """The log energy kaldi computers put in their energy coefficient, floored as they do"""
+        energy = self.raw_log_energy if processor.raw_energy else self.log_energy
+        if processor.energy_floor > 0:
+            energy = np.maximum(energy, np.log(processor.energy_floor))
+        return energy
+
+
+def mel_scale(freq):
+    return 1127.0 * np.log(1.0 + freq / 700.0)
+
+
+def mel_banks(processor, padded_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Triangular mel filters over the fft bins (without the nyquist one) and their center frequencies"""
+    num_fft_bins = padded_length // 2
+    nyquist = 0.5 * processor.sample_rate
+    high_freq = processor.high_freq
+    if high_freq <= 0:
+        high_freq += nyquist
+    mel_low, mel_high = mel_scale(processor.low_freq), mel_scale(high_freq)
+    mel_delta = (mel_high - mel_low) / (processor.num_bins + 1)
+
+    bins = np.arange(processor.num_bins)[:, None]
+    left = mel_low + bins * mel_delta
+    center = mel_low + (bins + 1) * mel_delta
+    right = mel_low + (bins + 2) * mel_delta
+    fft_bin_width = processor.sample_rate / padded_length
+    mel = mel_scale(fft_bin_width * np.arange(num_fft_bins))[None, :]
+
+    weights = np.where(
+        mel <= center, (mel - left) / (center - left), (right - mel) / (right - center)
+    )
+    weights = np.where((mel > left) & (mel < right), weights, 0.0)
+
+    center_freqs = 700.0 * (np.exp(center[:, 0] / 1127.0) - 1.0)
+    return weights, center_freqs
+
+
+def mel_energies(spectrum: FramedSpectrum, processor, power: np.ndarray = None):
+    weights, _ = mel_banks(processor, spectrum.padded_length)
+    power = spectrum.power if power is None else power
+    return power[:, : weights.shape[1]] @ weights.T
+
+
+def lifter(num_ceps: int, cepstral_lifter: float) -> np.ndarray:
+    return 1.0 + 0.5 * cepstral_lifter * np.sin(
+        np.pi * np.arange(num_ceps) / cepstral_lifter
+    )
+
+
+def with_energy(features: np.ndarray, energy: np.ndarray, htk_compat: bool):
+    """Prepend the energy to the features, or append it as htk does"""
+    if htk_compat:
+        return np.hstack((features, energy[:, None]))
+    return np.hstack((energy[:, None], features))
+
+
+def spectrogram(spectrum: FramedSpectrum, processor) -> np.ndarray:
+    data = np.log(np.maximum(spectrum.power, EPSILON))
+    data[:, 0] = spectrum.energy(processor)
+    return data
+
+
+def energy(spectrum: FramedSpectrum, processor) -> np.ndarray:
+    if processor.raw_energy:
+        log_energy = spectrum.raw_log_energy
+    else:
+        log_energy = spectrum.log_energy
+    compressed = {
+        "log": log_energy,
+        "sqrt": np.exp(log_energy / 2),
+        "off": np.exp(log_energy),
+    }[processor.compression]
+    return compressed[:, None]
+
+
+def filterbank(spectrum: FramedSpectrum, processor) -> np.ndarray:
+    power = spectrum.power if processor.use_power else np.sqrt(spectrum.power)
+    data = mel_energies(spectrum, processor, power)
+    if processor.use_log_fbank:
+        data = np.log(np.maximum(data, EPSILON))
+    if processor.use_energy:
+        data = with_energy(data, spectrum.energy(processor), processor.htk_compat)
+    return data
+
+
+def mfcc(spectrum: FramedSpectrum, processor) -> np.ndarray:
+    num_bins, num_ceps = processor.num_bins, processor.num_ceps
+    log_mel = np.log(np.maximum(mel_energies(spectrum, processor), EPSILON))
+
+    k = np.arange(num_ceps)[:, None]
+    dct = np.sqrt(2.0 / num_bins) * np.cos(
+        np.pi / num_bins * (np.arange(num_bins) + 0.5) * k
+    )
+    dct[0] = np.sqrt(1.0 / num_bins)
+    data = log_mel @ dct.T
+
+    if processor.cepstral_lifter:
+        data *= lifter(num_ceps, processor.cepstral_lifter)
+    if processor.use_energy:
+        data[:, 0] = spectrum.energy(processor)
+    if processor.htk_compat:
+        c0 = data[:, 0] if processor.use_energy else data[:, 0] * np.sqrt(2)
+        data = np.hstack((data[:, 1:], c0[:, None]))
+    return data
+
+
+def durbin(autocorr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Levinson-Durbin recursion over frames, returning lpc coefficients and the residual energy"""
+    order = autocorr.shape[1] - 1
+    lpc = np.zeros((autocorr.shape[0], order))
+    error = autocorr[:, 0].copy()
+    for i in range(order):
+        ki = autocorr[:, i + 1] + (lpc[:, :i] * autocorr[:, i:0:-1]).sum(axis=1)
+        ki /= error
+        error *= np.maximum(1 - ki * ki, 1.0e-5)
+        previous = lpc[:, :i].copy()
+        lpc[:, :i] = previous - ki[:, None] * previous[:, ::-1]
+        lpc[:, i] = -ki
+    return lpc, error
+
+
+def lpc_to_cepstrum(lpc: np.ndarray) -> np.ndarray:
+    order = lpc.shape[1]
+    cepstrum = np.zeros_like(lpc)
+    for i in range(order):
+        j = np.arange(i)
+        weighted = (i - j) * lpc[:, :i] * cepstrum[:, i - j - 1]
+        cepstrum[:, i] = -lpc[:, i] - weighted.sum(axis=1) / (i + 1)
+    return cepstrum
+
+
+def plp(spectrum: FramedSpectrum, processor) -> np.ndarray:
+    num_bins, num_ceps = processor.num_bins, processor.num_ceps
+    _, center_freqs = mel_banks(processor, spectrum.padded_length)
+    fsq = center_freqs ** 2
+    equal_loudness = (fsq / (fsq + 1.6e5)) ** 2 * ((fsq + 1.44e6) / (fsq + 9.61e6))
+    compressed = (mel_energies(spectrum, processor) * equal_loudness) ** (
+        processor.compress_factor
+    )
+    # the first and last bins are duplicated before going back to autocorrelations
+    duplicated = np.hstack((compressed[:, :1], compressed, compressed[:, -1:]))
+
+    dimension = num_bins + 2
+    scale = 1.0 / (2.0 * (dimension - 1))
+    i = np.arange(processor.lpc_order + 1)[:, None]
+    idft = 2.0 * scale * np.cos(np.pi / (dimension - 1) * i * np.arange(dimension))
+    idft[:, 0] = scale
+    idft[:, -1] = scale * np.cos(np.pi * i[:, 0])
+    lpc, residual = durbin(duplicated @ idft.T)
+
+    data = np.empty((spectrum.nframes, num_ceps))
+    with np.errstate(divide="ignore"):
+        # sic, kaldi floors the log of the residual energy, not the energy itself
+        data[:, 0] = np.maximum(np.log(residual), np.finfo(np.float32).tiny)
+    data[:, 1:] = lpc_to_cepstrum(lpc)[:, : num_ceps - 1]
+    if processor.cepstral_lifter:
+        data *= lifter(num_ceps, processor.cepstral_lifter)
+    data *= processor.cepstral_scale
+    if processor.use_energy:
+        data[:, 0] = spectrum.energy(processor)
+    if processor.htk_compat:
+        data = np.hstack((data[:, 1:], data[:, :1]))
+    return data
+
+
+# Processors derived from a shared framed power spectrum, following kaldi's feature computers:
+# https://github.com/kaldi-asr/kaldi/tree/master/src/feat
+DERIVATIONS = {
+    "energy": energy,
+    "filterbank": filterbank,
+    "mfcc": mfcc,
+    "plp": plp,
+    "spectrogram": spectrogram,
+}
+
+
+class SharedFrontEnd:
+    """Framed power spectra of one file, computed once for all the frame-based processors
+    sharing a framing. Only used when the runner is set to (SHARED_FRONTEND), and then
+    for every analysis it can derive, shared or not, so that an analysis gives the same
+    results whatever else its job asks for.
+    """
+
+    def __init__(self, framings: List[Tuple]):
+        self.shared = set(framings) if app_settings.SHARED_FRONTEND else set()
+        self._spectra: Dict[Tuple, FramedSpectrum] = {}
+
+    def handles(self, class_key: str, processor) -> bool:
+        # rasta filters plp features across frames
+        return (
+            class_key in DERIVATIONS
+            and not getattr(processor, "rasta", False)
+            and framing(processor.get_params()) in self.shared
+        )
+
+    def process(self, class_key: str, processor, sound: Audio) -> Features:
+        key = framing(processor.get_params())
+        if key not in self._spectra:
+            # kaldi works on 16 bits samples, whatever the file's encoding
+            if sound.dtype != np.int16:
+                sound = sound.astype(np.int16)
+            self._spectra[key] = FramedSpectrum(sound.data, processor)
+        spectrum = self._spectra[key]
+        data = DERIVATIONS[class_key](spectrum, processor).astype(np.float32)
+        return Features(
+            data,
+            processor.times(spectrum.nframes),
+            properties=processor.get_properties(),
+        )
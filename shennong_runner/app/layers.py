@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+import logging
+from types import ModuleType
+from typing import Any, List, Set, Tuple
+
+import numpy as np
+from shennong import Features
+
+logger = logging.getLogger(__name__)
+
+
+def layer_list(layer_info: Any) -> List[Tuple[str, str]]:
+    """The layers requested by a `layer_info` argument, which is either a single
+    (type, number) pair or a list of them
+    """
+    if layer_info and all(isinstance(layer, (list, tuple)) for layer in layer_info):
+        return [tuple(layer) for layer in layer_info]
+    return [tuple(layer_info)]
+
+
+def layer_name(class_key: str, layer: Tuple[str, str]) -> str:
+    return f"{class_key}_{layer[0]}_{layer[1]}"
+
+
+def _networks(value: Any, network_type: type, depth: int, seen: Set[int]) -> List[Any]:
+    """The networks (outermost only) held by `value`, or by its attributes and items
+    down to `depth` levels
+    """
+    if id(value) in seen or isinstance(value, (ModuleType, type)):
+        return []
+    seen.add(id(value))
+    if isinstance(value, network_type):
+        return [value]
+    if depth == 0:
+        return []
+    if isinstance(value, dict):
+        children = list(value.values())
+    elif isinstance(value, (list, tuple)):
+        children = list(value)
+    else:
+        children = list(getattr(value, "__dict__", {}).values())
+    return [
+        network
+        for child in children
+        for network in _networks(child, network_type, depth - 1, seen)
+    ]
+
+
+def _kept(value: Any) -> Any:
+    """A copy of forward pass arguments, safe from later in-place changes"""
+    if hasattr(value, "detach"):
+        return value.detach().clone()
+    if isinstance(value, dict):
+        return {k: _kept(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_kept(v) for v in value)
+    return value
+
+
+def _same(value: Any, kept: Any) -> bool:
+    """Whether forward pass arguments have the content of those kept earlier, compared
+    rather than hashed, which stops at the first difference
+    """
+    if hasattr(value, "detach"):
+        return (
+            hasattr(kept, "detach")
+            and value.shape == kept.shape
+            and value.dtype == kept.dtype
+            and value.detach().equal(kept)
+        )
+    if isinstance(value, dict):
+        return (
+            isinstance(kept, dict)
+            and value.keys() == kept.keys()
+            and all(_same(value[k], kept[k]) for k in value)
+        )
+    if isinstance(value, (list, tuple)):
+        return (
+            isinstance(kept, (list, tuple))
+            and len(value) == len(kept)
+            and all(_same(v, k) for v, k in zip(value, kept))
+        )
+    if isinstance(value, np.ndarray):
+        return isinstance(kept, np.ndarray) and np.array_equal(value, kept)
+    return type(value) is type(kept) and value == kept
+
+
+def _hooked(module) -> bool:
+    return any(m._forward_hooks or m._forward_pre_hooks for m in module.modules())
+
+
+@contextmanager
+def shared_forward_pass(processor):
+    """Within the block, the networks held by `processor` (directly or a few attributes
+    down) run once per distinct input, later calls getting the first one's outputs
+    (hidden states included). Networks read through forward hooks are always run, as
+    memoised calls wouldn't trigger the hooks.
+    """
+    try:
+        import torch
+    except ImportError:
+        yield
+        return
+
+    modules = _networks(processor, torch.nn.Module, 3, set())
+    if not modules:
+        logger.warning(
+            f"no torch network found on {type(processor).__name__}, "
+            "each layer runs its own forward pass"
+        )
+    # converted modules (e.g. torch.compile's) may set their own forward on the instance
+    own_forwards = [vars(module).get("forward") for module in modules]
+    for module in modules:
+        forward, memo = module.forward, []
+
+        def memoised(*args, forward=forward, memo=memo, module=module, **kwargs):
+            if _hooked(module):
+                return forward(*args, **kwargs)
+            call = (args, kwargs)
+            for kept, outputs in memo:
+                if _same(call, kept):
+                    return outputs
+            outputs = forward(*args, **kwargs)
+            memo.append((_kept(call), outputs))
+            return outputs
+
+        # shadows the class' forward for this instance only
+        module.forward = memoised
+    try:
+        yield
+    finally:
+        for module, own_forward in zip(modules, own_forwards):
+            if own_forward is None:
+                del module.forward
+            else:
+                module.forward = own_forward
+
+
+class MultiLayerProcessor:
+    """Run a layered model's processor once per signal for several layers, each layer
+    read from the same forward pass. Layers are stacked column-wise, so that windowing
+    and stitching treat them as one set of features, and `split` separates them again.
+    """
+
+    def __init__(self, processor, layers: List[Tuple[str, str]]):
+        self.processor = processor
+        self.layers = layers
+        self.widths: List[int] = []
+        self.properties: List[dict] = []
+
+    def process(self, signal) -> Features:
+        layer_info = self.processor.layer_info
+        outputs = []
+        try:
+            with shared_forward_pass(self.processor):
+                for layer in self.layers:
+                    self.processor.set_params(layer_info=layer)
+                    outputs.append(self.processor.process(signal))
+        finally:
+            self.processor.set_params(layer_info=layer_info)
+
+        if len({output.nframes for output in outputs}) > 1:
+            raise ValueError(
+                f"layers {self.layers} have different frame rates, "
+                "they must be requested in separate analyses"
+            )
+        self.widths = [output.ndims for output in outputs]
+        self.properties = [output.properties for output in outputs]
+        return Features(
+            np.hstack([output.data for output in outputs]),
+            outputs[0].times,
+            properties=outputs[0].properties,
+        )
+
+    def split(self, features: Features) -> List[Features]:
+        """The features of each layer, in the order they were requested"""
+        bounds = np.cumsum([0] + self.widths)
+        return [
+            Features(features.data[:, start:stop], features.times, properties=props)
+            for start, stop, props in zip(bounds[:-1], bounds[1:], self.properties)
+        ]
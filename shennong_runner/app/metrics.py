@@ -0,0 +1,155 @@
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import resource
+import sys
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List
+
+
+def reset_peak_rss():
+    """Have peak_rss_mb count from now on, where linux lets a process reset its peak
+    (elsewhere it stays the peak of the whole process)
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """Peak resident memory of this process since it started or since reset_peak_rss,
+    or of its terminated children
+    """
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    )
+    # kilobytes on linux, bytes on macos
+    return usage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def emit(kind: str, record: Dict[str, Any]):
+    """Write the record as a JSON line on stdout, where the worker reads it from"""
+    print(json.dumps({"metrics": kind, **record}), flush=True)
+
+
+class CountingFile:
+    """File-like stand-in that counts what is written through it (characters, in text
+    mode, which is bytes for the ascii of csv results)
+    """
+
+    def __init__(self, f, counter: Callable[[int], None]):
+        self.f = f
+        self.counter = counter
+
+    def write(self, data):
+        self.counter(len(data))
+        return self.f.write(data)
+
+    def __getattr__(self, name: str):
+        return getattr(self.f, name)
+
+    def __enter__(self):
+        self.f.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.f.__exit__(*exc)
+
+
+class FileMetrics:
+    """Seconds spent on each stage of a file's analyses (its processor's compute, each
+    postprocessor and saving), the analyses' output bytes and whether they were cached,
+    along with the peak memory of the process while it analysed the file (and the
+    others of its batch, which are analysed together)
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.analyses: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"seconds": {}, "output_bytes": 0, "cached": False}
+        )
+        reset_peak_rss()
+        self.start = perf_counter()
+        # wall clock, which unlike perf_counter compares across processes
+        self.started = time()
+
+    @contextmanager
+    def timed(self, analysis: str, stage: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            seconds = self.analyses[analysis]["seconds"]
+            seconds[stage] = seconds.get(stage, 0.0) + perf_counter() - start
+
+    def cached(self, analysis: str):
+        self.analyses[analysis]["cached"] = True
+
+    def opener(self, analysis: str, opener: Callable = open) -> Callable:
+        """`opener`, counting what is written into the analysis' output bytes"""
+
+        def count(n: int):
+            self.analyses[analysis]["output_bytes"] += n
+
+        return lambda *args, **kwargs: CountingFile(opener(*args, **kwargs), count)
+
+    def record(self, audio_seconds: float, decode_seconds: float) -> Dict[str, Any]:
+        seconds = perf_counter() - self.start
+        return {
+            "file": self.file_path,
+            "audio_seconds": audio_seconds,
+            "decode_seconds": decode_seconds,
+            "seconds": seconds,
+            "started": self.started,
+            "finished": self.started + seconds,
+            # seconds of processing per second of audio
+            "realtime_factor": seconds / audio_seconds if audio_seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "analyses": dict(self.analyses),
+        }
+
+
+def merge(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One record of a file from those of the tasks it was split into, which may have run
+    at the same time: its seconds are the wall time from the first task's start to the
+    last one's end (task_seconds adding up those of each task), its memory the peak of
+    the busiest task
+    """
+    merged = dict(records[0], analyses={})
+    merged["started"] = min(record["started"] for record in records)
+    merged["finished"] = max(record["finished"] for record in records)
+    merged["seconds"] = merged["finished"] - merged["started"]
+    merged["task_seconds"] = sum(record["seconds"] for record in records)
+    merged["decode_seconds"] = sum(record["decode_seconds"] for record in records)
+    merged["peak_rss_mb"] = max(record["peak_rss_mb"] for record in records)
+    if merged["audio_seconds"]:
+        merged["realtime_factor"] = merged["seconds"] / merged["audio_seconds"]
+    for record in records:
+        merged["analyses"].update(record["analyses"])
+    return merged
+
+
+def job_summary(
+    records: List[Dict[str, Any]], seconds: float, workers: int
+) -> Dict[str, Any]:
+    """Totals over the job's files, `seconds` being its wall time"""
+    audio_seconds = sum(record["audio_seconds"] or 0 for record in records)
+    return {
+        "files": len(records),
+        "workers": workers,
+        "audio_seconds": audio_seconds,
+        "seconds": seconds,
+        "realtime_factor": seconds / audio_seconds if audio_seconds else None,
+        # the process' own peak is reset for each file
+        "peak_rss_mb": max(
+            [peak_rss_mb(), peak_rss_mb(children=True)]
+            + [record["peak_rss_mb"] for record in records]
+        ),
+        "output_bytes": sum(
+            analysis["output_bytes"]
+            for record in records
+            for analysis in record["analyses"].values()
+        ),
+    }
@@ -74,6 +74,10 @@ processor_class_map = {
 
 window_options = ["hamming", "hanning", "povey", "rectangular", "blackman"]
 
+# see app/backends.py, crepe has no backend to pick: its keras model lives in the crepe package
+# rather than on the processor, where it can be neither quantized nor compiled
+hubert_backends = ["eager", "int8", "compiled"]
+
 processor_options = {
     # https://github.com/bootphon/shennong/blob/master/shennong/processor/bottleneck.py#L509
     "bottleneck": {"weights": ["BabelMulti", "FisherMono", "FisherMulti"]},
@@ -81,15 +85,35 @@ processor_options = {
     # https://github.com/bootphon/shennong/blob/master/shennong/processor/energy.py#L26
     "energy": {"window_type": window_options, "compression": ["log", "sqrt", "off"]},
     "filterbank": {"window_type": window_options,},
-    "hubert_large_ls960_ft": {"layer_info": [("convolutional" , str(x)) for x in range(1, 8)] + [("encoder", str(x)) for x in range(1, 25)],},
+    "hubert_large_ls960_ft": {"layer_info": [("convolutional" , str(x)) for x in range(1, 8)] + [("encoder", str(x)) for x in range(1, 25)], "inference_backend": hubert_backends,},
     "mfcc": {"window_type": window_options,},
-    "mHuBERT_147": {"layer_info": [("convolutional" , str(x)) for x in range(1, 8)] + [("encoder", str(x)) for x in range(1, 13)],},
+    "mHuBERT_147": {"layer_info": [("convolutional" , str(x)) for x in range(1, 8)] + [("encoder", str(x)) for x in range(1, 13)], "inference_backend": hubert_backends,},
     "plp": {"window_type": window_options,},
     "spectrogram": {"window_type": window_options,},
     # https://github.com/bootphon/shennong/blob/master/shennong/processor/vtln.py#L156
     "vtln": {"norm_type": ["offset", "none", "diag"]},
 }
 
+# arguments whose options can be picked several at once, the runner then giving each its own results
+multiple_choice_args = {
+    "hubert_large_ls960_ft": ["layer_info"],
+    "mHuBERT_147": ["layer_info"],
+}
+
+# arguments the runner handles itself instead of passing them on to the processor,
+# here to run models over long files one window (seconds) at a time, 0 meaning the whole file
+windowed_inference_args = {"window_length": 60.0, "window_overlap": 5.0}
+# and to pick how (see app/backends.py) and on how many threads (0 leaving it to app/threads.py)
+# models run
+inference_args = {"inference_backend": "eager", "num_threads": 0}
+
+runner_args = {
+    "hubert_large_ls960_ft": {**windowed_inference_args, **inference_args},
+    "mHuBERT_147": {**windowed_inference_args, **inference_args},
+    # crepe has no attention, only its viterbi smoothing needs context from the neighbouring windows
+    "pitch_crepe": {**windowed_inference_args, "window_overlap": 1.0, "num_threads": 0},
+}
+
 postprocessor_class_map = {
     "cmvn": {"class_name": CmvnPostProcessor,},
     "delta": {"class_name": DeltaPostProcessor},
@@ -141,6 +165,12 @@ class Arg:
         if hasattr(self, "options"):
             attrs["options"] = self.options
 
+        if getattr(self, "runner", False):
+            attrs["runner"] = True
+
+        if getattr(self, "multiple", False):
+            attrs["multiple"] = True
+
         return attrs
 
     @property
@@ -167,6 +197,8 @@ class ProcessorSpec:
     def toschema(self):
         return {
             "class_name": self.processor_class.__name__,
+            # imported by the runner once a job asks for the class (app/registry.py)
+            "module": self.processor_class.__module__,
             "init_args": [a.toschema() for a in self.init_args],
             "required_postprocessors": self.required_postprocessors,
             "valid_postprocessors": self.valid_postprocessors,
@@ -179,6 +211,7 @@ def build_processor_spec(
     valid_postprocessors: List[str] = None,
     required_postprocessors: List[str] = None,
     default_overrides: Dict[str, Any] = None,
+    runner_args: Dict[str, Any] = None,
 ):
     """factory function for building a processor spec"""
     required_postprocessors = required_postprocessors if required_postprocessors else []
@@ -207,7 +240,16 @@ def build_processor_spec(
                 arg.options = processor_options[class_key][arg.name]
             except KeyError:
                 arg.options = []
+            arg.multiple = arg.name in multiple_choice_args.get(class_key, [])
+
+        processor.init_args.append(arg)
 
+    for name, default in (runner_args or {}).items():
+        arg = Arg(name)
+        arg.default = default
+        arg.runner = True
+        if arg.type == str:
+            arg.options = processor_options.get(class_key, {}).get(name, [])
         processor.init_args.append(arg)
 
     for k, v in inspect.signature(Processor.process).parameters.items():
@@ -236,7 +278,8 @@ def build_schema():
             v["class_name"],
             v["valid_postprocessors"],
             v.get("required_postprocessors"),
-            default_overrides=v.get("default_overrides")
+            default_overrides=v.get("default_overrides"),
+            runner_args=runner_args.get(k),
         )
         schema["processors"][k] = processor.toschema()
 
@@ -0,0 +1,49 @@
+from typing import Callable
+
+import numpy as np
+from shennong import Features
+
+
+def frame_centers(times: np.ndarray) -> np.ndarray:
+    """Time of each frame, whether features store frame centers or (start, stop) pairs"""
+    return times.mean(axis=1) if times.ndim == 2 else times
+
+
+def align(features: Features, times: np.ndarray) -> Features:
+    """Resample `features` onto `times`, each frame taking the nearest frame of `features`"""
+    source = frame_centers(features.times)
+    target = frame_centers(times)
+    if len(source) < 2:
+        nearest = np.zeros(len(target), dtype=int)
+    else:
+        after = np.clip(np.searchsorted(source, target), 1, len(source) - 1)
+        nearest = np.where(
+            target - source[after - 1] <= source[after] - target, after - 1, after
+        )
+    return Features(features.data[nearest], times, properties=features.properties)
+
+
+class PostprocessorGraph:
+    """Postprocessors of one file's analyses, sharing voice activity between them.
+    Voice activity only depends on the file's log energy, so it is computed once from
+    an energy analysis and aligned to the frames of each analysis asking for it, rather
+    than recomputed from every analysis' own first column. Other postprocessors run on
+    each analysis' own features, and nothing else is kept once the analysis is saved.
+    """
+
+    def __init__(self, resolve_postprocessor: Callable):
+        self.resolve_postprocessor = resolve_postprocessor
+        self._vad: Features = None
+
+    def vad(self, energy: Callable[[], Features]) -> Features:
+        if self._vad is None:
+            self._vad = self.resolve_postprocessor("vad").process(energy())
+        return self._vad
+
+    def process(
+        self, postprocessor: str, features: Features, energy: Callable[[], Features]
+    ) -> Features:
+        """Output of `postprocessor` on `features`, `energy` being called at most once per file"""
+        if postprocessor == "vad":
+            return align(self.vad(energy), features.times)
+        return self.resolve_postprocessor(postprocessor, features).process(features)
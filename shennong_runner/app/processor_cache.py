@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Approximate resident size (MB) of processors that load network weights when built.
+# Processors missing from this map are cheap to keep around and count as 0.
+PROCESSOR_SIZES_MB = {
+    "bottleneck": 150,
+    "hubert_large_ls960_ft": 1300,
+    "mHuBERT_147": 400,
+    "pitch_crepe": 100,
+}
+
+
+def freeze(value: Any) -> Hashable:
+    """Turn (possibly nested) init args into something hashable"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class ProcessorCache:
+    """Least-recently-used cache of processor instances, keyed by (class_key, frozen init_args),
+    so that models are loaded once per job rather than once per file.
+    Processors are evicted oldest first when keeping a new one would exceed the memory budget.
+    """
+
+    def __init__(
+        self, factory: Callable[[str, Dict[str, Any]], Any], budget_mb: int,
+    ):
+        self.factory = factory
+        self.budget_mb = budget_mb
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._processors = OrderedDict()
+
+    def __len__(self):
+        return len(self._processors)
+
+    @property
+    def size_mb(self) -> int:
+        return sum(PROCESSOR_SIZES_MB.get(key[0], 0) for key in self._processors)
+
+    def get(self, class_key: str, init_args: Dict[str, Any]):
+        """Return a cached processor, building (and possibly caching) it on a miss"""
+        key = (class_key, freeze(init_args))
+
+        if key in self._processors:
+            self.hits += 1
+            self._processors.move_to_end(key)
+            return self._processors[key]
+
+        self.misses += 1
+        size = PROCESSOR_SIZES_MB.get(class_key, 0)
+
+        if size > self.budget_mb:
+            return self.factory(class_key, init_args)
+
+        # evict before building, so that the old weights can be released first
+        while self.size_mb + size > self.budget_mb:
+            self._processors.popitem(last=False)
+            self.evictions += 1
+
+        processor = self.factory(class_key, init_args)
+        self._processors[key] = processor
+        return processor
+
+    def report(self) -> str:
+        return (
+            f"processor cache: {self.hits} hits, {self.misses} misses, "
+            f"{self.evictions} evictions, {len(self)} resident (~{self.size_mb} MB)"
+        )
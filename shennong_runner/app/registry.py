@@ -0,0 +1,66 @@
+"""Processor and postprocessor classes by their key in processor-schema.json. Each
+module is imported the first time a job asks for one of its classes, rather than when
+the runner starts.
+
+This defers imports, it doesn't avoid them: the shennong.processor package imports
+every processor from its __init__, so the first processor a job resolves brings in all
+of the backends, whichever it asked for. What the runner saves is starting up without
+them (and without pandas, which only the csv writer still needs).
+"""
+from importlib import import_module
+import json
+import logging
+from os import path
+import sys
+from typing import Dict, Iterable, Tuple
+
+from app.settings import settings as app_settings
+
+logger = logging.getLogger(__name__)
+
+with open(path.join(app_settings.PROJECT_ROOT, "processor-schema.json")) as f:
+    shennong_schema = json.loads(f.read())
+
+# (module, class name) of each processor and postprocessor, by kind and key
+DISPATCH: Dict[str, Dict[str, Tuple[str, str]]] = {
+    kind: {
+        key: (spec["module"], spec["class_name"])
+        for key, spec in shennong_schema[kind].items()
+    }
+    for kind in ("processors", "postprocessors")
+}
+
+# imported ahead of any other processor or postprocessor module, which prevents a
+# circular dependency within shennong
+IMPORTED_FIRST = "shennong.processor.pitch_kaldi"
+
+_classes: Dict[Tuple[str, str], type] = {}
+
+
+def resolve_class(kind: str, class_key: str) -> type:
+    """The class of a processor (`kind` being "processors") or of a postprocessor
+    ("postprocessors"), importing its module on first use
+    """
+    module_name, class_name = DISPATCH[kind][class_key]
+    if (module_name, class_name) not in _classes:
+        if IMPORTED_FIRST not in sys.modules:
+            import_module(IMPORTED_FIRST)
+        _classes[module_name, class_name] = getattr(
+            import_module(module_name), class_name
+        )
+    return _classes[module_name, class_name]
+
+
+def prewarm(class_keys: Iterable[str]):
+    """Import the modules of these processors, and of the postprocessors they take,
+    before any job needs them
+    """
+    for class_key in class_keys:
+        if class_key not in DISPATCH["processors"]:
+            logger.error(f"can't prewarm unknown processor {class_key}")
+            continue
+        resolve_class("processors", class_key)
+        for postprocessor in shennong_schema["processors"][class_key][
+            "valid_postprocessors"
+        ]:
+            resolve_class("postprocessors", postprocessor)
@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+import os
+
+# variables OpenMP, the BLAS libraries, numexpr and tensorflow size their thread pools from
+# when they are loaded (torch's default follows OMP_NUM_THREADS)
+THREAD_VARIABLES = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+]
+
+
+def cpu_count() -> int:
+    """Number of cores this process may run on (respects container cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory_mb() -> int:
+    """Memory that can be claimed without swapping, per /proc/meminfo when available"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 1024 ** 2
+
+
+def pool_size(worker_mb: int, reserved_mb: int = 0, limit: int = None) -> int:
+    """How many workers needing `worker_mb` each fit on this node, alongside `reserved_mb`
+    held elsewhere, capped at one per core and at `limit` when given. Always at least 1.
+    """
+    by_memory = (available_memory_mb() - reserved_mb) // max(worker_mb, 1)
+    size = min(cpu_count(), by_memory)
+    if limit is not None:
+        size = min(size, limit)
+    return max(1, size)
+
+
+def thread_budget(workers: int) -> int:
+    """Threads each of `workers` concurrent processes may use without oversubscribing the cores"""
+    return max(1, cpu_count() // max(workers, 1))
+
+
+@contextmanager
+def thread_limits(threads: int):
+    """Processes started within the block load their thread pools with `threads` threads,
+    unless the variables were set explicitly for the runner
+    """
+    unset = [name for name in THREAD_VARIABLES if name not in os.environ]
+    for name in unset:
+        os.environ[name] = str(threads)
+    try:
+        yield
+    finally:
+        for name in unset:
+            del os.environ[name]
@@ -1,10 +1,61 @@
-from os import path
+from os import getenv, path
+import tempfile
+from typing import List
 
 
 class Settings:
     """App-wide settings"""
 
     PROJECT_ROOT: str = path.abspath(path.join(path.dirname(__file__), ".."))
+    # memory budget for processors (and their model weights) kept between files of a job
+    PROCESSOR_CACHE_MB: int = int(getenv("PROCESSOR_CACHE_MB", 4096))
+    # number of files analysed at once; 0 sizes the pool from the node's cores and memory
+    RUNNER_WORKERS: int = int(getenv("RUNNER_WORKERS", 1))
+    # expected peak memory of one worker, excluding model weights
+    RUNNER_WORKER_MB: int = int(getenv("RUNNER_WORKER_MB", 2048))
+    # cap on the workers that run (and so hold) large neural models, at least one
+    RUNNER_MODEL_WORKERS: int = int(getenv("RUNNER_MODEL_WORKERS", 1))
+    # number of s3 downloads kept in flight ahead of the file being analysed; 0 disables prefetching
+    PREFETCH_DEPTH: int = int(getenv("PREFETCH_DEPTH", 4))
+    # scratch disk that prefetched downloads must leave free
+    SCRATCH_RESERVE_MB: int = int(getenv("SCRATCH_RESERVE_MB", 1024))
+    # audio handed at once to frame-based processors on longer files; 0 always processes whole files
+    CHUNK_SECONDS: int = int(getenv("CHUNK_SECONDS", 60))
+    # consecutive files shorter than BATCH_FILE_SECONDS are analysed together by frame-based
+    # processors, up to BATCH_SECONDS of audio at once (and no more than CHUNK_SECONDS); 0 disables it
+    BATCH_SECONDS: int = int(getenv("BATCH_SECONDS", 30))
+    BATCH_FILE_SECONDS: int = int(getenv("BATCH_FILE_SECONDS", 5))
+    # 1 derives energy, filterbank, mfcc, plp and spectrogram from one framed spectrum per
+    # framing with a numpy port of kaldi's computers, rather than running shennong's own;
+    # results then differ from shennong's within float precision
+    SHARED_FRONTEND: int = int(getenv("SHARED_FRONTEND", 0))
+    # with several workers, the analyses of files at least this long run concurrently, each worker
+    # mapping the file's samples from shared memory; 0 keeps every file's analyses together
+    SPLIT_FILE_SECONDS: int = int(getenv("SPLIT_FILE_SECONDS", 300))
+    # node-local directory of cached analysis results, kept within FEATURE_CACHE_MB (0 disables it)
+    FEATURE_CACHE_DIR: str = getenv(
+        "FEATURE_CACHE_DIR", path.join(tempfile.gettempdir(), "sfo-feature-cache")
+    )
+    FEATURE_CACHE_MB: int = int(getenv("FEATURE_CACHE_MB", 2048))
+    # prefix of the cached results shared through the job bucket; empty (the default) disables
+    # it, which should stay so while users' upload credentials can write under the prefix
+    FEATURE_CACHE_PREFIX: str = getenv("FEATURE_CACHE_PREFIX", "")
+    # uploads converted once to raw samples with a small header, which the runner maps rather
+    # than decodes: kept on the node within AUDIO_STORE_MB and under AUDIO_STORE_PREFIX in the
+    # bucket, either enabling the store (which is off when both are unset)
+    AUDIO_STORE_DIR: str = getenv(
+        "AUDIO_STORE_DIR", path.join(tempfile.gettempdir(), "sfo-audio-store")
+    )
+    AUDIO_STORE_MB: int = int(getenv("AUDIO_STORE_MB", 0))
+    AUDIO_STORE_PREFIX: str = getenv("AUDIO_STORE_PREFIX", "")
+    # prefix under which each job keeps its finished files until it is stored, so that
+    # resubmitting a job that died resumes it; empty disables it
+    CHECKPOINT_PREFIX: str = getenv("CHECKPOINT_PREFIX", "checkpoints/")
+    # comma-separated keys of processors whose modules are imported as the runner (and each
+    # of its workers) starts, rather than once a file first needs them
+    PREWARM_PROCESSORS: List[str] = [
+        key for key in getenv("PREWARM_PROCESSORS", "").split(",") if key
+    ]
 
 
 settings = Settings()
@@ -1,19 +1,33 @@
 from copy import deepcopy
+import json
+from os import environ, listdir, path
+from zipfile import ZipFile
 from unittest.mock import patch, Mock
 
 import numpy as np
 from pytest import raises
+from scipy.io import wavfile
 from shennong import FeaturesCollection
 from shennong.processor.spectrogram import SpectrogramProcessor
 from shennong.postprocessor.delta import DeltaPostProcessor
 from shennong.postprocessor.cmvn import CmvnPostProcessor
 
 from app.analyse import (
+    analyse_file,
+    analyse_files_in_parallel,
     get_column_names,
     resolve_processor,
     resolve_postprocessor,
     Analyser,
+    JobConfig,
+    LocalFileManager,
+    retry_jobs,
+    split_analyses,
 )
+from app.audio import DecodedAudio
+from app.processor_cache import ProcessorCache
+from app.resources import thread_limits
+from app.settings import settings as app_settings
 
 
 def test_resolve_spectrogram_processor():
@@ -43,7 +57,7 @@ def test_resolve_cmvn_postprocessor():
         resolve_postprocessor("cmvn")
 
 
-@patch("app.analyse.Audio", load=lambda x: Mock(nchannels=1, sound=True))
+@patch("app.audio.Audio", load=lambda x: Mock(nchannels=1, sound=True))
 @patch("app.analyse.resolve_processor", return_value=Mock(process=lambda a: True))
 def test_processor_and_postprocessor_with_same_name_are_merged(
     resolve_processor_mock, audio_mock
@@ -56,7 +70,7 @@ def test_processor_and_postprocessor_with_same_name_are_merged(
 
     calls = []
 
-    analyser = Analyser("fakepath", 1, FeaturesCollection())
+    analyser = Analyser(DecodedAudio.load("fakepath", 1), FeaturesCollection())
     analyser.postprocess = lambda pp, key: calls.append(pp)
     analyser.process(key, deepcopy(settings))
 
@@ -71,7 +85,7 @@ def test_processor_and_postprocessor_with_same_name_are_merged(
 
     key = "d"
 
-    analyser = Analyser("fakepath", 1, FeaturesCollection())
+    analyser = Analyser(DecodedAudio.load("fakepath", 1), FeaturesCollection())
     analyser.postprocess = lambda pp, key: calls.append(pp)
     analyser.process(key, deepcopy(settings))
     # assert that b was not called first, b/c our main processor is "d", which has no corresponding postprocessor
@@ -87,3 +101,234 @@ def test_get_col_names_general():
     assert get_column_names("vad") == ["voiced"]
     assert get_column_names("foobar") == None
     assert len(get_column_names("delta", np.array(["a", "b"]))) == 6
+
+
+def test_decoded_audio_resamples_once_per_rate():
+    """ Processors that share a target sample rate should share a single resampling """
+    sound = Mock(sample_rate=44100)
+    sound.resample.side_effect = lambda rate: Mock(sample_rate=rate)
+    audio = DecodedAudio(sound)
+
+    assert audio.for_processor("energy") is sound
+    assert audio.resampled(44100) is sound
+    assert audio.for_processor("pitch_crepe") is audio.resampled(16000)
+    assert audio.for_processor("bottleneck").sample_rate == 8000
+    assert sound.resample.call_count == 2
+
+
+def test_parallel_files_keep_error_isolation_and_order(tmpdir, monkeypatch):
+    """ Files analysed in the pool should save the same outputs and report failures in job order """
+    # read again by the spawned workers
+    monkeypatch.setenv("FEATURE_CACHE_DIR", str(tmpdir / "feature-cache"))
+    # taken as one
+    monkeypatch.setattr(app_settings, "RUNNER_MODEL_WORKERS", 0)
+    sample = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+    class FixtureFileManager(LocalFileManager):
+        def load(self, key):
+            return sample
+
+    manager = FixtureFileManager(str(tmpdir / "fm"))
+    energy_args = {"sample_rate": 16000, "dither": 0.0}
+    jobconfig = JobConfig(
+        analyses={
+            "spectrogram": {"init_args": {"not_an_arg": 1}, "postprocessors": []},
+            "energy": {"init_args": energy_args, "postprocessors": ["delta"]},
+        },
+        channel=1,
+        files=["a/first.wav", "b/second.wav"],
+        save_path="",
+        res=".csv",
+    )
+
+    results = list(analyse_files_in_parallel(manager, jobconfig, 2))
+
+    assert results == [
+        ("a/first.wav", ["spectrogram"]),
+        ("b/second.wav", ["spectrogram"]),
+    ]
+    assert sorted(listdir(manager.results_dir)) == [
+        "first_energy.csv",
+        "first_energy_delta.csv",
+        "second_energy.csv",
+        "second_energy_delta.csv",
+    ]
+
+
+def test_analyses_sharing_a_front_end_stay_together():
+    kaldi_args = {"init_args": {"frame_shift": 0.01}, "postprocessors": []}
+    analyses = {
+        "mfcc": kaldi_args,
+        "filterbank": kaldi_args,
+        "plp": {"init_args": {"frame_shift": 0.02}, "postprocessors": []},
+        "pitch_kaldi": {"init_args": {}, "postprocessors": []},
+    }
+    assert [list(group) for group in split_analyses(analyses)] == [
+        ["mfcc", "filterbank"],
+        ["plp"],
+        ["pitch_kaldi"],
+    ]
+
+
+def test_long_file_analyses_run_apart_on_shared_samples(tmpdir, monkeypatch):
+    """A long file's analyses should be spread over the workers, with the same results"""
+    monkeypatch.setenv("FEATURE_CACHE_DIR", str(tmpdir / "feature-cache"))
+    monkeypatch.setattr(app_settings, "SPLIT_FILE_SECONDS", 1)
+    monkeypatch.setattr("app.audio.SHARED_MEMORY_DIR", str(tmpdir))
+    sample = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+    class FixtureFileManager(LocalFileManager):
+        def load(self, key):
+            return sample
+
+    analyses = {
+        "spectrogram": {"init_args": {"not_an_arg": 1}, "postprocessors": []},
+        "energy": {"init_args": {"dither": 0.0}, "postprocessors": ["delta"]},
+        # without the shared front end, the processor checks the file's sample rate
+        "mfcc": {
+            "init_args": {"sample_rate": 44100, "dither": 0.0},
+            "postprocessors": [],
+        },
+    }
+    shared = []
+    share = DecodedAudio.share
+    monkeypatch.setattr(
+        DecodedAudio, "share", lambda *args: shared.append(share(*args)) or shared[-1]
+    )
+    manager = FixtureFileManager(str(tmpdir / "fm"))
+    jobconfig = JobConfig(
+        analyses=deepcopy(analyses),
+        channel=1,
+        files=["a/long.wav"],
+        save_path="",
+        res=".csv",
+    )
+
+    results = list(analyse_files_in_parallel(manager, jobconfig, 2))
+
+    assert results == [("a/long.wav", ["spectrogram"])]
+    # the samples were shared once, and are gone once the file is collected
+    assert [path.dirname(s.samples_path) for s in shared] == [str(tmpdir)]
+    assert not path.exists(shared[0].samples_path)
+
+    (tmpdir / "whole").mkdir()
+    analyse_file(
+        sample,
+        "a/long.wav",
+        1,
+        deepcopy(analyses),
+        str(tmpdir / "whole"),
+        ".csv",
+        {},
+        ProcessorCache(resolve_processor, 0),
+    )
+    assert sorted(listdir(manager.results_dir)) == sorted(
+        listdir(str(tmpdir / "whole"))
+    )
+    for result in listdir(str(tmpdir / "whole")):
+        with open(path.join(manager.results_dir, result)) as split, open(
+            str(tmpdir / "whole" / result)
+        ) as whole:
+            assert split.read() == whole.read()
+
+
+def test_thread_limits_apply_to_the_block_and_keep_explicit_settings(monkeypatch):
+    monkeypatch.delenv("OMP_NUM_THREADS", raising=False)
+    monkeypatch.setenv("MKL_NUM_THREADS", "3")
+    with thread_limits(2):
+        assert environ["OMP_NUM_THREADS"] == "2"
+        assert environ["MKL_NUM_THREADS"] == "3"
+    assert "OMP_NUM_THREADS" not in environ
+    assert environ["MKL_NUM_THREADS"] == "3"
+
+
+def test_retries_only_run_the_failed_pairs():
+    jobconfig = JobConfig(
+        analyses={"mfcc": {}, "plp": {}, "energy": {}},
+        channel=1,
+        files=["a.wav", "b.wav", "c.wav", "d.wav"],
+        save_path="",
+        res=".csv",
+    )
+    failures = [
+        {"file": "c.wav", "processor": "plp"},
+        {"file": "a.wav", "processor": "plp"},
+        {"file": "a.wav", "processor": "mfcc"},
+        {"file": "d.wav", "processor": "plp"},
+        # a channel the file doesn't have isn't worth retrying
+        {"file": "b.wav", "processor": "channel 2"},
+    ]
+
+    jobs = retry_jobs(jobconfig, failures)
+
+    assert [(list(job.analyses), job.files) for job in jobs] == [
+        (["mfcc", "plp"], ["a.wav"]),
+        (["plp"], ["c.wav", "d.wav"]),
+    ]
+
+
+def test_earlier_results_carry_over_without_the_job_files(tmpdir):
+    archive_path = str(tmpdir / "previous.zip")
+    failures = [{"file": "a/first.wav", "processor": "plp"}]
+    with ZipFile(archive_path, "w") as archive:
+        archive.writestr("sfo-results/first_mfcc.csv", "1,2\n")
+        archive.writestr("sfo-results/failures.json", json.dumps(failures))
+        archive.writestr("sfo-results/error-log.txt", "Failed: first.wav-plp\n")
+    manager = LocalFileManager(str(tmpdir / "fm"))
+
+    assert manager.carry_over(archive_path, ["a/first.wav"]) == failures
+    assert listdir(manager.results_dir) == ["first_mfcc.csv"]
+
+
+def test_failures_of_older_archives_come_from_the_error_log(tmpdir):
+    archive_path = str(tmpdir / "previous.zip")
+    with ZipFile(archive_path, "w") as archive:
+        archive.writestr(
+            "sfo-results/error-log.txt",
+            "Failed: first.wav-plp\nsomething else\nFailed: my-second.wav-pitch_kaldi\n",
+        )
+    manager = LocalFileManager(str(tmpdir / "fm"))
+
+    assert manager.carry_over(
+        archive_path, ["a/first.wav", "b/first.wav", "a/my-second.wav", "a/third.wav"]
+    ) == [
+        {"file": "a/first.wav", "processor": "plp"},
+        {"file": "b/first.wav", "processor": "plp"},
+        {"file": "a/my-second.wav", "processor": "pitch_kaldi"},
+    ]
+
+
+def test_all_channels_are_analysed_in_one_pass(tmpdir):
+    sample = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+    sample_rate, data = wavfile.read(sample)
+    stereo = str(tmpdir / "stereo.wav")
+    wavfile.write(stereo, sample_rate, np.stack([data, data[::-1]], axis=1))
+    analyses = {
+        "mfcc": {"init_args": {"sample_rate": 44100, "dither": 0}, "postprocessors": []}
+    }
+    processors = ProcessorCache(resolve_processor, 0)
+
+    def outputs(channel, name, failures=()):
+        results_dir = tmpdir.mkdir(name)
+        failed = analyse_file(
+            stereo,
+            "corpus/stereo.wav",
+            channel,
+            analyses,
+            str(results_dir),
+            ".csv",
+            {},
+            processors,
+        )
+        assert failed == list(failures)
+        return {f: (results_dir / f).read() for f in listdir(str(results_dir))}
+
+    every = outputs("all", "every")
+    assert sorted(every) == ["stereo_ch1_mfcc.csv", "stereo_ch2_mfcc.csv"]
+    assert outputs([2, 3], "second", ["channel 3"]) == {
+        "stereo_ch2_mfcc.csv": every["stereo_ch2_mfcc.csv"]
+    }
+    for channel in (1, 2):
+        alone = outputs(channel, f"alone{channel}")
+        assert alone["stereo_mfcc.csv"] == every[f"stereo_ch{channel}_mfcc.csv"]
+    assert every["stereo_ch1_mfcc.csv"] != every["stereo_ch2_mfcc.csv"]
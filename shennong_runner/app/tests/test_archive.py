@@ -0,0 +1,93 @@
+from io import BytesIO
+from os import listdir
+from zipfile import ZipFile
+from unittest.mock import Mock
+
+from app.analyse import LocalFileManager
+from app.archive import MultipartUpload, ResultArchive
+
+
+def make_client():
+    client = Mock()
+    client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    client.upload_part.side_effect = lambda **kwargs: {
+        "ETag": f"etag-{kwargs['PartNumber']}"
+    }
+    return client
+
+
+def uploaded_bytes(client):
+    return b"".join(
+        c.kwargs["Body"]
+        for c in sorted(
+            client.upload_part.call_args_list, key=lambda c: c.kwargs["PartNumber"]
+        )
+    )
+
+
+def test_multipart_upload_splits_parts_and_completes():
+    client = make_client()
+    stream = MultipartUpload(client, "bucket", "key.zip", part_size=4)
+    stream.write(b"abcdefghij")
+    stream.write(b"k")
+    stream.close()
+
+    assert [c.kwargs["Body"] for c in client.upload_part.call_args_list] == [
+        b"abcd",
+        b"efgh",
+        b"ijk",
+    ]
+    parts = client.complete_multipart_upload.call_args.kwargs["MultipartUpload"]
+    assert parts["Parts"] == [{"ETag": f"etag-{n}", "PartNumber": n} for n in (1, 2, 3)]
+
+
+def test_aborted_upload_is_not_completed():
+    client = make_client()
+    stream = MultipartUpload(client, "bucket", "key.zip", part_size=4)
+    stream.write(b"abcdefgh")
+    stream.abort()
+    stream.close()
+
+    client.abort_multipart_upload.assert_called_once()
+    client.complete_multipart_upload.assert_not_called()
+
+
+def test_archive_streams_entries_to_upload():
+    """A zip written straight into the upload (which can't seek) should still be readable"""
+    client = make_client()
+    archive = ResultArchive(MultipartUpload(client, "bucket", "key.zip", part_size=64))
+    with archive.open("a.csv") as f:
+        f.write("start,end\n0.0,0.025\n" * 20)
+    with archive.open("a.pkl", "wb") as f:
+        f.write(b"\x00\x01")
+    archive.close()
+
+    with ZipFile(BytesIO(uploaded_bytes(client))) as zf:
+        assert zf.namelist() == ["sfo-results/a.csv", "sfo-results/a.pkl"]
+        assert zf.read("sfo-results/a.csv").startswith(b"start,end\n")
+        assert zf.read("sfo-results/a.pkl") == b"\x00\x01"
+
+
+def test_results_are_written_into_the_archive(tmpdir):
+    """Results saved through the manager shouldn't be left on disk, but should end up in the zip"""
+    fm = LocalFileManager(tmpdir / "fm-test")
+    fm.open_archive("unused")
+
+    with fm.open_result(f"{fm.results_dir}/sample_energy.csv") as f:
+        f.write("energy\n1.0\n")
+
+    staging_dir = fm.staging_dir()
+    with open(f"{staging_dir}/other_energy.csv", "w") as f:
+        f.write("energy\n2.0\n")
+    fm.archive_dir(staging_dir)
+    fm.log_error("Failed: other.wav-mfcc")
+
+    assert listdir(fm.results_dir) == ["error-log.txt"]
+
+    with ZipFile(fm.zip_tmp_files()) as zf:
+        assert zf.namelist() == [
+            "sfo-results/sample_energy.csv",
+            "sfo-results/other_energy.csv",
+            "sfo-results/error-log.txt",
+        ]
+        assert zf.read("sfo-results/other_energy.csv") == b"energy\n2.0\n"
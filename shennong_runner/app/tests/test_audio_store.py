@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import listdir, path
+import shutil
+import time
+from unittest.mock import Mock
+
+from botocore.exceptions import ClientError
+
+import numpy as np
+from scipy.io import wavfile
+from shennong.audio import Audio
+
+from app.analyse import analyse_file, resolve_processor
+from app.audio import DecodedAudio
+from app.audio_store import AudioStore, write_canonical
+from app.processor_cache import ProcessorCache
+from app.settings import settings as app_settings
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+def stereo_file(tmpdir) -> str:
+    """The fixture on one channel, and reversed on the other"""
+    sample_rate, data = wavfile.read(sample_path)
+    stereo_path = str(tmpdir / "stereo.wav")
+    wavfile.write(stereo_path, sample_rate, np.stack([data, data[::-1]], axis=1))
+    return stereo_path
+
+
+def test_canonical_audio_maps_the_decoded_channel(tmpdir):
+    source = stereo_file(tmpdir)
+    canonical = str(tmpdir / "stereo.sfopcm")
+    write_canonical(source, canonical)
+
+    for channel in (1, 2):
+        decoded = DecodedAudio.load(source, channel)
+        mapped = DecodedAudio.load(canonical, channel)
+
+        samples = mapped.samples()
+        assert isinstance(samples, np.memmap)
+        np.testing.assert_array_equal(samples, decoded.sound.data)
+        assert mapped.sample_rate == decoded.sample_rate
+        assert mapped.duration == decoded.duration
+        # so that cached results are shared with jobs reading the upload itself
+        assert mapped.content_hash() == decoded.content_hash()
+        assert mapped.sound.data.dtype == decoded.sound.data.dtype
+
+
+def test_canonical_audio_gives_the_same_results(tmpdir):
+    canonical = str(tmpdir / "sample.sfopcm")
+    write_canonical(sample_path, canonical)
+    analyses = {
+        "mfcc": {"init_args": {"sample_rate": 44100, "dither": 0}, "postprocessors": []}
+    }
+    for name, audio_file in (("decoded", sample_path), ("mapped", canonical)):
+        tmpdir.mkdir(name)
+        analyse_file(
+            audio_file,
+            "corpus/sample.wav",
+            1,
+            analyses,
+            str(tmpdir / name),
+            ".csv",
+            {},
+            ProcessorCache(resolve_processor, 0),
+        )
+
+    with open(str(tmpdir / "decoded" / "sample_mfcc.csv")) as decoded, open(
+        str(tmpdir / "mapped" / "sample_mfcc.csv")
+    ) as mapped:
+        assert decoded.read() == mapped.read()
+
+
+def test_store_converts_each_upload_once_and_keeps_to_its_budget(tmpdir):
+    client = Mock()
+    client.head_object.side_effect = lambda Bucket, Key: {"ETag": f'"{Key}-1"'}
+    downloads = []
+
+    def download(key):
+        downloads.append(key)
+        local_path = str(tmpdir / f"download-{len(downloads)}.wav")
+        shutil.copy(sample_path, local_path)
+        return local_path
+
+    # the fixture takes about 130kB once converted
+    store = AudioStore(str(tmpdir / "store"), 0.2, client, "bucket")
+
+    first = store.load("a.wav", download)
+    assert store.load("a.wav", download) == first
+    assert downloads == ["a.wav"]
+    assert (
+        Audio.load(sample_path).nsamples == DecodedAudio.load(first, 1).sound.nsamples
+    )
+
+    # the first entry is still in use, so it stays, over budget
+    second = store.load("b.wav", download)
+    assert sorted(listdir(store.store_dir)) == sorted(
+        path.basename(p) for p in (first, second)
+    )
+    # handed out twice, so released twice
+    store.release(first)
+    assert path.exists(first)
+    store.release(first)
+    assert listdir(store.store_dir) == [path.basename(second)]
+    assert store.report() == "audio store: 1 hits, 2 uploads converted"
+
+
+def test_entries_loading_on_other_threads_are_never_evicted(tmpdir):
+    """As when prefetching: an entry still uploading to the bucket must survive
+    the eviction run by another thread's load
+    """
+    client = Mock()
+    client.head_object.side_effect = lambda Bucket, Key: {"ETag": f'"{Key}-1"'}
+    client.download_file.side_effect = ClientError(
+        {"Error": {"Code": "404"}}, "GetObject"
+    )
+    client.upload_file.side_effect = lambda *args: time.sleep(0.2)
+
+    def download(key):
+        local_path = str(tmpdir / f"download-{key}.wav")
+        shutil.copy(sample_path, local_path)
+        return local_path
+
+    # nothing fits, so every entry not in use is evicted at once
+    store = AudioStore(str(tmpdir / "store"), 0, client, "bucket", "audio/")
+    with ThreadPoolExecutor(4) as pool:
+        loaded = list(pool.map(lambda key: store.load(key, download), "abcd"))
+
+    assert all(path.exists(local_path) for local_path in loaded)
+    for local_path in loaded:
+        store.release(local_path)
+    assert listdir(store.store_dir) == []
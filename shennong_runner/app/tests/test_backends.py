@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+from pytest import importorskip, raises
+from shennong import FeaturesCollection
+
+from app.analyse import Analyser
+from app.audio import DecodedAudio
+from app.backends import use_backend
+from app.tests.test_layers import hubert_settings, sample_path
+
+
+class Processor:
+    """Holds no network, as processors do until their model is loaded"""
+
+
+def test_backend_is_applied_once():
+    processor = use_backend(Processor(), "compiled")
+    assert processor._inference_backend == "compiled"
+    assert use_backend(processor, "compiled") is processor
+
+    with raises(ValueError):
+        use_backend(processor, "int8")
+    with raises(ValueError):
+        use_backend(Processor(), "fp16")
+    assert not hasattr(use_backend(Processor(), "eager"), "_inference_backend")
+
+
+def test_compiling_without_a_network_warns(caplog):
+    use_backend(Processor(), "compiled")
+    assert "no torch or keras network to compile" in caplog.text
+
+
+def test_analyser_hands_runner_args_to_the_backend():
+    settings = hubert_settings(["encoder", "2"])
+    settings["init_args"].update(inference_backend="int8", num_threads=2)
+    analyser = Analyser(DecodedAudio.load(sample_path, 1), FeaturesCollection())
+
+    with patch("app.analyse.use_backend") as use_backend_mock, patch.object(
+        analyser.threads, "limits", wraps=analyser.threads.limits
+    ) as limits_mock:
+        analyser.process("mHuBERT_147", settings)
+
+    _, backend = use_backend_mock.call_args[0]
+    assert backend == "int8"
+    limits_mock.assert_called_once_with("mHuBERT_147", 2)
+
+
+def test_int8_quantizes_linear_layers():
+    torch = importorskip("torch")
+
+    processor = Processor()
+    processor.model = torch.nn.Sequential(torch.nn.Linear(8, 8), torch.nn.ReLU())
+    x = torch.rand(4, 8)
+    expected = processor.model(x)
+
+    use_backend(processor, "int8")
+
+    assert not isinstance(processor.model[0], torch.nn.Linear)
+    assert torch.allclose(processor.model(x), expected, atol=0.05)
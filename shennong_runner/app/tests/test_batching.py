@@ -0,0 +1,141 @@
+from os import listdir, path
+import shutil
+
+import numpy as np
+from pytest import mark
+from shennong.audio import Audio
+
+from app.analyse import analyse_batch, analyse_file, resolve_processor
+from app.batching import FrameBatch, batch_files, process_batch
+from app.chunking import CHUNKABLE_PROCESSORS, frame_geometry
+from app.processor_cache import ProcessorCache
+from app.settings import settings as app_settings
+from app.tests.test_chunking import make_processor
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+def test_short_files_are_batched_up_to_the_batch_length():
+    files = [("a", 1), ("b", 2), ("c", 10), ("d", 3), ("e", 2), ("f", 1), ("g", 4)]
+    assert list(batch_files(iter(files), 5, 6)) == [
+        ["a", "b"],
+        ["c"],
+        ["d", "e", "f"],
+        ["g"],
+    ]
+    # files are never held back when batching is off
+    assert list(batch_files(iter(files), 0, 0)) == [[f] for f, _ in files]
+
+
+@mark.parametrize("snip_edges", [True, False])
+@mark.parametrize("class_key", CHUNKABLE_PROCESSORS)
+def test_batch_matches_each_file_on_its_own(class_key, snip_edges):
+    """Each file's features should be exactly those it gives when processed alone"""
+    sound = Audio.load(sample_path)
+    processor = make_processor(class_key, sound.sample_rate, snip_edges)
+    frame_length, _ = frame_geometry(processor)
+    # lengths that end mid-frame, and a file of a single frame
+    signals = [
+        sound.data[:4001],
+        sound.data[1000:19977],
+        sound.data[:frame_length],
+        sound.data,
+    ]
+
+    results = process_batch(processor, signals, sound.sample_rate)
+
+    assert processor.snip_edges == snip_edges
+    for signal, result in zip(signals, results):
+        expected = processor.process(Audio(signal, sound.sample_rate))
+        np.testing.assert_array_equal(result.data, expected.data)
+        np.testing.assert_array_equal(result.times, expected.times)
+        assert result.properties == expected.properties
+
+
+def test_batch_runs_once():
+    sound = Audio.load(sample_path)
+    processor = make_processor("mfcc", sound.sample_rate, True)
+    runs = []
+
+    def run(processor, sound):
+        runs.append(sound.nsamples)
+        return processor.process(sound)
+
+    batch = FrameBatch(
+        processor, [sound.data, sound.data[:8000]], sound.sample_rate, run
+    )
+    batch.features(1)
+    batch.features(0)
+    assert len(runs) == 1
+
+
+def settings():
+    return {
+        "mfcc": {
+            "init_args": {"sample_rate": 44100, "dither": 0},
+            "postprocessors": [],
+        },
+        "filterbank": {
+            "init_args": {"sample_rate": 44100, "dither": 0},
+            "postprocessors": ["delta"],
+        },
+    }
+
+
+def test_batched_results_match_file_results(tmpdir):
+    files = []
+    for name in ("one", "two", "three"):
+        shutil.copy(sample_path, str(tmpdir.join(f"{name}.wav")))
+        files.append((str(tmpdir.join(f"{name}.wav")), f"corpus/{name}.wav"))
+    tmpdir.mkdir("batch")
+    tmpdir.mkdir("single")
+
+    failed = analyse_batch(
+        [
+            (audio_file, file_path, str(tmpdir.join("batch")))
+            for audio_file, file_path in files
+        ],
+        1,
+        settings(),
+        ".csv",
+        {},
+        ProcessorCache(resolve_processor, 0),
+    )
+    analyse_file(
+        files[0][0],
+        files[0][1],
+        1,
+        settings(),
+        str(tmpdir.join("single")),
+        ".csv",
+        {},
+        ProcessorCache(resolve_processor, 0),
+    )
+
+    assert failed == [[], [], []]
+    assert len(listdir(str(tmpdir.join("batch")))) == 9
+    for result in listdir(str(tmpdir.join("single"))):
+        with open(str(tmpdir.join("single", result))) as single, open(
+            str(tmpdir.join("batch", result))
+        ) as batched:
+            assert batched.read() == single.read()
+
+
+def test_a_bad_file_doesnt_fail_its_batch(tmpdir):
+    shutil.copy(sample_path, str(tmpdir.join("good.wav")))
+    tmpdir.join("bad.wav").write("not audio")
+
+    failed = analyse_batch(
+        [
+            (str(tmpdir.join("good.wav")), "good.wav", str(tmpdir)),
+            (str(tmpdir.join("bad.wav")), "bad.wav", str(tmpdir)),
+        ],
+        1,
+        settings(),
+        ".csv",
+        {},
+        ProcessorCache(resolve_processor, 0),
+    )
+
+    assert failed == [[], ["mfcc", "filterbank"]]
+    assert "good_mfcc.csv" in listdir(str(tmpdir))
@@ -0,0 +1,30 @@
+from benchmarks.processors import combinations, regressions
+
+
+def test_every_processor_and_postprocessor_is_benchmarked():
+    names = [name for name, _, _ in combinations()]
+    assert "mfcc" in names and "mfcc+vad" in names
+    # required postprocessors come with every run of their processor
+    assert ("pitch_kaldi+delta", "pitch_kaldi", ["pitch_kaldi", "delta"]) in list(
+        combinations()
+    )
+    assert "pitch_kaldi+pitch_kaldi" not in names
+
+
+def test_regressions_beyond_the_threshold_fail():
+    def suite(**results):
+        return {"results": results}
+
+    baseline = suite(
+        a={"realtime_factor": 0.1, "peak_rss_mb": 100},
+        b={"realtime_factor": 0.1, "peak_rss_mb": 100},
+        gone={"realtime_factor": 0.1, "peak_rss_mb": 100},
+    )
+    current = suite(
+        a={"realtime_factor": 0.11, "peak_rss_mb": 90},
+        b={"realtime_factor": 0.1, "peak_rss_mb": 150},
+    )
+
+    found = regressions(baseline, current, 0.2)
+    assert len(found) == 1 and found[0].startswith("b peak_rss_mb")
+    assert regressions(baseline, current, 0.6) == []
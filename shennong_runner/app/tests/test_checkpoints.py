@@ -0,0 +1,137 @@
+from dataclasses import replace
+from io import BytesIO
+from os import listdir, path
+
+from botocore.exceptions import ClientError
+
+from app.analyse import JobConfig, LocalFileManager, analyse_files, resolve_processor
+from app.checkpoints import JobCheckpoint, job_key
+from app.processor_cache import ProcessorCache
+from app.settings import settings as app_settings
+
+sample = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+class Body(BytesIO):
+    def iter_chunks(self, chunk_size: int = 1024):
+        return iter(lambda: self.read(chunk_size), b"")
+
+
+class Paginator:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def paginate(self, Bucket, Prefix):
+        keys = [k for k in sorted(self.objects) if k.startswith(Prefix)]
+        # one key per page, as if there were many of them
+        return [{"Contents": [{"Key": k}]} for k in keys] or [{}]
+
+
+class FakeS3:
+    """Just what the checkpoint calls of a boto3 client, in memory"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_paginator(self, name):
+        return Paginator(self.objects)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": Body(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def upload_file(self, filename, bucket, key):
+        with open(filename, "rb") as f:
+            self.objects[key] = f.read()
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            del self.objects[item["Key"]]
+
+
+class FixtureFileManager(LocalFileManager):
+    def load(self, key):
+        return sample
+
+
+def test_job_key_ignores_the_archive_name():
+    config = {"files": ["a.wav"], "analyses": {}, "save_path": "one.zip"}
+    assert job_key(config) == job_key({**config, "save_path": "two.zip"})
+    assert job_key(config) != job_key({**config, "files": ["b.wav"]})
+
+
+def test_restarted_job_skips_finished_files(tmpdir):
+    client = FakeS3()
+    jobconfig = JobConfig(
+        analyses={
+            "spectrogram": {"init_args": {"not_an_arg": 1}, "postprocessors": []},
+            "energy": {"init_args": {"dither": 0.0}, "postprocessors": ["delta"]},
+        },
+        channel=1,
+        files=["a/first.wav", "b/second.wav"],
+        save_path="",
+        res=".csv",
+    )
+    processors = ProcessorCache(resolve_processor, 0)
+
+    # the first run dies once its first file is done
+    first_run = FixtureFileManager(str(tmpdir / "first"))
+    first_run.checkpoint = JobCheckpoint(client, "bucket", "checkpoints/job/")
+    assert next(analyse_files(first_run, jobconfig, processors)) == (
+        "a/first.wav",
+        ["spectrogram"],
+    )
+
+    checkpoint = JobCheckpoint(client, "bucket", "checkpoints/job/")
+    done = checkpoint.load()
+    assert list(done) == ["a/first.wav"]
+    assert done["a/first.wav"]["failed"] == ["spectrogram"]
+
+    second_run = FixtureFileManager(str(tmpdir / "second"))
+    second_run.checkpoint = checkpoint
+    second_run.restore(done["a/first.wav"])
+    remaining = replace(jobconfig, files=["b/second.wav"])
+    assert list(analyse_files(second_run, remaining, processors)) == [
+        ("b/second.wav", ["spectrogram"])
+    ]
+
+    whole_run = FixtureFileManager(str(tmpdir / "whole"))
+    list(analyse_files(whole_run, jobconfig, processors))
+    assert sorted(listdir(second_run.results_dir)) == sorted(
+        listdir(whole_run.results_dir)
+    )
+    for name in listdir(whole_run.results_dir):
+        with open(path.join(second_run.results_dir, name)) as resumed, open(
+            path.join(whole_run.results_dir, name)
+        ) as whole:
+            assert resumed.read() == whole.read()
+
+    checkpoint.clear()
+    assert client.objects == {}
+
+
+def test_unusable_checkpoints_restore_nothing(tmpdir):
+    client = FakeS3()
+    checkpoint = JobCheckpoint(client, "bucket", "checkpoints/job/")
+    results_dir = tmpdir.mkdir("results")
+    checkpoint.save("a.wav", str(results_dir), [])
+    manager = LocalFileManager(str(tmpdir / "fm"))
+    manager.checkpoint = checkpoint
+
+    # names that would be written outside of the results
+    escaping = {"file": "a.wav", "outputs": ["../../escaped.csv"], "failed": []}
+    assert not manager.restore(escaping)
+    assert not tmpdir.join("escaped.csv").exists()
+
+    (results_dir / "a_mfcc.csv").write("1,2\n")
+    (results_dir / "a_plp.csv").write("3,4\n")
+    checkpoint.save("a.wav", str(results_dir), [])
+    entry = checkpoint.load()["a.wav"]
+    # one of the outputs expired
+    del client.objects[checkpoint._output_key("a.wav", "a_plp.csv")]
+    assert not manager.restore(entry)
+    assert listdir(manager.results_dir) == []
@@ -0,0 +1,80 @@
+from copy import deepcopy
+from os import path
+import tracemalloc
+
+import numpy as np
+from pytest import mark
+from scipy.io import wavfile
+from shennong import FeaturesCollection
+
+from app.analyse import Analyser, resolve_processor
+from app.audio import DecodedAudio
+from app.chunking import CHUNKABLE_PROCESSORS, process_in_chunks
+from app.settings import settings as app_settings
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+def make_processor(class_key: str, sample_rate: int, snip_edges: bool):
+    # dither is random noise, which would make any two runs differ
+    return resolve_processor(
+        class_key, {"sample_rate": sample_rate, "dither": 0, "snip_edges": snip_edges}
+    )
+
+
+@mark.parametrize("snip_edges", [True, False])
+@mark.parametrize("class_key", CHUNKABLE_PROCESSORS)
+def test_chunked_matches_one_shot(class_key, snip_edges):
+    """Stitched chunks should be identical to processing the whole file, whatever the chunk size"""
+    audio = DecodedAudio.load(sample_path, 1)
+    processor = make_processor(class_key, audio.sample_rate, snip_edges)
+    expected = processor.process(audio.sound)
+
+    for chunk_frames in (1, 7, expected.data.shape[0] - 1, expected.data.shape[0] * 2):
+        result = process_in_chunks(
+            processor, audio.samples(), audio.sample_rate, chunk_frames
+        )
+        assert np.array_equal(result.data, expected.data)
+        assert np.array_equal(result.times, expected.times)
+        assert processor.snip_edges == snip_edges
+
+
+def test_analyser_chunks_long_files(monkeypatch):
+    """Files longer than CHUNK_SECONDS should be processed in chunks, from memory-mapped samples"""
+    settings = {"init_args": {"sample_rate": 16000, "dither": 0}, "postprocessors": []}
+    monkeypatch.setattr(app_settings, "CHUNK_SECONDS", 0)
+    whole = Analyser(DecodedAudio.load(sample_path, 1), FeaturesCollection())
+    whole.process("mfcc", deepcopy(settings))
+
+    monkeypatch.setattr(app_settings, "CHUNK_SECONDS", 1)
+    audio = DecodedAudio.load(sample_path, 1)
+    chunked = Analyser(audio, FeaturesCollection())
+    chunked.process("mfcc", deepcopy(settings))
+
+    assert np.array_equal(
+        chunked.collection["mfcc"].data, whole.collection["mfcc"].data
+    )
+    # the file was never decoded as a whole
+    assert audio._sound is None
+
+
+def test_chunked_memory_is_flat(tmpdir):
+    """Peak allocations should depend on the chunk size and the features, not on the length of the audio"""
+    sample_rate = 16000
+    processor = make_processor("energy", sample_rate, False)
+    peaks = []
+    for minutes in (1, 4):
+        filepath = str(tmpdir / f"{minutes}.wav")
+        wavfile.write(
+            filepath,
+            sample_rate,
+            np.random.randint(-2000, 2000, minutes * 60 * sample_rate).astype(np.int16),
+        )
+        samples = DecodedAudio.load(filepath, 1).samples()
+        tracemalloc.start()
+        features = process_in_chunks(processor, samples, sample_rate, 1000)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak - features.data.nbytes - features.times.nbytes)
+
+    assert peaks[1] < peaks[0] * 1.5
@@ -0,0 +1,145 @@
+from copy import deepcopy
+from io import BytesIO
+from os import listdir, path, utime
+import pickle
+from unittest.mock import Mock
+
+from botocore.exceptions import ClientError
+import numpy as np
+from shennong import Features, FeaturesCollection
+
+from app.analyse import Analyser
+from app.audio import DecodedAudio
+from app.feature_cache import FeatureCache, feature_key
+from app.settings import settings as app_settings
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+def make_features(nframes=10):
+    return Features(
+        np.random.rand(nframes, 3).astype(np.float32),
+        np.arange(nframes) * 0.01,
+        properties={"processor": {"name": "fake"}},
+    )
+
+
+def test_equivalent_settings_share_a_key():
+    """ Int and float arguments, and postprocessors in any order, are the same analysis """
+    key = feature_key("abc", "mfcc", {"num_ceps": 13}, ["delta", "cmvn"])
+    assert key == feature_key("abc", "mfcc", {"num_ceps": 13.0}, ["cmvn", "delta"])
+    assert key != feature_key("abd", "mfcc", {"num_ceps": 13}, ["delta", "cmvn"])
+    assert key != feature_key("abc", "mfcc", {"num_ceps": 12}, ["delta", "cmvn"])
+    assert key != feature_key("abc", "mfcc", {"num_ceps": 13}, ["delta"])
+
+
+def test_key_follows_how_the_runner_computes(monkeypatch):
+    """Results derived from the shared front end, or by an earlier runner, are kept apart"""
+    key = feature_key("abc", "mfcc", {"num_ceps": 13}, [])
+    pitch_key = feature_key("abc", "pitch_kaldi", {}, [])
+
+    monkeypatch.setattr(app_settings, "SHARED_FRONTEND", 1)
+    assert feature_key("abc", "mfcc", {"num_ceps": 13}, []) != key
+    assert feature_key("abc", "pitch_kaldi", {}, []) == pitch_key
+
+    monkeypatch.setattr(app_settings, "SHARED_FRONTEND", 0)
+    monkeypatch.setattr("app.feature_cache.COMPUTATION_VERSION", 2)
+    assert feature_key("abc", "mfcc", {"num_ceps": 13}, []) != key
+
+
+def test_content_hash_follows_content_and_channel(tmpdir):
+    copy_path = str(tmpdir / "copy.wav")
+    with open(sample_path, "rb") as src, open(copy_path, "wb") as dst:
+        dst.write(src.read())
+
+    digest = DecodedAudio.load(sample_path, 1).content_hash()
+    assert DecodedAudio.load(copy_path, 1).content_hash() == digest
+    assert DecodedAudio.load(sample_path, 2).content_hash() != digest
+
+
+def test_disk_tier_evicts_least_recently_used(tmpdir):
+    features = make_features(1000)
+    cache = FeatureCache(str(tmpdir), 1)
+    cache.put("a", {"mfcc": features})
+    # room for two entries
+    cache.budget_mb = 2.5 * cache.size_mb
+    cache.put("b", {"mfcc": features})
+    # "a" is read again, which makes "b" the least recently used entry
+    utime(path.join(str(tmpdir), "a"), (0, 0))
+    utime(path.join(str(tmpdir), "b"), (0, 0))
+    assert cache.get("a") is not None
+    cache.put("c", {"mfcc": features})
+
+    assert sorted(listdir(str(tmpdir))) == ["a", "c"]
+    assert cache.get("b") is None
+    assert np.array_equal(cache.get("c")["mfcc"].data, features.data)
+    assert (cache.local_hits, cache.misses) == (2, 1)
+
+
+def test_s3_tier_fills_the_disk_tier(tmpdir):
+    stored = {}
+    client = Mock()
+    client.put_object.side_effect = lambda Bucket, Key, Body: stored.update({Key: Body})
+
+    def get_object(Bucket, Key):
+        if Key not in stored:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": BytesIO(stored[Key])}
+
+    client.get_object.side_effect = get_object
+
+    features = make_features()
+    FeatureCache(str(tmpdir / "node-a"), 0, client, "bucket", "cache/").put(
+        "key", {"mfcc": features}
+    )
+    assert list(stored) == ["cache/key"]
+
+    cache = FeatureCache(str(tmpdir / "node-b"), 10, client, "bucket", "cache/")
+    assert cache.get("missing") is None
+    assert np.array_equal(cache.get("key")["mfcc"].times, features.times)
+    assert cache.get("key") is not None
+    assert (cache.local_hits, cache.remote_hits, cache.misses) == (1, 1, 1)
+    assert "67% hit ratio" in cache.report()
+
+
+def test_entries_are_never_unpickled(tmpdir):
+    features = make_features()
+    cache = FeatureCache(str(tmpdir), 10)
+    cache.put("key", {"mfcc": features})
+    cached = cache.get("key")["mfcc"]
+    assert np.array_equal(cached.data, features.data)
+    assert cached.properties == features.properties
+
+    class Payload:
+        def __reduce__(self):
+            return (AssertionError, ("unpickled",))
+
+    with open(path.join(str(tmpdir), "planted"), "wb") as f:
+        f.write(pickle.dumps({"mfcc": (Payload(), features.times, {})}))
+    assert cache.get("planted") is None
+    assert cache.misses == 1
+
+
+def test_analyser_skips_cached_analyses(tmpdir):
+    settings = {
+        "init_args": {"sample_rate": 16000, "dither": 0.0},
+        "postprocessors": ["delta"],
+    }
+    cache = FeatureCache(str(tmpdir), 10)
+
+    first = Analyser(
+        DecodedAudio.load(sample_path, 1), FeaturesCollection(), features=cache
+    )
+    first.process("energy", deepcopy(settings))
+
+    second = Analyser(
+        DecodedAudio.load(sample_path, 1), FeaturesCollection(), features=cache
+    )
+    second.run_processor = Mock(side_effect=AssertionError("should not run"))
+    second.process("energy", deepcopy(settings))
+
+    assert sorted(second.collection) == ["delta", "energy"]
+    assert np.array_equal(
+        second.collection["delta"].data, first.collection["delta"].data
+    )
+    assert (cache.local_hits, cache.misses) == (1, 1)
@@ -0,0 +1,80 @@
+from copy import deepcopy
+from os import path
+
+import numpy as np
+from pytest import mark
+from shennong import FeaturesCollection
+
+from app.analyse import Analyser, analysis_framings, resolve_processor
+from app.audio import DecodedAudio
+from app.frontend import DERIVATIONS, SharedFrontEnd
+from app.settings import settings as app_settings
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+@mark.parametrize(
+    "options",
+    [
+        {},
+        {"snip_edges": False, "window_type": "hamming"},
+        {"raw_energy": False, "energy_floor": 1.0, "round_to_power_of_two": False},
+        {"htk_compat": True, "use_energy": False, "preemph_coeff": 0.0},
+    ],
+)
+@mark.parametrize("class_key", list(DERIVATIONS))
+def test_shared_front_end_matches_processors(class_key, options):
+    """Features derived from the shared spectrum should match the processors' own, to float32 precision"""
+    audio = DecodedAudio.load(sample_path, 1)
+    params = resolve_processor(class_key, {}).get_params()
+    # dither is random noise, which would make any two runs differ
+    init_args = {
+        k: v
+        for k, v in {**options, "sample_rate": audio.sample_rate, "dither": 0}.items()
+        if k in params
+    }
+    processor = resolve_processor(class_key, init_args)
+    expected = processor.process(audio.sound)
+
+    frontend = SharedFrontEnd([None])
+    result = frontend.process(class_key, processor, audio.sound)
+
+    assert result.data.shape == expected.data.shape
+    np.testing.assert_allclose(result.data, expected.data, rtol=1e-5, atol=1e-4)
+    np.testing.assert_allclose(result.times, expected.times)
+
+
+def test_front_end_is_shared_by_compatible_analyses(monkeypatch):
+    """Once enabled, every analysis the front end can derive goes through it, whatever the
+    others are, analyses sharing a framing sharing its spectrum
+    """
+    init_args = {"sample_rate": 44100, "dither": 0}
+    analyses = {
+        key: {"init_args": dict(init_args), "postprocessors": []}
+        for key in ("mfcc", "filterbank", "energy", "pitch_kaldi")
+    }
+    analyses["energy"]["init_args"]["frame_shift"] = 0.02
+    processors = {
+        key: resolve_processor(key, analyses[key]["init_args"]) for key in analyses
+    }
+
+    # off by default, so that results are shennong's own
+    frontend = SharedFrontEnd(analysis_framings(analyses))
+    assert not any(frontend.handles(key, p) for key, p in processors.items())
+
+    monkeypatch.setattr(app_settings, "SHARED_FRONTEND", 1)
+    frontend = SharedFrontEnd(analysis_framings(analyses))
+    audio = DecodedAudio.load(sample_path, 1)
+    for key, handled in (
+        ("mfcc", True),
+        ("filterbank", True),
+        ("energy", True),
+        ("pitch_kaldi", False),
+    ):
+        assert frontend.handles(key, processors[key]) == handled
+    for key in ("mfcc", "filterbank"):
+        analyser = Analyser(audio, FeaturesCollection(), frontend=frontend)
+        analyser.process(key, deepcopy(analyses[key]))
+
+    # both analyses were derived from a single spectrum
+    assert len(frontend._spectra) == 1
@@ -0,0 +1,165 @@
+from os import listdir, path
+
+import numpy as np
+from pytest import importorskip, raises
+from shennong import Features, FeaturesCollection
+from shennong.audio import Audio
+
+from app.analyse import Analyser, analyse_file, resolve_processor
+from app.audio import DecodedAudio
+from app.feature_cache import FeatureCache, feature_key
+from app.layers import MultiLayerProcessor, layer_list, shared_forward_pass
+from app.processor_cache import ProcessorCache
+from app.settings import settings as app_settings
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+layers = [["encoder", "6"], ["encoder", "9"], ["encoder", "12"]]
+
+
+def hubert_settings(layer_info):
+    return {
+        "init_args": {"layer_info": layer_info, "window_length": 0.0},
+        "postprocessors": ["delta"],
+    }
+
+
+def test_layer_info_takes_a_pair_or_a_list_of_pairs():
+    assert layer_list(("encoder", "6")) == [("encoder", "6")]
+    assert layer_list(["encoder", "6"]) == [("encoder", "6")]
+    assert layer_list(layers) == [("encoder", "6"), ("encoder", "9"), ("encoder", "12")]
+
+
+def test_layers_come_from_one_model_load(tmpdir):
+    """Each layer should match its own single-layer analysis, the model being built once"""
+    processors = ProcessorCache(resolve_processor, 4096)
+    cache = FeatureCache(str(tmpdir), 100)
+    audio = DecodedAudio.load(sample_path, 1)
+    analyser = Analyser(audio, FeaturesCollection(), processors, features=cache)
+    results = analyser.analyse("mHuBERT_147", hubert_settings(layers))
+
+    assert processors.misses == 1
+    assert list(results) == [
+        "mHuBERT_147_encoder_6",
+        "mHuBERT_147_encoder_9",
+        "mHuBERT_147_encoder_12",
+    ]
+    for layer, (name, collection) in zip(layers, results.items()):
+        assert sorted(collection) == ["delta", name]
+
+        single = Analyser(audio, FeaturesCollection())
+        single.process("mHuBERT_147", hubert_settings(layer))
+        np.testing.assert_array_equal(
+            collection[name].data, single.collection["mHuBERT_147"].data
+        )
+
+        # cached as the layer's own analysis would be
+        key = feature_key(
+            audio.content_hash(),
+            "mHuBERT_147",
+            hubert_settings(layer)["init_args"],
+            ["delta"],
+        )
+        np.testing.assert_array_equal(
+            cache.get(key)["mHuBERT_147"].data, collection[name].data
+        )
+
+
+def test_one_result_file_per_layer(tmpdir):
+    analyse_file(
+        sample_path,
+        "corpus/sample.wav",
+        1,
+        {"mHuBERT_147": hubert_settings(layers[:2])},
+        str(tmpdir),
+        ".csv",
+        {},
+        ProcessorCache(resolve_processor, 4096),
+    )
+    assert sorted(listdir(str(tmpdir))) == [
+        "sample_mHuBERT_147_encoder_6.csv",
+        "sample_mHuBERT_147_encoder_6_delta.csv",
+        "sample_mHuBERT_147_encoder_9.csv",
+        "sample_mHuBERT_147_encoder_9_delta.csv",
+    ]
+
+
+def test_layers_must_share_frames():
+    class Processor:
+        layer_info = ("encoder", "1")
+
+        def set_params(self, layer_info):
+            self.layer_info = layer_info
+
+        def process(self, signal):
+            nframes = 10 if self.layer_info[0] == "encoder" else 50
+            return Features(np.zeros((nframes, 2)), np.arange(nframes) * 0.02)
+
+    processor = Processor()
+    with raises(ValueError):
+        MultiLayerProcessor(
+            processor, [("convolutional", "1"), ("encoder", "1")]
+        ).process(Audio(np.zeros(16000), 16000))
+    assert processor.layer_info == ("encoder", "1")
+
+
+def network_type(torch):
+    class Network(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.layers = torch.nn.ModuleList([torch.nn.Linear(4, 4) for _ in range(3)])
+            self.calls = 0
+
+        def forward(self, x):
+            self.calls += 1
+            hidden_states = [x]
+            for layer in self.layers:
+                hidden_states.append(layer(hidden_states[-1]))
+            return hidden_states
+
+    return Network
+
+
+def test_forward_pass_runs_once_per_input():
+    torch = importorskip("torch")
+    Network = network_type(torch)
+
+    class Processor:
+        def __init__(self):
+            self.model = Network()
+
+    processor = Processor()
+    x = torch.rand(2, 4)
+    with shared_forward_pass(processor):
+        first = processor.model(x)[1]
+        last = processor.model(x.clone())[3]
+        processor.model(torch.rand(2, 4))
+    assert processor.model.calls == 2
+    assert torch.equal(first, Network.forward(processor.model, x)[1])
+    assert torch.equal(last, processor.model(x)[3])
+    # outside of the block, every call runs the network
+    assert processor.model.calls == 4
+
+
+def test_networks_held_further_down_are_shared(caplog):
+    torch = importorskip("torch")
+
+    class Extractor:
+        def __init__(self):
+            self.model = network_type(torch)()
+
+    class Processor:
+        def __init__(self):
+            self.extractor = Extractor()
+
+    processor = Processor()
+    x = torch.rand(2, 4)
+    with shared_forward_pass(processor):
+        processor.extractor.model(x)
+        processor.extractor.model(x)
+    assert processor.extractor.model.calls == 1
+    assert not caplog.text
+
+    with shared_forward_pass(Processor.__new__(Processor)):
+        pass
+    assert "no torch network found on Processor" in caplog.text
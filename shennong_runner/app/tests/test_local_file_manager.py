@@ -1,4 +1,8 @@
-from app.analyse import LocalFileManager
+from os import path
+import threading
+from unittest.mock import patch, Mock
+
+from app.analyse import LocalFileManager, S3FileManager
 
 
 def test_tmp_file_paths(tmpdir):
@@ -9,3 +13,50 @@ def test_tmp_file_paths(tmpdir):
     assert str(tmp_path) in fm.results_dir
     assert "sfo-results" in fm.results_dir
     assert str(tmp_path) in fm.tmp_download_dir
+
+
+def test_discard_only_removes_downloads(tmpdir):
+    fm = LocalFileManager(tmpdir / "fm-test")
+    download = path.join(fm.tmp_download_dir, "a.wav")
+    elsewhere = str(tmpdir / "b.wav")
+    for p in (download, elsewhere):
+        open(p, "w").close()
+
+    fm.discard(download)
+    fm.discard(elsewhere)
+
+    assert not path.exists(download)
+    assert path.exists(elsewhere)
+
+
+@patch("app.analyse.boto3")
+def test_prefetch_yields_in_order_and_respects_scratch_space(boto_mock, tmpdir):
+    """Downloads should run ahead of the consumer, but never beyond what the disk can hold"""
+    with patch("app.analyse.tempfile.gettempdir", return_value=str(tmpdir)):
+        fm = S3FileManager("bucket")
+
+    sizes = {"a.wav": 10, "b.wav": 10, "c.wav": 50, "d.wav": 10}
+    started = []
+    lock = threading.Lock()
+
+    def download_file(bucket, key, save_path):
+        with lock:
+            started.append(key)
+        open(save_path, "w").close()
+
+    fm.client = Mock(
+        head_object=lambda Bucket, Key: {"ContentLength": sizes[Key]},
+        download_file=download_file,
+    )
+    fm.scratch_space = lambda: 40
+
+    with patch("app.analyse.app_settings", PREFETCH_DEPTH=3, SCRATCH_RESERVE_MB=0):
+        fetched = fm.prefetch(list(sizes))
+        key, local_path = next(fetched)
+        assert key == "a.wav"
+        assert path.basename(local_path).endswith("-a.wav")
+        # c.wav can't be queued behind b.wav, so it waits for a.wav to be consumed
+        assert "c.wav" not in started
+        assert [k for k, _ in fetched] == ["b.wav", "c.wav", "d.wav"]
+
+    assert sorted(started) == sorted(sizes)
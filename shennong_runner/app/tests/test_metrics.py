@@ -0,0 +1,104 @@
+import json
+from os import path
+import shutil
+
+from pytest import skip
+
+from app.analyse import analyse_batch, resolve_processor
+from app.metrics import FileMetrics, job_summary, merge
+from app.processor_cache import ProcessorCache
+from app.settings import settings as app_settings
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+def test_stages_add_up_and_writes_are_counted(tmpdir):
+    metrics = FileMetrics("a.wav")
+    with metrics.timed("mfcc", "compute"):
+        pass
+    with metrics.timed("mfcc", "compute"):
+        pass
+    with metrics.opener("mfcc")(str(tmpdir.join("out.csv")), "w") as f:
+        f.write("1,2\n")
+    metrics.cached("filterbank")
+
+    record = metrics.record(2.0, 0.5)
+
+    assert list(record["analyses"]["mfcc"]["seconds"]) == ["compute"]
+    assert record["analyses"]["mfcc"]["output_bytes"] == 4
+    assert record["analyses"]["filterbank"]["cached"]
+    assert record["realtime_factor"] == record["seconds"] / 2.0
+    json.dumps(record)
+
+
+def test_split_records_merge_into_one():
+    first = FileMetrics("a.wav")
+    with first.timed("mfcc", "compute"):
+        pass
+    second = FileMetrics("a.wav")
+    with second.timed("hubert", "compute"):
+        pass
+
+    records = [first.record(4.0, 0.1), second.record(4.0, 0.2)]
+    # tasks running side by side take the wall time of the longest
+    records[0].update(started=100.0, finished=103.0, seconds=3.0)
+    records[1].update(started=101.0, finished=103.5, seconds=2.5)
+    merged = merge(records)
+
+    assert set(merged["analyses"]) == {"mfcc", "hubert"}
+    assert merged["seconds"] == 3.5
+    assert merged["task_seconds"] == 5.5
+    assert merged["realtime_factor"] == 3.5 / 4.0
+    assert merged["decode_seconds"] == 0.1 + 0.2
+    assert merged["peak_rss_mb"] == max(r["peak_rss_mb"] for r in records)
+
+    summary = job_summary([merged], 2.0, 1)
+    assert summary["files"] == 1
+    assert summary["realtime_factor"] == 0.5
+
+
+def test_peak_memory_is_that_of_the_file():
+    if not path.exists("/proc/self/clear_refs"):
+        skip("only linux lets a process reset its peak memory")
+    first = FileMetrics("a.wav")
+    allocated = b"x" * 200 * 1024 ** 2
+    first_record = first.record(1.0, 0.0)
+    del allocated
+
+    second_record = FileMetrics("b.wav").record(1.0, 0.0)
+
+    assert second_record["peak_rss_mb"] < first_record["peak_rss_mb"] - 150
+    assert job_summary([first_record, second_record], 2.0, 1)["peak_rss_mb"] >= (
+        first_record["peak_rss_mb"]
+    )
+
+
+def test_batch_records_each_stage(tmpdir):
+    shutil.copy(sample_path, str(tmpdir.join("a.wav")))
+    records = []
+
+    analyse_batch(
+        [(str(tmpdir.join("a.wav")), "corpus/a.wav", str(tmpdir))],
+        1,
+        {
+            "mfcc": {
+                "init_args": {"sample_rate": 44100, "dither": 0},
+                "postprocessors": ["delta"],
+            }
+        },
+        ".csv",
+        {},
+        ProcessorCache(resolve_processor, 0),
+        metrics=records,
+    )
+
+    (record,) = records
+    assert record["file"] == "corpus/a.wav"
+    assert record["decode_seconds"] > 0
+    assert 1.5 < record["audio_seconds"] < 1.52
+    mfcc = record["analyses"]["mfcc"]
+    assert set(mfcc["seconds"]) == {"compute", "delta", "save"}
+    outputs = ("a_mfcc.csv", "a_mfcc_delta.csv")
+    assert mfcc["output_bytes"] == sum(
+        path.getsize(str(tmpdir.join(name))) for name in outputs
+    )
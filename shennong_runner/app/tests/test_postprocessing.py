@@ -0,0 +1,64 @@
+from copy import deepcopy
+from os import path
+from unittest.mock import Mock
+
+import numpy as np
+from shennong import Features, FeaturesCollection
+
+from app.analyse import Analyser, resolve_postprocessor
+from app.audio import DecodedAudio
+from app.postprocessing import PostprocessorGraph, align
+from app.settings import settings as app_settings
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+def test_align_takes_the_nearest_frame():
+    source = Features(np.arange(10)[:, None], np.arange(10) * 0.01 + 0.0125)
+    # frames twice as long, and given as (start, stop) pairs
+    times = np.stack([np.arange(5) * 0.02, np.arange(5) * 0.02 + 0.025], axis=1)
+    aligned = align(source, times)
+
+    assert np.array_equal(aligned.times, times)
+    assert aligned.data[:, 0].tolist() == [0, 2, 4, 6, 8]
+
+
+def test_vad_is_computed_once_per_file():
+    energy = Mock(return_value=Features(np.arange(10.0)[:, None], np.arange(10) * 0.01))
+    vad = Mock(process=Mock(side_effect=lambda f: f))
+    delta = Mock(process=Mock(side_effect=lambda f: f))
+    resolve = Mock(
+        side_effect=lambda key, features=None: vad if key == "vad" else delta
+    )
+    graph = PostprocessorGraph(resolve)
+
+    mfcc = Features(np.zeros((10, 13)), np.arange(10) * 0.01)
+    hubert = Features(np.zeros((5, 1024)), np.arange(5) * 0.02)
+    for features in (mfcc, hubert, hubert):
+        graph.process("vad", features, energy)
+        graph.process("delta", features, energy)
+
+    assert energy.call_count == 1
+    assert vad.process.call_count == 1
+    # other postprocessors run on each analysis, keeping nothing between them
+    assert delta.process.call_count == 3
+    assert graph.process("vad", hubert, energy).data[:, 0].tolist() == [0, 2, 4, 6, 8]
+
+
+def test_analyses_share_voice_activity():
+    settings = {
+        "init_args": {"sample_rate": 16000, "dither": 0.0},
+        "postprocessors": ["vad"],
+    }
+    audio = DecodedAudio.load(sample_path, 1)
+    graph = PostprocessorGraph(resolve_postprocessor)
+    energies = []
+
+    for key in ("mfcc", "filterbank"):
+        analyser = Analyser(audio, FeaturesCollection(), graph=graph)
+        energy = analyser.energy
+        analyser.energy = lambda: energies.append(1) or energy()
+        analyser.process(key, deepcopy(settings))
+        assert analyser.collection["vad"].nframes == analyser.collection[key].nframes
+
+    assert len(energies) == 1
@@ -0,0 +1,52 @@
+from unittest.mock import Mock
+
+from app.processor_cache import ProcessorCache, freeze
+
+
+def make_cache(budget_mb: int):
+    factory = Mock(side_effect=lambda key, args: Mock(key=key, args=args))
+    return ProcessorCache(factory, budget_mb), factory
+
+
+def test_processor_is_built_once_per_key():
+    """ The same processor and init args should only be built on the first request """
+    cache, factory = make_cache(4096)
+    args = {"sample_rate": 16000, "layer_info": ["encoder", "1"]}
+
+    first = cache.get("energy", args)
+    second = cache.get("energy", dict(args))
+    other = cache.get("energy", {**args, "sample_rate": 8000})
+
+    assert first is second
+    assert other is not first
+    assert factory.call_count == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_model_is_evicted_over_budget():
+    """ Keeping a new model that would exceed the budget should evict the oldest one """
+    cache, factory = make_cache(1750)
+
+    hubert = cache.get("hubert_large_ls960_ft", {})
+    cache.get("mHuBERT_147", {})
+    cache.get("hubert_large_ls960_ft", {})
+    # crepe does not fit next to both huberts, and mHuBERT is now the least recently used
+    cache.get("pitch_crepe", {})
+
+    assert cache.evictions == 1
+    assert cache.get("hubert_large_ls960_ft", {}) is hubert
+    cache.get("mHuBERT_147", {})
+    assert factory.call_count == 4
+    assert cache.size_mb <= 1750
+
+
+def test_processor_larger_than_budget_is_not_kept():
+    cache, factory = make_cache(100)
+    cache.get("hubert_large_ls960_ft", {})
+    cache.get("hubert_large_ls960_ft", {})
+    assert factory.call_count == 2
+    assert len(cache) == 0
+
+
+def test_freeze_is_order_independent():
+    assert freeze({"a": 1, "b": [1, 2]}) == freeze({"b": (1, 2), "a": 1})
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+from app import registry
+from app.analyse import resolve_postprocessor
+from app.settings import settings as app_settings
+
+
+def test_runner_starts_without_processor_modules():
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, app.analyse; print(' '.join(sys.modules))",
+        ],
+        cwd=app_settings.PROJECT_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+
+    assert "app.registry" in loaded
+    assert not [
+        module
+        for module in loaded
+        if module.startswith(("shennong.processor", "shennong.postprocessor", "pandas"))
+    ]
+
+
+def test_classes_come_from_the_module_the_schema_names():
+    # kaldi's pitch postprocessor lives alongside its processor
+    cls = registry.resolve_class("postprocessors", "pitch_kaldi")
+    assert cls.__module__ == "shennong.processor.pitch_kaldi"
+    assert registry.resolve_class("postprocessors", "pitch_kaldi") is cls
+    assert registry.IMPORTED_FIRST in sys.modules
+
+    assert type(resolve_postprocessor("delta")).__name__ == "DeltaPostProcessor"
+
+
+def test_prewarm_skips_unknown_processors():
+    registry.prewarm(["not_a_processor", "energy"])
+    assert ("shennong.postprocessor.vad", "VadPostProcessor") in registry._classes
@@ -1,12 +1,22 @@
 from json import loads
-from os import path
+from os import listdir, path
 
 from shennong import FeaturesCollection
-from shennong.processor.pitch_crepe import CrepePitchPostProcessor
+from shennong.audio import Audio
+from shennong.processor.hubert import HubertProcessor
+from shennong.processor.pitch_crepe import CrepePitchProcessor, CrepePitchPostProcessor
 
-from app.analyse import Analyser
+from app.analyse import Analyser, save_results
+from app.audio import DecodedAudio
 from app.settings import settings as app_settings
-from app.parse_shennong import build_processor_spec
+from app.parse_shennong import build_processor_spec, runner_args
+
+sample_path = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav")
+
+
+def load_schema():
+    with open(path.join(app_settings.PROJECT_ROOT, "processor-schema.json")) as f:
+        return loads(f.read())
 
 
 def test_can_provide_default_overrides():
@@ -23,19 +33,38 @@ def test_can_provide_default_overrides():
     assert result_val == arg_val
 
 
+def test_runner_args_are_flagged():
+    """Test that arguments handled by the runner are appended to the processor's and flagged as such"""
+    spec = build_processor_spec(
+        "pitch_crepe", CrepePitchProcessor, runner_args=runner_args["pitch_crepe"]
+    ).toschema()
+    flagged = {arg["name"]: arg for arg in spec["init_args"] if arg.get("runner")}
+    # crepe's model can't be converted, so it has no inference backend to pick
+    assert list(flagged) == ["window_length", "window_overlap", "num_threads"]
+    assert flagged["window_length"]["type"] == "number"
+    assert flagged["window_overlap"]["type"] == "number"
+    assert flagged["num_threads"]["type"] == "integer"
+
+
+def test_layer_info_takes_several_layers():
+    """Test that hubert's layers are flagged as a multiple choice, in the generated and shipped schemas"""
+    spec = build_processor_spec("mHuBERT_147", HubertProcessor).toschema()
+    layer_info = next(arg for arg in spec["init_args"] if arg["name"] == "layer_info")
+    assert layer_info["multiple"] is True
+
+    for key in ["hubert_large_ls960_ft", "mHuBERT_147"]:
+        shipped = load_schema()["processors"][key]["init_args"]
+        assert next(arg for arg in shipped if arg["name"] == "layer_info")["multiple"]
+
+
 def test_can_process_simple_file_with_default_args():
     """Build a job using default args and all entries in the schema and run against a small test file"""
 
-    with open(path.join(app_settings.PROJECT_ROOT, "processor-schema.json")) as f:
-        schema = loads(f.read())
+    schema = load_schema()
 
     collection = FeaturesCollection()
 
-    analyser = Analyser(
-        path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/mono-sample.wav"),
-        1,
-        collection,
-    )
+    analyser = Analyser(DecodedAudio.load(sample_path, 1), collection)
 
     for k, processor in schema["processors"].items():
         init_args = {arg["name"]: arg["default"] for arg in processor["init_args"]}
@@ -45,3 +74,41 @@ def test_can_process_simple_file_with_default_args():
 
     # if the loop ran fine, we'll declare victory
     assert True
+
+
+def test_shared_decoding_is_byte_identical(tmpdir):
+    """Results computed from audio decoded once per file should match those computed from a fresh decode"""
+
+    class FreshDecodedAudio(DecodedAudio):
+        """Decodes again for every processor and hands it the file's own sample rate,
+        as the runner used to, leaving any resampling to the processor
+        """
+
+        def for_processor(self, class_key):
+            return DecodedAudio.load(sample_path, 1).sound
+
+    schema = load_schema()
+    shared = DecodedAudio.load(sample_path, 1)
+    fresh = FreshDecodedAudio(Audio.load(sample_path))
+
+    for audio, outdir in ((shared, tmpdir / "shared"), (fresh, tmpdir / "fresh")):
+        outdir.mkdir()
+        for k, processor in schema["processors"].items():
+            init_args = {arg["name"]: arg["default"] for arg in processor["init_args"]}
+            # dither is random noise, which would make any two runs differ
+            if "dither" in init_args:
+                init_args["dither"] = 0
+            settings = {
+                "postprocessors": processor["valid_postprocessors"],
+                "init_args": init_args,
+            }
+            analyser = Analyser(audio, FeaturesCollection())
+            analyser.process(k, settings)
+            save_results(k, analyser.collection, str(outdir / "sample"), ".csv")
+
+    filenames = sorted(listdir(tmpdir / "shared"))
+    assert filenames == sorted(listdir(tmpdir / "fresh"))
+    for filename in filenames:
+        assert (tmpdir / "shared" / filename).read_binary() == (
+            tmpdir / "fresh" / filename
+        ).read_binary()
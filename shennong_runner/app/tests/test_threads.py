@@ -0,0 +1,64 @@
+import sys
+from unittest.mock import Mock, patch
+
+from pytest import importorskip
+
+from app.threads import ThreadPolicy, set_framework_threads
+
+
+def test_networks_get_the_budget_and_the_rest_one_thread():
+    policy = ThreadPolicy(8)
+    assert policy.intra_op("mHuBERT_147") == 8
+    assert policy.intra_op("pitch_crepe") == 8
+    assert policy.intra_op("mfcc") == 1
+
+
+def test_job_and_analysis_settings_override_the_defaults():
+    policy = ThreadPolicy(8, {"mfcc": 2, "default": 4})
+    assert policy.intra_op("mfcc") == 2
+    assert policy.intra_op("mHuBERT_147") == 4
+    # an analysis' own num_threads comes first
+    assert policy.intra_op("mfcc", 3) == 3
+    # but never beyond the process' share of the cores
+    assert policy.intra_op("mfcc", 16) == 8
+
+
+def test_limits_size_torch_pools():
+    torch = importorskip("torch")
+
+    with ThreadPolicy(2).limits("mHuBERT_147"):
+        assert torch.get_num_threads() == 2
+    with ThreadPolicy(2).limits("mfcc"):
+        assert torch.get_num_threads() == 1
+
+
+def test_started_tensorflow_is_warned_about_once(caplog):
+    tensorflow = Mock()
+    threading = tensorflow.config.threading
+    threading.get_intra_op_parallelism_threads.return_value = 0
+    threading.get_inter_op_parallelism_threads.return_value = 1
+    # as once its runtime has started
+    threading.set_intra_op_parallelism_threads.side_effect = RuntimeError
+
+    with patch.dict(sys.modules, {"tensorflow": tensorflow}):
+        for _ in range(3):
+            set_framework_threads(2, 1)
+
+    assert caplog.text.count("tensorflow runs intra-op work on all threads") == 1
+    assert threading.set_intra_op_parallelism_threads.call_count == 3
+
+
+def test_limits_cap_blas_within_the_block():
+    threadpoolctl = importorskip("threadpoolctl")
+
+    def blas_threads():
+        return max(
+            pool["num_threads"]
+            for pool in threadpoolctl.threadpool_info()
+            if pool["user_api"] == "blas"
+        )
+
+    before = blas_threads()
+    with ThreadPolicy(4).limits("mfcc"):
+        assert blas_threads() == 1
+    assert blas_threads() == before
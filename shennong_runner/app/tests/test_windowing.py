@@ -0,0 +1,76 @@
+import numpy as np
+from pytest import raises
+from shennong import Features
+from shennong.audio import Audio
+
+from app.analyse import split_runner_args
+from app.windowing import process_in_windows
+
+
+class ConvProcessor:
+    """Stands in for a model whose frames only see their own samples, like hubert's
+    convolutional layers, so that windowed results can be compared exactly
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def process(self, signal):
+        self.calls.append(signal.nsamples)
+        nframes = (signal.nsamples - 400) // 320 + 1
+        frames = np.stack(
+            [signal.data[i * 320 : i * 320 + 400] for i in range(nframes)]
+        )
+        times = np.arange(nframes)[:, None] * 0.02 + np.array([0, 0.025])
+        return Features(frames.mean(axis=1, keepdims=True), times)
+
+
+def test_windows_are_stitched_frame_aligned():
+    """Stitched windows should give the same frames, at the same times, as the whole file"""
+    sound = Audio(np.random.rand(16000 * 25), 16000)
+    expected = ConvProcessor().process(sound)
+
+    processor = ConvProcessor()
+    result = process_in_windows(processor, sound, 0.02, 4.0, 1.0)
+
+    # every window but the last one is the same length
+    assert len(set(processor.calls[:-1])) == 1 and len(processor.calls) > 5
+    np.testing.assert_array_equal(result.data, expected.data)
+    np.testing.assert_allclose(result.times, expected.times)
+
+
+def test_windows_without_overlap_lose_no_frames():
+    """Frames spanning more than a hop leave each window a frame short of its length,
+    which the next window has to give instead
+    """
+    sound = Audio(np.random.rand(16000 * 25), 16000)
+    expected = ConvProcessor().process(sound)
+
+    result = process_in_windows(ConvProcessor(), sound, 0.02, 4.0, 0.0)
+
+    assert result.nframes == expected.nframes
+    np.testing.assert_array_equal(result.data, expected.data)
+    np.testing.assert_allclose(result.times, expected.times)
+
+
+def test_overlap_must_be_shorter_than_window():
+    with raises(ValueError):
+        process_in_windows(
+            ConvProcessor(), Audio(np.random.rand(16000 * 5), 16000), 0.02, 1.0, 1.0
+        )
+
+
+def test_runner_args_are_split_from_processor_args():
+    """Runner arguments never reach the processor, and default to the schema's values"""
+    init_args, runner_args = split_runner_args(
+        "mHuBERT_147", {"layer_info": ("encoder", "1"), "window_length": 30.0}
+    )
+    assert init_args == {"layer_info": ("encoder", "1")}
+    assert runner_args == {
+        "window_length": 30.0,
+        "window_overlap": 5.0,
+        "inference_backend": "eager",
+        "num_threads": 0,
+    }
+
+    assert split_runner_args("mfcc", {"num_ceps": 13}) == ({"num_ceps": 13}, {})
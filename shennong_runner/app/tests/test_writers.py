@@ -0,0 +1,123 @@
+from unittest.mock import Mock
+
+import numpy as np
+import pandas as pd
+from pytest import mark
+
+from app.analyse import save_result
+from app import writers
+
+
+def make_result(nframes: int = 10, ndims: int = 3, data: np.ndarray = None):
+    times = np.stack(
+        (np.arange(nframes) * 0.01, np.arange(nframes) * 0.01 + 0.025), axis=1
+    )
+    if data is None:
+        data = np.random.rand(nframes, ndims).astype(np.float32)
+    return Mock(_to_dict=lambda with_properties: {"times": times, "data": data})
+
+
+def pandas_csv(result, columns):
+    """The csv save_result used to write, through a float64 dataframe"""
+    times, data = result._to_dict(False)["times"], result._to_dict(False)["data"]
+    df = pd.DataFrame(np.hstack((times, data)))
+    df.columns = ["time_start", "time_end"] + columns
+    return df.to_csv(index=False)
+
+
+def test_csv_matches_pandas(tmpdir, monkeypatch):
+    """The streaming csv writer should write exactly what pandas did, across block boundaries and missing values"""
+    monkeypatch.setattr(writers, "CSV_BLOCK_CELLS", 20)
+    data = np.random.rand(10, 3).astype(np.float32)
+    data[5, 1] = np.nan
+    data[0, 0] = np.inf
+    data[1, 2] = 1
+    result = make_result(data=data)
+    save_result(result, str(tmpdir / "sample"), ".csv", ["a", "b", "c"])
+
+    with open(str(tmpdir / "sample.csv")) as f:
+        assert f.read() == pandas_csv(result, ["a", "b", "c"])
+
+
+def test_csv_float_precision(tmpdir):
+    """Values should be rounded to the requested number of significant digits"""
+    result = make_result(data=np.array([[1 / 3]] * 10))
+    save_result(
+        result,
+        str(tmpdir / "sample"),
+        ".csv",
+        ["a"],
+        write_options={"float_precision": 4},
+    )
+    df = pd.read_csv(str(tmpdir / "sample.csv"), dtype=str)
+
+    assert (df["a"] == "0.3333").all()
+
+
+@mark.parametrize(
+    "res_type,compression,reader",
+    [
+        (".parquet", None, pd.read_parquet),
+        (".parquet", "gzip", pd.read_parquet),
+        (".parquet", "none", pd.read_parquet),
+        (".feather", None, pd.read_feather),
+        (".feather", "zstd", pd.read_feather),
+        (".feather", "none", pd.read_feather),
+    ],
+)
+def test_columnar_results_round_trip(tmpdir, res_type, compression, reader):
+    """Parquet and feather results should read back with the same columns and values as the csv ones"""
+    result = make_result()
+    columns = ["a", "b", "c"]
+    save_result(result, str(tmpdir / "sample"), ".csv", columns)
+    save_result(
+        result,
+        str(tmpdir / "sample"),
+        res_type,
+        columns,
+        write_options={"compression": compression},
+    )
+
+    expected = pd.read_csv(str(tmpdir / "sample.csv"))
+    df = reader(str(tmpdir / f"sample{res_type}"))
+
+    assert list(df.columns) == ["time_start", "time_end"] + columns
+    # features keep their own dtype instead of being upcast alongside the times
+    assert df["a"].dtype == np.float32
+    np.testing.assert_allclose(df.values, expected.values, rtol=1e-6)
+
+
+@mark.parametrize("output_dtype", ["float32", "float16"])
+def test_reduced_precision_keeps_times_and_round_trips_features(tmpdir, output_dtype):
+    """Features should read back as the same numbers of the narrower dtype, and the times untouched"""
+    data = np.random.rand(10, 3)
+    data[5, 1] = np.nan
+    result = make_result(data=data)
+    times = result._to_dict(False)["times"]
+    options = {"output_dtype": output_dtype}
+    for res_type in (".csv", ".pkl", ".feather"):
+        save_result(
+            result,
+            str(tmpdir / "sample"),
+            res_type,
+            ["a", "b", "c"],
+            write_options=options,
+        )
+
+    expected = data.astype(output_dtype)
+    csv = pd.read_csv(str(tmpdir / "sample.csv"))
+    np.testing.assert_array_equal(
+        csv[["a", "b", "c"]].values.astype(output_dtype), expected
+    )
+    for df in (
+        pd.read_pickle(str(tmpdir / "sample.pkl")),
+        pd.read_feather(str(tmpdir / "sample.feather")),
+    ):
+        assert df["time_start"].dtype == np.float64
+        assert (df[["a", "b", "c"]].dtypes == output_dtype).all()
+        np.testing.assert_array_equal(df[["time_start", "time_end"]].values, times)
+        np.testing.assert_array_equal(df[["a", "b", "c"]].values, expected)
+
+    # fewer digits than the float64 values they were reduced from
+    with open(str(tmpdir / "sample.csv")) as f:
+        assert len(f.read()) < len(pandas_csv(result, ["a", "b", "c"]))
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import logging
+import sys
+from typing import Dict
+
+from app.processor_cache import PROCESSOR_SIZES_MB
+
+logger = logging.getLogger(__name__)
+
+# tensorflow pools that couldn't be resized, which are only warned about once
+_fixed_pools = set()
+
+
+def set_framework_threads(intra_op: int, inter_op: int):
+    """Size the thread pools of torch and tensorflow, when loaded. Inter-op pools (and
+    tensorflow's pools altogether) can only be sized before their first use, so later
+    attempts keep the pools as they are.
+    """
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        torch.set_num_threads(intra_op)
+        if torch.get_num_interop_threads() != inter_op:
+            try:
+                torch.set_num_interop_threads(inter_op)
+            except RuntimeError:
+                pass
+    if "tensorflow" in sys.modules:
+        threading = sys.modules["tensorflow"].config.threading
+        for current, wanted, setter in (
+            (threading.get_intra_op_parallelism_threads(), intra_op, "intra"),
+            (threading.get_inter_op_parallelism_threads(), inter_op, "inter"),
+        ):
+            if current == wanted:
+                continue
+            try:
+                getattr(threading, f"set_{setter}_op_parallelism_threads")(wanted)
+            except RuntimeError:
+                # tensorflow only takes it before its runtime starts (the first model run)
+                if setter not in _fixed_pools:
+                    _fixed_pools.add(setter)
+                    threads = current or "all"
+                    logger.warning(
+                        f"tensorflow runs {setter}-op work on {threads} threads"
+                    )
+
+
+@contextmanager
+def blas_threads(threads: int):
+    """Limit the BLAS libraries numpy and scipy are linked against within the block,
+    when threadpoolctl is installed (they otherwise keep their size from load time)
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        yield
+        return
+    with threadpool_limits(limits=threads, user_api="blas"):
+        yield
+
+
+@dataclass
+class ThreadPolicy:
+    """How many threads the numerical libraries get while each processor runs, within
+    the `budget` of cores of this process. Network-backed processors get the whole
+    budget for their intra-op pools. The others get a single thread: kaldi works frame
+    by frame and numpy on matrices too small for BLAS threads to pay off, so extra
+    threads only contend with those of the other workers. `threads` overrides the
+    intra-op threads by processor key, or for every processor under "default".
+    """
+
+    budget: int
+    threads: Dict[str, int] = field(default_factory=dict)
+    inter_op: int = 1
+
+    def intra_op(self, class_key: str, num_threads: int = 0) -> int:
+        """Threads for the processor, `num_threads` (the analysis' own setting) first"""
+        threads = (
+            num_threads
+            or self.threads.get(class_key)
+            or self.threads.get("default")
+            or (self.budget if class_key in PROCESSOR_SIZES_MB else 1)
+        )
+        return max(1, min(threads, self.budget))
+
+    @contextmanager
+    def limits(self, class_key: str, num_threads: int = 0):
+        """Apply the processor's thread counts for the block"""
+        intra_op = self.intra_op(class_key, num_threads)
+        set_framework_threads(intra_op, self.inter_op)
+        with blas_threads(intra_op):
+            yield
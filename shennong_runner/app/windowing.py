@@ -0,0 +1,69 @@
+import numpy as np
+from shennong import Features
+from shennong.audio import Audio
+
+# Processors that can run over long files one window at a time (see `runner_args` in parse_shennong)
+WINDOWED_PROCESSORS = ["hubert_large_ls960_ft", "mHuBERT_147", "pitch_crepe"]
+
+# seconds between the frames of models whose processors don't have a frame_shift:
+# hubert's convolutions downsample 16kHz audio by 320
+MODEL_FRAME_SHIFTS = {"hubert_large_ls960_ft": 0.02, "mHuBERT_147": 0.02}
+
+
+def model_frame_shift(class_key: str, processor) -> float:
+    return MODEL_FRAME_SHIFTS.get(class_key) or processor.frame_shift
+
+
+def process_in_windows(
+    processor,
+    sound: Audio,
+    frame_shift: float,
+    window_length: float,
+    window_overlap: float,
+) -> Features:
+    """Run the processor over windows of `window_length` seconds, each overlapping the
+    next by `window_overlap` seconds. Windows start on frame boundaries, so that their
+    frames line up with those of the whole file, and the overlap between two windows is
+    split at its middle, each frame coming from the window where it is furthest from an edge.
+    Memory and time then grow linearly with the length of the file, not quadratically.
+    """
+    sample_rate = sound.sample_rate
+    hop = int(round(frame_shift * sample_rate))
+    window_frames = int(window_length / frame_shift)
+    overlap_frames = int(window_overlap / frame_shift)
+    stride = window_frames - overlap_frames
+    if stride < 1:
+        raise ValueError("window_overlap must be shorter than window_length")
+
+    data, times, properties = [], [], None
+    # frames are counted from the start of the file, `kept` being the first one not
+    # stitched yet
+    start, kept = 0, 0
+    while True:
+        first = start * hop
+        last = first + window_frames * hop
+        # fold a short remainder into this window rather than running the model on a sliver
+        final = sound.nsamples - last < stride * hop // 2
+        features = processor.process(
+            Audio(sound.data[first : sound.nsamples if final else last], sample_rate)
+        )
+        # models whose frames span more than a hop return fewer frames than the window
+        # holds, so the range kept is bounded by what the window actually gave
+        keep_from = kept - start
+        keep_to = (
+            features.nframes
+            if final
+            else min(features.nframes, stride + overlap_frames // 2)
+        )
+        if keep_to <= keep_from:
+            raise ValueError("window_length is too short for the model's frames")
+        data.append(features.data[keep_from:keep_to])
+        times.append(features.times[keep_from:keep_to] + first / sample_rate)
+        properties = properties or features.properties
+        if final:
+            break
+        kept = start + keep_to
+        # the next window starts no later than the first frame this one couldn't give
+        start = min(start + stride, kept)
+
+    return Features(np.concatenate(data), np.concatenate(times), properties=properties)
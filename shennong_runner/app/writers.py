@@ -0,0 +1,175 @@
+from os import path
+from shutil import copyfileobj
+import tempfile
+from typing import BinaryIO, List, TextIO
+
+import numpy as np
+
+# values formatted at a time by the csv writer, bounding its memory whatever the size of the result
+CSV_BLOCK_CELLS = 2 ** 16
+
+# compression used when the job doesn't ask for any, and how "none" is spelled, per format
+DEFAULT_COMPRESSION = {".parquet": "snappy", ".feather": "lz4"}
+NO_COMPRESSION = {".parquet": "none", ".feather": "uncompressed"}
+
+# dtypes the feature columns can be written in, with the significant digits a csv value
+# needs to read back as the same number of that dtype
+OUTPUT_DTYPES = {"float32": 9, "float16": 5}
+
+
+def arrow_table(
+    times: np.ndarray,
+    data: np.ndarray,
+    time_col_names: List[str],
+    feature_col_names: List[str],
+):
+    """Build an arrow table column by column from the feature arrays, keeping their dtypes"""
+    # imported here so that jobs with other output formats don't pay for pyarrow
+    import pyarrow as pa
+
+    columns = [pa.array(times[:, i]) for i in range(times.shape[1])] + [
+        pa.array(data[:, i]) for i in range(data.shape[1])
+    ]
+    return pa.Table.from_arrays(columns, names=time_col_names + feature_col_names)
+
+
+def resolve_compression(res_type: str, compression: str = None) -> str:
+    if compression is None:
+        return DEFAULT_COMPRESSION[res_type]
+    return NO_COMPRESSION[res_type] if compression == "none" else compression
+
+
+def cell_format(float_precision: int = None) -> str:
+    return "%r" if float_precision is None else f"%.{float_precision}g"
+
+
+def format_block(
+    block: np.ndarray, float_precision: int = None, formats: List[str] = None
+) -> str:
+    """Format a block of rows as csv lines in a single string operation. Without a precision,
+    floats are written with their shortest round-trip repr, as pandas does. `formats`,
+    when given, is each column's own.
+    """
+    formats = formats or [cell_format(float_precision)] * block.shape[1]
+    line = ",".join(formats) + "\n"
+    cells = block.ravel().tolist()
+    if np.isnan(block).any():
+        # pandas writes missing values as empty cells
+        line = ",".join(["%s"] * block.shape[1]) + "\n"
+        cells = [
+            "" if c != c else (cell % c)
+            for cell, c in zip(formats * block.shape[0], cells)
+        ]
+    return (line * block.shape[0]) % tuple(cells)
+
+
+def write_csv(
+    f: TextIO,
+    times: np.ndarray,
+    data: np.ndarray,
+    time_col_names: List[str],
+    feature_col_names: List[str],
+    name: str,
+    float_precision: int = None,
+    output_dtype: str = None,
+    **options,
+):
+    """Stream rows to `f` block by block, straight from the times and data arrays.
+    Only one block is ever upcast to float64, rather than the whole result.
+    Features reduced to an `output_dtype` get as many digits as that dtype needs.
+    """
+    feature_precision = float_precision
+    if feature_precision is None and output_dtype is not None:
+        feature_precision = OUTPUT_DTYPES[output_dtype]
+    formats = [cell_format(float_precision)] * times.shape[1] + [
+        cell_format(feature_precision)
+    ] * data.shape[1]
+    f.write(",".join(time_col_names + feature_col_names) + "\n")
+    block_rows = max(1, CSV_BLOCK_CELLS // (times.shape[1] + data.shape[1]))
+    for start in range(0, times.shape[0], block_rows):
+        stop = start + block_rows
+        block = np.hstack((times[start:stop], data[start:stop])).astype(
+            np.float64, copy=False
+        )
+        f.write(format_block(block, formats=formats))
+
+
+def write_parquet(
+    f: BinaryIO,
+    times: np.ndarray,
+    data: np.ndarray,
+    time_col_names: List[str],
+    feature_col_names: List[str],
+    name: str,
+    compression: str = None,
+    **options,
+):
+    import pyarrow.parquet as pq
+
+    pq.write_table(
+        arrow_table(times, data, time_col_names, feature_col_names),
+        f,
+        compression=resolve_compression(".parquet", compression),
+    )
+
+
+def write_feather(
+    f: BinaryIO,
+    times: np.ndarray,
+    data: np.ndarray,
+    time_col_names: List[str],
+    feature_col_names: List[str],
+    name: str,
+    compression: str = None,
+    **options,
+):
+    """Write an arrow IPC file (feather v2)"""
+    import pyarrow.feather as feather
+
+    feather.write_feather(
+        arrow_table(times, data, time_col_names, feature_col_names),
+        f,
+        compression=resolve_compression(".feather", compression),
+    )
+
+
+def write_h5features(
+    f: BinaryIO,
+    times: np.ndarray,
+    data: np.ndarray,
+    time_col_names: List[str],
+    feature_col_names: List[str],
+    name: str,
+    compression: str = None,
+    **options,
+):
+    """Write a single h5features item called `name`, with the column names stored as its properties.
+    h5py can only write to a real file, so the result goes through a temporary one first.
+    """
+    import h5features
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = path.join(tmp_dir, f"{name}.h5f")
+        with h5features.Writer(filename) as writer:
+            writer.write(
+                h5features.Data(
+                    [name],
+                    [times],
+                    [data],
+                    properties=[
+                        {"time_columns": time_col_names, "columns": feature_col_names}
+                    ],
+                ),
+                groupname="features",
+            )
+        with open(filename, "rb") as h5:
+            copyfileobj(h5, f)
+
+
+# formats written straight from the times and data arrays, with the mode their file is opened in
+WRITERS = {
+    ".csv": (write_csv, "w"),
+    ".feather": (write_feather, "wb"),
+    ".h5f": (write_h5features, "wb"),
+    ".parquet": (write_parquet, "wb"),
+}
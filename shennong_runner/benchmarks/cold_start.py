@@ -0,0 +1,65 @@
+"""Cold start of the runner's entrypoint: seconds from a fresh interpreter to app.analyse
+being imported, then to the processors a job asks for being built, and the modules
+loaded by then, as the median of several runs.
+
+Run from shennong_runner/ with e.g. `python -m benchmarks.cold_start energy mfcc`, then
+from a checkout of an earlier commit to compare (only names both have are used). Run it
+in the runner's image: shennong.processor imports every processor when any of them is
+imported, so ready_seconds only means something with the real backends installed, and
+asking for one processor or all of them should cost about the same.
+"""
+from argparse import ArgumentParser
+import json
+from statistics import median
+import subprocess
+import sys
+from time import perf_counter
+from typing import Any, Dict, List
+
+# run in the fresh interpreter, with the processor keys as its arguments
+STARTUP = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+from app.analyse import resolve_processor, shennong_schema, split_runner_args
+imported = perf_counter()
+for class_key in sys.argv[1:]:
+    defaults = {
+        arg["name"]: arg["default"]
+        for arg in shennong_schema["processors"][class_key]["init_args"]
+    }
+    resolve_processor(class_key, split_runner_args(class_key, defaults)[0])
+ready = perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "ready_seconds": ready - start,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def cold_start(class_keys: List[str]) -> Dict[str, Any]:
+    start = perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP, *class_keys],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    # the interpreter's own start and exit included
+    return dict(json.loads(output.splitlines()[-1]), seconds=perf_counter() - start)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("class_keys", nargs="*", help="processors the job asks for")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [cold_start(args.class_keys) for _ in range(args.runs)]
+    for key in ("seconds", "import_seconds", "ready_seconds", "modules"):
+        print(f"{key:<16} {median(run[key] for run in runs):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Speed and accuracy of each inference backend of the network-backed processors, against eager.
+Each run happens in a fresh process, so that converted models and thread settings don't leak
+from one backend to the next. Run from shennong_runner/ with e.g.
+`python -m benchmarks.inference_backends mHuBERT_147 --num-threads 4`.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from multiprocessing import get_context
+from os import path
+from time import perf_counter
+
+import numpy as np
+from shennong import FeaturesCollection
+
+from app.analyse import Analyser, resolve_processor, shennong_schema
+from app.audio import DecodedAudio
+from app.processor_cache import ProcessorCache
+from app.settings import settings as app_settings
+
+FIXTURES = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/*.wav")
+
+
+def run(audio_files, class_key: str, backend: str, num_threads: int):
+    """Features of each file, and the seconds spent on them once the backend is warm"""
+    init_args = {
+        arg["name"]: arg["default"]
+        for arg in shennong_schema["processors"][class_key]["init_args"]
+    }
+    init_args.update(inference_backend=backend, num_threads=num_threads)
+    postprocessors = shennong_schema["processors"][class_key]["required_postprocessors"]
+    # the model is loaded and converted once, as in a job
+    processors = ProcessorCache(resolve_processor, app_settings.PROCESSOR_CACHE_MB)
+
+    def analyse(audio_file):
+        analyser = Analyser(
+            DecodedAudio.load(audio_file, 1), FeaturesCollection(), processors
+        )
+        analyser.audio.for_processor(class_key)
+        start = perf_counter()
+        analyser.process(
+            class_key, {"init_args": dict(init_args), "postprocessors": postprocessors}
+        )
+        return analyser.collection[class_key].data, perf_counter() - start
+
+    # the first run loads, converts and (for compiled graphs) traces the model
+    analyse(audio_files[0])
+    results = [analyse(audio_file) for audio_file in audio_files]
+    return [data for data, _ in results], sum(elapsed for _, elapsed in results)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("class_key", choices=["hubert_large_ls960_ft", "mHuBERT_147"])
+    parser.add_argument("audio_files", nargs="*", help="defaults to the test fixtures")
+    parser.add_argument("--num-threads", type=int, default=0)
+    args = parser.parse_args()
+
+    audio_files = args.audio_files or sorted(glob(FIXTURES))
+    duration = sum(DecodedAudio.load(f, 1).sound.duration for f in audio_files)
+    backends = next(
+        arg["options"]
+        for arg in shennong_schema["processors"][args.class_key]["init_args"]
+        if arg["name"] == "inference_backend"
+    )
+
+    print(f"{args.class_key} on {len(audio_files)} files ({duration:.0f}s of audio)")
+    print(
+        f"{'backend':>10} {'seconds':>8} {'x real time':>12} "
+        f"{'max error':>10} {'rel error':>10}"
+    )
+    reference = None
+    for backend in backends:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            try:
+                features, elapsed = pool.submit(
+                    run, audio_files, args.class_key, backend, args.num_threads
+                ).result()
+            except Exception as e:
+                print(f"{backend:>10} failed ({e!r})")
+                continue
+        if reference is None:
+            reference = features
+        errors = [np.abs(f - r) for f, r in zip(features, reference)]
+        max_error = max(e.max() for e in errors)
+        rel_error = np.sqrt(sum((e ** 2).sum() for e in errors)) / np.sqrt(
+            sum((r ** 2).sum() for r in reference)
+        )
+        print(
+            f"{backend:>10} {elapsed:>8.2f} {duration / elapsed:>12.1f} "
+            f"{max_error:>10.2e} {rel_error:>10.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
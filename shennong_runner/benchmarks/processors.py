@@ -0,0 +1,236 @@
+"""Realtime factor and peak memory of every processor in processor-schema.json, alone
+and with each of its postprocessors, on synthetic audio of several durations, sample
+rates and channel counts. Each combination runs through the runner's own path (decode, compute,
+postprocess, save) in a fresh process, warmed up on the shortest file first, so that
+model loading is left out and peak RSS is that combination's alone. As files are taken
+from shortest to longest, a file's peak RSS is the most the combination needed up to it.
+
+Run from shennong_runner/ with e.g. `python -m benchmarks.processors run -o new.json`,
+then `python -m benchmarks.processors compare old.json new.json` exits with an error
+when a tracked metric got worse by more than the threshold.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import product
+import json
+from multiprocessing import get_context
+from os import path
+import platform
+import sys
+import tempfile
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+from scipy.io import wavfile
+
+from app.analyse import analyse_file, resolve_processor, shennong_schema
+from app.processor_cache import ProcessorCache
+from app.resources import cpu_count
+from app.settings import settings as app_settings
+
+# lower is better for both
+TRACKED_METRICS = ("realtime_factor", "peak_rss_mb")
+
+
+def synthetic_audio(
+    file_path: str, duration: float, sample_rate: int, channels: int, seed: int = 0
+):
+    """Write a wav of voiced-like sound: harmonics of a slowly wandering f0 over noise,
+    with pauses, so that pitch trackers and voice activity have something to find
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    f0 = 150 + 50 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    voiced *= np.sin(2 * np.pi * 0.25 * t) > -0.3
+    signal = 0.3 * voiced + 0.02 * rng.standard_normal((channels, len(t)))
+    samples = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    wavfile.write(file_path, sample_rate, samples.T if channels > 1 else samples[0])
+
+
+def combinations() -> Iterator[Tuple[str, str, List[str]]]:
+    """(name, processor, postprocessors): each processor with its required
+    postprocessors, then with each of the others it accepts
+    """
+    for class_key, processor in sorted(shennong_schema["processors"].items()):
+        required = list(processor["required_postprocessors"])
+        yield class_key, class_key, required
+        for postprocessor in processor["valid_postprocessors"]:
+            if postprocessor not in required:
+                yield f"{class_key}+{postprocessor}", class_key, required + [
+                    postprocessor
+                ]
+
+
+def run(
+    audio_files: List[Tuple[str, str]], class_key: str, postprocessors: List[str]
+) -> Dict[str, Dict[str, Any]]:
+    """The runner's metrics of each (spec, audio file), once warm"""
+    init_args = {
+        arg["name"]: arg["default"]
+        for arg in shennong_schema["processors"][class_key]["init_args"]
+    }
+    processors = ProcessorCache(resolve_processor, app_settings.PROCESSOR_CACHE_MB)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as results_dir:
+
+        def analyse(audio_file: str) -> Dict[str, Any]:
+            metrics = []
+            failed = analyse_file(
+                audio_file,
+                audio_file,
+                1,
+                {
+                    class_key: {
+                        "init_args": dict(init_args),
+                        "postprocessors": list(postprocessors),
+                    }
+                },
+                results_dir,
+                ".csv",
+                {},
+                processors,
+                metrics=metrics,
+            )
+            if failed:
+                raise RuntimeError(f"{class_key} failed on {audio_file}")
+            return metrics[0]
+
+        analyse(audio_files[0][1])
+        for spec, audio_file in audio_files:
+            record = analyse(audio_file)
+            results[spec] = {
+                "audio_seconds": record["audio_seconds"],
+                "seconds": record["seconds"],
+                # seconds of audio per second of processing
+                "throughput": record["audio_seconds"] / record["seconds"],
+                "realtime_factor": record["realtime_factor"],
+                "peak_rss_mb": record["peak_rss_mb"],
+            }
+    return results
+
+
+def regressions(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Tracked metrics of the results both runs share that got worse by more than
+    `threshold` (a fraction of the baseline)
+    """
+    found = []
+    for key in sorted(set(baseline["results"]) & set(current["results"])):
+        for metric in TRACKED_METRICS:
+            before = baseline["results"][key].get(metric)
+            after = current["results"][key].get(metric)
+            if before and after and after > before * (1 + threshold):
+                found.append(
+                    f"{key} {metric}: {before:.3g} -> {after:.3g} "
+                    f"(+{after / before - 1:.0%})"
+                )
+    return found
+
+
+def run_suite(args):
+    # shortest first, as the first file also warms the processor up
+    specs = sorted(product(args.durations, args.sample_rates, args.channels))
+    selected = [
+        combination
+        for combination in combinations()
+        if not args.processors or combination[1] in args.processors
+    ]
+    suite = {
+        "environment": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cores": cpu_count(),
+        },
+        "results": {},
+        "failed": [],
+    }
+
+    with tempfile.TemporaryDirectory() as audio_dir:
+        audio_files = []
+        for duration, sample_rate, channels in specs:
+            spec = f"{duration:g}s-{sample_rate}Hz-{channels}ch"
+            audio_file = path.join(audio_dir, f"{spec}.wav")
+            synthetic_audio(audio_file, duration, sample_rate, channels)
+            audio_files.append((spec, audio_file))
+
+        print(
+            f"{'combination':<32} {'audio':<18} {'x real time':>12} "
+            f"{'rtf':>8} {'peak MB':>8}"
+        )
+        for name, class_key, postprocessors in selected:
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                try:
+                    results = pool.submit(
+                        run, audio_files, class_key, postprocessors
+                    ).result()
+                except Exception as e:
+                    print(f"{name:<32} failed ({e!r})")
+                    suite["failed"].append(name)
+                    continue
+            for spec, result in results.items():
+                suite["results"][f"{name}@{spec}"] = result
+                print(
+                    f"{name:<32} {spec:<18} {result['throughput']:>12.1f} "
+                    f"{result['realtime_factor']:>8.3f} {result['peak_rss_mb']:>8.0f}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(suite, f, indent=2)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    missing = sorted(set(baseline["results"]) - set(current["results"]))
+    for key in missing:
+        print(f"missing from the current run: {key}")
+    found = regressions(baseline, current, args.threshold)
+    for regression in found:
+        print(f"regression: {regression}")
+    if found:
+        sys.exit(1)
+    print(f"no tracked metric worse by more than {args.threshold:.0%}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite")
+    run_parser.add_argument(
+        "--processors", nargs="*", help="processor keys, defaults to all of them"
+    )
+    run_parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 120])
+    run_parser.add_argument(
+        "--sample-rates", type=int, nargs="+", default=[16000, 44100]
+    )
+    run_parser.add_argument("--channels", type=int, nargs="+", default=[1, 2])
+    run_parser.add_argument("-o", "--output", help="results file to write")
+    run_parser.set_defaults(func=run_suite)
+
+    compare_parser = commands.add_parser(
+        "compare", help="fail when the current run regressed from the baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.2, help="fraction of the baseline"
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare the streaming csv writer with the pandas path save_result used to take.
+Run from shennong_runner/ with `python -m benchmarks.save_result`.
+"""
+from argparse import ArgumentParser
+from os import path
+import tempfile
+from time import perf_counter
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app.writers import write_csv
+
+
+def pandas_csv(f, times, data, time_col_names, feature_col_names, name, **options):
+    df = pd.DataFrame(np.hstack((times, data)))
+    df.columns = time_col_names + feature_col_names
+    df.to_csv(f, index=False)
+
+
+def run(writer, times, data, out_path, **options):
+    columns = [f"f_{i}" for i in range(data.shape[1])]
+
+    def write():
+        with open(out_path, "w") as f:
+            writer(
+                f, times, data, ["time_start", "time_end"], columns, "bench", **options
+            )
+
+    start = perf_counter()
+    write()
+    elapsed = perf_counter() - start
+    # traced separately, since tracing slows allocations down
+    tracemalloc.start()
+    write()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, path.getsize(out_path)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    # defaults to a minute of hubert_large frames
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--float-precision", type=int, default=None)
+    args = parser.parse_args()
+
+    times = np.stack(
+        (np.arange(args.frames) * 0.02, np.arange(args.frames) * 0.02 + 0.025), axis=1
+    )
+    data = np.random.rand(args.frames, args.dims).astype(np.float32)
+    print(
+        f"{args.frames} frames x {args.dims} float32 features ({data.nbytes / 1e6:.1f}MB)"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, writer, options in (
+            ("pandas", pandas_csv, {}),
+            ("streaming", write_csv, {"float_precision": args.float_precision}),
+        ):
+            elapsed, peak, size = run(
+                writer, times, data, path.join(tmp_dir, f"{name}.csv"), **options
+            )
+            print(
+                f"{name:>10}: {elapsed:.2f}s, {size / 1e6 / elapsed:.1f}MB/s written, "
+                f"{peak / 1e6:.1f}MB peak allocations"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Throughput of a processor for each split of the node's cores between workers and
+the threads each worker's libraries get, to pick a job's `threads` (and RUNNER_WORKERS)
+for an instance type. Workers are fresh processes, as thread pools are sized once per
+process, each timing its share of the files once its processor is loaded. Run from
+shennong_runner/ with e.g. `python -m benchmarks.thread_budgets mfcc`.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from multiprocessing import get_context
+from os import path
+from time import perf_counter
+
+from shennong import FeaturesCollection
+
+from app.analyse import Analyser, resolve_processor, shennong_schema
+from app.audio import DecodedAudio
+from app.processor_cache import ProcessorCache
+from app.resources import cpu_count, thread_limits
+from app.settings import settings as app_settings
+from app.threads import ThreadPolicy
+
+FIXTURES = path.join(app_settings.PROJECT_ROOT, "app/tests/fixtures/*.wav")
+
+
+def run(audio_files, class_key: str, threads: int) -> float:
+    """Seconds spent on the files once the processor is loaded"""
+    init_args = {
+        arg["name"]: arg["default"]
+        for arg in shennong_schema["processors"][class_key]["init_args"]
+    }
+    postprocessors = shennong_schema["processors"][class_key]["required_postprocessors"]
+    processors = ProcessorCache(resolve_processor, app_settings.PROCESSOR_CACHE_MB)
+    policy = ThreadPolicy(threads, {class_key: threads})
+
+    def analyse(audio_file):
+        analyser = Analyser(
+            DecodedAudio.load(audio_file, 1),
+            FeaturesCollection(),
+            processors,
+            threads=policy,
+        )
+        analyser.process(
+            class_key,
+            {"init_args": dict(init_args), "postprocessors": list(postprocessors)},
+        )
+
+    analyse(audio_files[0])
+    start = perf_counter()
+    for audio_file in audio_files:
+        analyse(audio_file)
+    return perf_counter() - start
+
+
+def splits(cores: int):
+    """(workers, threads) pairs using every core, and the libraries' default of every
+    worker taking all the cores
+    """
+    workers = 1
+    while workers <= cores:
+        yield workers, cores // workers
+        if workers > 1:
+            yield workers, cores
+        workers *= 2
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("class_key", choices=sorted(shennong_schema["processors"]))
+    parser.add_argument("audio_files", nargs="*", help="defaults to the test fixtures")
+    parser.add_argument(
+        "--repeat", type=int, default=4, help="times each worker goes over its files"
+    )
+    args = parser.parse_args()
+
+    audio_files = (args.audio_files or sorted(glob(FIXTURES))) * args.repeat
+    duration = sum(DecodedAudio.load(f, 1).sound.duration for f in audio_files)
+    cores = cpu_count()
+
+    print(f"{args.class_key} on {duration:.0f}s of audio, {cores} cores")
+    print(f"{'workers':>8} {'threads':>8} {'seconds':>8} {'x real time':>12}")
+    best = None
+    for workers, threads in splits(cores):
+        # as the runner does, so that pools sized at load time follow the split too
+        with thread_limits(threads), ProcessPoolExecutor(
+            workers, mp_context=get_context("spawn")
+        ) as pool:
+            futures = [
+                pool.submit(run, audio_files[i::workers], args.class_key, threads)
+                for i in range(workers)
+                if audio_files[i::workers]
+            ]
+            try:
+                elapsed = max(future.result() for future in futures)
+            except Exception as e:
+                print(f"{workers:>8} {threads:>8} failed ({e!r})")
+                continue
+        print(f"{workers:>8} {threads:>8} {elapsed:>8.2f} {duration / elapsed:>12.1f}")
+        if best is None or elapsed < best[2]:
+            best = (workers, threads, elapsed)
+
+    if best is not None:
+        print(f"best: RUNNER_WORKERS={best[0]} with {best[1]} threads per worker")
+
+
+if __name__ == "__main__":
+    main()
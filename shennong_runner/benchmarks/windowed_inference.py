@@ -0,0 +1,67 @@
+"""Time and peak memory of windowed hubert/crepe inference against the window length.
+Each run happens in a fresh process, so that peak RSS isn't carried over from one to the next.
+Run from shennong_runner/ with e.g. `python -m benchmarks.windowed_inference audio.wav mHuBERT_147`.
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import resource
+from time import perf_counter
+
+from shennong import FeaturesCollection
+
+from app.analyse import Analyser, shennong_schema
+from app.audio import DecodedAudio
+
+
+def run(audio_file: str, class_key: str, window_length: float, window_overlap: float):
+    init_args = {
+        arg["name"]: arg["default"]
+        for arg in shennong_schema["processors"][class_key]["init_args"]
+    }
+    init_args.update(window_length=window_length, window_overlap=window_overlap)
+    analyser = Analyser(DecodedAudio.load(audio_file, 1), FeaturesCollection())
+    # decode (and resample) before timing
+    analyser.audio.for_processor(class_key)
+    start = perf_counter()
+    analyser.process(class_key, {"init_args": init_args, "postprocessors": []})
+    elapsed = perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("audio_file")
+    parser.add_argument(
+        "class_key", choices=["hubert_large_ls960_ft", "mHuBERT_147", "pitch_crepe"]
+    )
+    # 0 runs the model over the whole file at once
+    parser.add_argument(
+        "--window-lengths", type=float, nargs="+", default=[0, 10, 30, 60, 120]
+    )
+    parser.add_argument("--window-overlap", type=float, default=5.0)
+    args = parser.parse_args()
+
+    duration = DecodedAudio.load(args.audio_file, 1).sound.duration
+    print(f"{args.class_key} on {duration:.0f}s of audio")
+    for window_length in args.window_lengths:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            try:
+                elapsed, peak_mb = pool.submit(
+                    run,
+                    args.audio_file,
+                    args.class_key,
+                    window_length,
+                    min(args.window_overlap, window_length / 2),
+                ).result()
+            except Exception as e:
+                print(f"{window_length:>6.0f}s windows: failed ({e!r})")
+                continue
+        print(
+            f"{window_length:>6.0f}s windows: {elapsed:.1f}s "
+            f"({duration / elapsed:.1f}x real time), {peak_mb:.0f}MB peak RSS"
+        )
+
+
+if __name__ == "__main__":
+    main()
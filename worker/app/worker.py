@@ -1,9 +1,9 @@
 import datetime
 from io import StringIO
-from json import dumps
+from json import JSONDecodeError, dumps, loads
 import logging
 from time import sleep
-from typing import Any, Dict
+from typing import Any, Dict, List
 import uuid
 from os import getenv
 
@@ -25,6 +25,18 @@ jinja_env = Environment(
 logger = logging.getLogger(__name__)
 
 
+def parse_metrics(output: bytes) -> List[Dict[str, Any]]:
+    """The metrics records the runner writes to stdout as JSON lines, among its logs"""
+    records = []
+    for line in output.decode(errors="replace").splitlines():
+        if line.startswith('{"metrics"'):
+            try:
+                records.append(loads(line))
+            except JSONDecodeError:
+                continue
+    return records
+
+
 @celery_app.task
 def delete_expired_files(continuation_token=None):
     s3 = boto3.client("s3")
@@ -206,7 +218,7 @@ def process_shennong_job(self, config: Dict[str, Any] = None, provider=EC2_Provi
         worker_node.docker_client.images.pull(image)
 
         logger.info("running analysis...")
-        worker_node.docker_client.containers.run(
+        output = worker_node.docker_client.containers.run(
             image=image,
             command=[job_args],
             stderr=True,
@@ -214,8 +226,15 @@ def process_shennong_job(self, config: Dict[str, Any] = None, provider=EC2_Provi
                 "AWS_SECRET_ACCESS_KEY": getenv("AWS_SECRET_ACCESS_KEY"),
                 "AWS_DEFAULT_REGION": getenv("AWS_DEFAULT_REGION"),
                 "AWS_ACCESS_KEY_ID": getenv("AWS_ACCESS_KEY_ID"),
+                "RUNNER_WORKERS": settings.RUNNER_WORKERS,
+                "AUDIO_STORE_MB": settings.AUDIO_STORE_MB,
+                "AUDIO_STORE_PREFIX": settings.AUDIO_STORE_PREFIX,
+                "PREWARM_PROCESSORS": settings.PREWARM_PROCESSORS,
             },
         )
+        for record in parse_metrics(output):
+            if record["metrics"] == "job":
+                logger.info(f"runner metrics: {dumps(record)}")
 
         try:
             client.get_object_attributes(